@@ -4,7 +4,7 @@ from app.api.api_v1.endpoints import (
     auth, users, roles, permissions, departments, 
     teachers, students, courses, course_offerings,
     classrooms, schedules, student_status, reward_punishment,
-    statistics
+    statistics, enrollments
 )
 
 api_router = APIRouter()
@@ -42,6 +42,9 @@ api_router.include_router(classrooms.router, prefix="/classrooms", tags=["教室
 # 排课管理
 api_router.include_router(schedules.router, prefix="/schedules", tags=["排课管理"])
 
+# 选课管理
+api_router.include_router(enrollments.router, prefix="/enrollments", tags=["选课管理"])
+
 # 学籍管理
 api_router.include_router(student_status.router, prefix="/student-status", tags=["学籍管理"])
 
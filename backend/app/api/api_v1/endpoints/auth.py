@@ -1,7 +1,8 @@
 from datetime import timedelta
-from typing import Any
+from typing import Any, Optional, Tuple
 
-from fastapi import APIRouter, Depends, HTTPException, status, Body, Header, Request
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Body, Header, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session, joinedload
 import traceback
@@ -12,6 +13,9 @@ from jose import jwt, JWTError
 from app.api import deps
 from app.core import security
 from app.core.config import settings
+from app.core.password_pool import PasswordPoolBusy, password_pool, rehash_password
+from app.core.permission_cache import permission_cache
+from app.core.permission_claims import build_claims
 from app.db.database import get_db
 from app.models.user import User
 from app.models.role import Role, Permission
@@ -31,32 +35,89 @@ class BUSINESS_CODE:
 router = APIRouter()
 
 
+def password_pool_error(e: PasswordPoolBusy) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=e.detail,
+        headers={"Retry-After": str(e.retry_after_seconds)}
+    )
+
+
+def login_error(e: Exception) -> APIResponse:
+    # 记录详细错误信息
+    error_msg = f"登录异常: {str(e)}\n{traceback.format_exc()}"
+    print(error_msg)
+
+    # 返回统一格式的错误响应，避免500错误
+    return APIResponse(
+        code=BUSINESS_CODE.SERVER_ERROR,
+        message=f"登录失败: {str(e)}",
+        data=None
+    )
+
+
+async def authenticate(
+    db: Session,
+    background_tasks: BackgroundTasks,
+    username: str,
+    password: str,
+    *options: Any
+) -> Tuple[Optional[User], bool]:
+    """
+    查询用户并在密码进程池中校验密码，返回 (用户, 密码是否正确)；进程池繁忙时抛出 PasswordPoolBusy
+
+    密码正确但哈希的算法或强度与当前配置不一致时，响应返回后在后台重新哈希
+    """
+    user = await run_in_threadpool(
+        lambda: db.query(User).options(*options).filter(User.username == username).first()
+    )
+    if not user:
+        return None, False
+    password_match = await password_pool.verify(password, user.password)
+    print(f"密码验证: {password_match}")
+    if password_match and security.password_needs_update(user.password):
+        background_tasks.add_task(rehash_password, user.user_id, user.password, password)
+    return user, password_match
+
+
 @router.post("/login", response_model=APIResponse)
-def login(
+async def login(
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db), 
     form_data: OAuth2PasswordRequestForm = Depends()
 ) -> Any:
     """
     用户登录 (表单提交方式)
+
+    密码校验在专用进程池中执行，进程池排队已满时返回503及 Retry-After
     """
+    # 记录登录尝试
+    print(f"登录尝试: 用户名={form_data.username}")
     try:
-        # 记录登录尝试
-        print(f"登录尝试: 用户名={form_data.username}")
-        
         # 使用joinedload预加载roles关系
-        user = db.query(User).options(joinedload(User.roles)).filter(User.username == form_data.username).first()
+        user, password_match = await authenticate(
+            db, background_tasks, form_data.username, form_data.password, joinedload(User.roles)
+        )
+    except PasswordPoolBusy as e:
+        raise password_pool_error(e)
+    except Exception as e:
+        return login_error(e)
+    return await run_in_threadpool(complete_login, db, form_data.username, user, password_match)
+
+
+def complete_login(db: Session, username: str, user: Optional[User], password_match: bool) -> Any:
+    """
+    密码校验之后的登录处理：生成令牌并构建用户信息
+    """
+    try:
         if not user:
-            print(f"用户不存在: {form_data.username}")
+            print(f"用户不存在: {username}")
             return APIResponse(
                 code=BUSINESS_CODE.UNAUTHORIZED,
                 message="用户名或密码不正确",
                 data=None
             )
         
-        # 检查密码
-        password_match = security.verify_password(form_data.password, user.password)
-        print(f"密码验证: {password_match}")
-        
         if not password_match:
             return APIResponse(
                 code=BUSINESS_CODE.UNAUTHORIZED,
@@ -74,7 +135,9 @@ def login(
         # 生成访问令牌
         access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
         access_token = security.create_access_token(
-            user.user_id, expires_delta=access_token_expires
+            user.user_id,
+            expires_delta=access_token_expires,
+            claims=build_claims(db, user.user_id),
         )
         print(f"生成令牌成功")
 
@@ -207,37 +270,42 @@ def login(
             data=token_data
         )
     except Exception as e:
-        # 记录详细错误信息
-        error_msg = f"登录异常: {str(e)}\n{traceback.format_exc()}"
-        print(error_msg)
-        
-        # 返回统一格式的错误响应，避免500错误
-        return APIResponse(
-            code=BUSINESS_CODE.SERVER_ERROR,
-            message=f"登录失败: {str(e)}",
-            data=None
-        )
+        return login_error(e)
 
 
 @router.post("/login/json", response_model=APIResponse)
-def login_json(
+async def login_json(
     login_data: Login,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db)
 ) -> Any:
     """
     用户登录 (JSON提交方式)
+
+    密码校验在专用进程池中执行，进程池排队已满时返回503及 Retry-After
     """
+    # 记录登录尝试
+    print(f"JSON登录尝试: 用户名={login_data.username}")
     try:
-        # 记录登录尝试
-        print(f"JSON登录尝试: 用户名={login_data.username}")
-        
         # 使用joinedload预加载roles关系和permissions关系
-        user = db.query(User).options(
+        user, password_match = await authenticate(
+            db, background_tasks, login_data.username, login_data.password,
             joinedload(User.roles).joinedload(Role.permissions)
-        ).filter(User.username == login_data.username).first()
-        
+        )
+    except PasswordPoolBusy as e:
+        raise password_pool_error(e)
+    except Exception as e:
+        return login_error(e)
+    return await run_in_threadpool(complete_login_json, db, login_data.username, user, password_match)
+
+
+def complete_login_json(db: Session, username: str, user: Optional[User], password_match: bool) -> Any:
+    """
+    密码校验之后的JSON登录处理：生成令牌并构建与前端约定格式一致的用户信息
+    """
+    try:
         if not user:
-            print(f"用户不存在: {login_data.username}")
+            print(f"用户不存在: {username}")
             return APIResponse(
                 code=BUSINESS_CODE.UNAUTHORIZED,
                 message="用户名或密码不正确",
@@ -257,10 +325,6 @@ def login_json(
                 else:
                     print("  No permissions attribute")
         
-        # 检查密码
-        password_match = security.verify_password(login_data.password, user.password)
-        print(f"密码验证: {password_match}")
-        
         if not password_match:
             return APIResponse(
                 code=BUSINESS_CODE.UNAUTHORIZED,
@@ -278,7 +342,9 @@ def login_json(
         # 生成访问令牌
         access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
         access_token = security.create_access_token(
-            user.user_id, expires_delta=access_token_expires
+            user.user_id,
+            expires_delta=access_token_expires,
+            claims=build_claims(db, user.user_id),
         )
         print(f"生成令牌成功")
 
@@ -397,16 +463,7 @@ def login_json(
             data=token_data
         )
     except Exception as e:
-        # 记录详细错误信息
-        error_msg = f"登录异常: {str(e)}\n{traceback.format_exc()}"
-        print(error_msg)
-        
-        # 返回统一格式的错误响应，避免500错误
-        return APIResponse(
-            code=BUSINESS_CODE.SERVER_ERROR,
-            message=f"登录失败: {str(e)}",
-            data=None
-        )
+        return login_error(e)
 
 
 @router.post("/logout", response_model=APIResponse)
@@ -556,19 +613,24 @@ def get_profile(
 
 
 @router.post("/change-password", response_model=APIResponse)
-def change_password(
+async def change_password(
     password_data: ChangePassword,
     db: Session = Depends(get_db),
     current_user: User = Depends(deps.get_current_active_user),
 ) -> Any:
     """
-    修改密码
+    修改密码，密码校验与哈希在专用进程池中执行
     """
-    if not security.verify_password(password_data.current_password, current_user.password):
-        raise HTTPException(status_code=400, detail="当前密码不正确")
-    
-    current_user.password = security.get_password_hash(password_data.new_password)
-    db.commit()
+    try:
+        if not await password_pool.verify(password_data.current_password, current_user.password):
+            raise HTTPException(status_code=400, detail="当前密码不正确")
+        password_hash = await password_pool.hash(password_data.new_password)
+    except PasswordPoolBusy as e:
+        raise password_pool_error(e)
+
+    current_user.password = password_hash
+    await run_in_threadpool(db.commit)
+    permission_cache.invalidate_user(current_user.user_id)
     
     return APIResponse(
         code=0,
@@ -576,6 +638,20 @@ def change_password(
     )
 
 
+@router.get("/password-pool/metrics", response_model=APIResponse)
+def get_password_pool_metrics(
+    _: Any = Depends(deps.check_permissions(["USER_MANAGE"])),
+) -> Any:
+    """
+    密码进程池指标：进程数、在途与排队的请求数、拒绝次数与平均计算耗时
+    """
+    return APIResponse(
+        code=0,
+        message="获取成功",
+        data=password_pool.metrics()
+    )
+
+
 @router.post("/refresh", response_model=APIResponse)
 def refresh_token(
     refresh_token: str = Body(..., embed=True),
@@ -622,7 +698,9 @@ def refresh_token(
         # 生成新的访问令牌
         access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
         access_token = security.create_access_token(
-            user.user_id, expires_delta=access_token_expires
+            user.user_id,
+            expires_delta=access_token_expires,
+            claims=build_claims(db, user.user_id),
         )
         
         # 构建用户详情（复用login_json中的代码）
@@ -9,6 +9,11 @@ from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import or_, and_
 
 from app.api import deps
+from app.core.config import settings
+from app.core.room_occupancy import ALL_WEEKS, SLOT_MINUTES, room_occupancy
+from app.core.schedule_time import time_to_minutes
+from app.core.timetable_solver import parse_slot
+from app.core.week_mask import WeekMask
 from app.db.database import get_db
 from app.models.course import Classroom, Schedule, CourseOffering
 from app.schemas.common import APIResponse, PaginatedResponse
@@ -271,6 +276,110 @@ def create_classroom(
         raise HTTPException(status_code=500, detail=f"创建教室失败: {str(e)}")
 
 
+@router.get("/available", response_model=None)
+def get_available_classrooms(
+    db: Session = Depends(get_db),
+    day_of_week: int = Query(..., ge=1, le=7, description="星期几，1-7表示周一到周日"),
+    start_time: str = Query(..., description="开始时间，格式HH:MM"),
+    end_time: str = Query(None, description="结束时间，格式HH:MM，默认为开始时间所在的节次"),
+    weeks: str = Query(None, description="周次，例如 3-12，默认为全部周次"),
+    min_capacity: int = Query(None, ge=1, description="最小容量"),
+    room_type: str = Query(None, description="教室类型"),
+    building: str = Query(None, description="教学楼"),
+    semester: str = Query(None, description="学期，默认不区分学期"),
+    page: int = Query(None, ge=1),
+    pageSize: int = Query(20, ge=1, le=100),
+    _: Any = Depends(deps.check_permissions(["CLASSROOM_VIEW"])),
+) -> Any:
+    """
+    获取指定时间段可用的教室
+    与所选星期、时间段和周次有任何重叠的教室均视为被占用；指定page时返回分页结果
+    """
+    try:
+        start_minutes = time_to_minutes(start_time)
+        end_minutes = time_to_minutes(end_time) if end_time else default_slot_end(start_minutes)
+        if start_minutes is None or end_minutes is None:
+            raise HTTPException(status_code=400, detail="时间格式错误，应为HH:MM")
+        if start_minutes >= end_minutes:
+            raise HTTPException(status_code=400, detail="开始时间必须早于结束时间")
+        
+        weeks_mask = WeekMask.parse(weeks) if weeks else WeekMask(ALL_WEEKS)
+        if not weeks_mask:
+            raise HTTPException(status_code=400, detail="周数格式无效")
+        
+        # 容量、类型等静态条件在数据库中过滤，时间占用由位图判断
+        query = db.query(Classroom.classroom_id).filter(Classroom.status == 1)
+        if min_capacity:
+            query = query.filter(Classroom.capacity >= min_capacity)
+        if room_type:
+            query = query.filter(Classroom.room_type == room_type)
+        if building:
+            query = query.filter(Classroom.building == building)
+        candidate_ids = [row[0] for row in query.order_by(Classroom.capacity, Classroom.classroom_id).all()]
+        
+        free_ids = room_occupancy.free_classrooms(
+            db, candidate_ids, day_of_week, start_minutes, end_minutes, int(weeks_mask), semester
+        )
+        page_ids = free_ids[(page - 1) * pageSize:page * pageSize] if page else free_ids
+        
+        classrooms = {}
+        if page_ids:
+            classrooms = {
+                classroom.classroom_id: classroom
+                for classroom in db.query(Classroom).filter(Classroom.classroom_id.in_(page_ids)).all()
+            }
+        
+        # 构建响应，按容量从小到大排列
+        classroom_list = []
+        for classroom_id in page_ids:
+            classroom = classrooms[classroom_id]
+            classroom_list.append({
+                "classroom_id": classroom.classroom_id,
+                "room_no": classroom.room_no,
+                "building": classroom.building,
+                "floor": classroom.floor,
+                "capacity": classroom.capacity,
+                "room_type": classroom.room_type,
+                "equipment": parse_equipment(classroom.equipment),
+                "status": classroom.status
+            })
+        
+        if page:
+            data = {
+                "list": classroom_list,
+                "total": len(free_ids),
+                "page": page,
+                "pageSize": pageSize
+            }
+        else:
+            data = classroom_list
+        
+        return {
+            "code": 0,
+            "message": "获取成功",
+            "data": data
+        }
+    except HTTPException as http_exc:
+        raise http_exc
+    except Exception as e:
+        error_msg = f"获取可用教室失败: {str(e)}\n{traceback.format_exc()}"
+        print(error_msg)
+        raise HTTPException(status_code=500, detail=f"获取可用教室失败: {str(e)}")
+
+
+def default_slot_end(start_minutes):
+    """
+    未指定结束时间时，使用开始时间所在节次的结束时间，不在任何节次内则只检查开始时刻
+    """
+    if start_minutes is None:
+        return None
+    for slot in settings.TIMETABLE_SLOTS:
+        slot_start, slot_end = parse_slot(slot)
+        if slot_start <= start_minutes < slot_end:
+            return slot_end
+    return start_minutes + SLOT_MINUTES
+
+
 @router.get("/{classroom_id}", response_model=None)
 def get_classroom(
     classroom_id: int,
@@ -541,66 +650,3 @@ def get_classrooms_by_type(
         error_msg = f"获取教室列表失败: {str(e)}\n{traceback.format_exc()}"
         print(error_msg)
         raise HTTPException(status_code=500, detail=f"获取教室列表失败: {str(e)}")
-
-
-@router.get("/available", response_model=None)
-def get_available_classrooms(
-    db: Session = Depends(get_db),
-    day_of_week: int = Query(..., description="星期几，1-7表示周一到周日"),
-    start_time: str = Query(..., description="开始时间，格式HH:MM"),
-    semester: str = Query(None, description="学期"),
-    _: Any = Depends(deps.check_permissions(["CLASSROOM_VIEW"])),
-) -> Any:
-    """
-    获取指定时间可用的教室
-    """
-    try:
-        # 找出在指定时间被占用的教室ID
-        query = db.query(Schedule.classroom_id).filter(
-            Schedule.day_of_week == day_of_week,
-            Schedule.start_time == start_time
-        )
-        
-        # 如果指定了学期，则根据学期过滤
-        if semester:
-            query = query.join(CourseOffering, Schedule.offering_id == CourseOffering.offering_id).filter(
-                CourseOffering.semester == semester
-            )
-        
-        # 获取被占用的教室ID列表
-        occupied_classroom_ids = [r[0] for r in query.all()]
-        
-        # 查询可用的教室
-        available_classrooms = db.query(Classroom).filter(
-            Classroom.status == 1,
-            ~Classroom.classroom_id.in_(occupied_classroom_ids) if occupied_classroom_ids else True
-        ).all()
-        
-        # 构建响应
-        classroom_list = []
-        for classroom in available_classrooms:
-            # 解析设备
-            equipment_array = parse_equipment(classroom.equipment)
-            
-            classroom_data = {
-                "classroom_id": classroom.classroom_id,
-                "room_no": classroom.room_no,
-                "building": classroom.building,
-                "floor": classroom.floor,
-                "capacity": classroom.capacity,
-                "room_type": classroom.room_type,
-                "equipment": equipment_array,
-                "status": classroom.status
-            }
-            classroom_list.append(classroom_data)
-        
-        # 直接返回
-        return {
-            "code": 0,
-            "message": "获取成功",
-            "data": classroom_list
-        }
-    except Exception as e:
-        error_msg = f"获取可用教室失败: {str(e)}\n{traceback.format_exc()}"
-        print(error_msg)
-        raise HTTPException(status_code=500, detail=f"获取可用教室失败: {str(e)}") 
\ No newline at end of file
@@ -1,21 +1,34 @@
+from datetime import datetime
 from typing import Any, List
 import traceback
 
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import desc
+from sqlalchemy import desc, insert, update
+from sqlalchemy.exc import IntegrityError
 
 from app.api import deps
-from app.db.database import get_db
+from app.core.enrollment_engine import (
+    ALLOCATION_FCFS, ALLOCATION_MODES, enrolled_counts, promote_waitlist, reconcile_seat_counters
+)
+from app.core.grade_summary import apply_grade_changes
+from app.core.grading import compute_grades
+from app.core.jobs import SUCCEEDED, Job, job_registry
+from app.core.ranking import ranking_cache
+from app.core.schedule_index import TEACHER, schedule_index
+from app.core.timetable_cache import timetable_cache
+from app.db.database import SessionLocal, get_db
 from app.models.course import Course, CourseOffering, Schedule
 from app.models.teacher import Teacher
-from app.models.enrollment import Enrollment
+from app.models.enrollment import Enrollment, Grade
 from app.models.student import Student
+from app.models.user import User
 from app.schemas.common import APIResponse, PaginatedResponse
 from app.schemas.course import (
     CourseOfferingCreate, CourseOfferingDetail, CourseOfferingInfo,
     CourseOfferingResponse, CourseOfferingUpdate
 )
+from app.schemas.enrollment import GradeRosterSubmit
 
 # 定义状态枚举
 class OfferingStatus:
@@ -64,29 +77,26 @@ def list_course_offerings(
         
         # 构建响应
         offering_list = []
-        for offering in offerings:
-            # 获取已选课程人数
-            enrolled_count = db.query(Enrollment).filter(
-                Enrollment.offering_id == offering.offering_id,
-                Enrollment.status == True
-            ).count()
-            
-            # 获取排课信息
-            schedules_query = db.query(Schedule).filter(Schedule.offering_id == offering.offering_id).all()
-            schedules = []
-            for schedule in schedules_query:
-                classroom_info = ""
-                if hasattr(schedule, 'classroom') and schedule.classroom:
-                    classroom_info = f"{schedule.classroom.building}-{schedule.classroom.room_no}"
-                
-                schedule_data = {
+        # 已选人数与排课信息按本页开课一次获取
+        enrolled_map = enrolled_counts(db, offerings)
+        schedule_map = {}
+        if offerings:
+            for schedule in db.query(Schedule).filter(
+                Schedule.offering_id.in_([offering.offering_id for offering in offerings])
+            ).order_by(Schedule.schedule_id).all():
+                schedule_map.setdefault(schedule.offering_id, []).append({
                     "id": schedule.schedule_id,
                     "day_of_week": schedule.day_of_week,
                     "start_time": schedule.start_time,
                     "end_time": schedule.end_time,
                     "weeks": schedule.weeks
-                }
-                schedules.append(schedule_data)
+                })
+        for offering in offerings:
+            # 获取已选课程人数
+            enrolled_count = enrolled_map.get(offering.offering_id, 0)
+            
+            # 获取排课信息
+            schedules = schedule_map.get(offering.offering_id, [])
             
             # 状态映射
             status_map = {
@@ -121,6 +131,7 @@ def list_course_offerings(
                 "max_students": offering.max_students,
                 "current_students": enrolled_count,
                 "status": status_map.get(offering.status, 0),
+                "allocation_mode": offering.allocation_mode,
                 "schedules": schedules,
                 "createdAt": offering.created_at.isoformat() if hasattr(offering, 'created_at') and offering.created_at else None
             }
@@ -188,6 +199,10 @@ def create_course_offering(
         if existing:
             raise HTTPException(status_code=400, detail="该课程在本学期已由该教师开课")
         
+        allocation_mode = offering_data.get("allocation_mode") or ALLOCATION_FCFS
+        if allocation_mode not in ALLOCATION_MODES:
+            raise HTTPException(status_code=400, detail=f"分配方式必须是以下之一: {', '.join(ALLOCATION_MODES)}")
+        
         # 创建新开课
         new_offering = CourseOffering(
             course_id=offering_data["course_id"],
@@ -195,7 +210,8 @@ def create_course_offering(
             semester=offering_data["semester"],
             max_students=offering_data["max_students"],
             current_students=0,  # 初始选课人数为0
-            status=offering_data.get("status", True)
+            status=offering_data.get("status", True),
+            allocation_mode=allocation_mode
         )
         
         db.add(new_offering)
@@ -230,6 +246,7 @@ def create_course_offering(
             "max_students": new_offering.max_students,
             "current_students": 0,
             "status": new_offering.status,
+            "allocation_mode": new_offering.allocation_mode,
             "schedules": []
         }
         
@@ -246,6 +263,158 @@ def create_course_offering(
         raise HTTPException(status_code=500, detail=f"创建开课失败: {str(e)}")
 
 
+@router.get("/semesters", response_model=APIResponse)
+def get_semesters(
+    db: Session = Depends(get_db),
+    _: Any = Depends(deps.check_permissions(["COURSE_OFFERING_VIEW"])),
+) -> Any:
+    """
+    获取所有学期列表
+    """
+    try:
+        # 查询所有不同的学期
+        semesters = db.query(CourseOffering.semester).distinct().order_by(desc(CourseOffering.semester)).all()
+        semester_list = [semester[0] for semester in semesters]
+        
+        return APIResponse(
+            code=0,
+            message="获取成功",
+            data=semester_list
+        )
+    except Exception as e:
+        error_msg = f"获取学期列表失败: {str(e)}\n{traceback.format_exc()}"
+        print(error_msg)
+        raise HTTPException(status_code=500, detail=f"获取学期列表失败: {str(e)}")
+
+
+@router.get("/info-list", response_model=APIResponse)
+def get_course_offering_info_list(
+    db: Session = Depends(get_db),
+    page: int = Query(1, ge=1),
+    pageSize: int = Query(20, ge=1, le=100, alias="page_size"),
+    semester: str = None,
+    course_id: int = None,
+    teacher_id: int = None,
+    _: Any = Depends(deps.check_permissions(["COURSE_OFFERING_VIEW"])),
+) -> Any:
+    """
+    获取开课信息列表（详细信息）
+    """
+    try:
+        # 创建一个包含关联对象的查询
+        query = db.query(CourseOffering).options(
+            joinedload(CourseOffering.course),
+            joinedload(CourseOffering.teacher).joinedload(Teacher.user)
+        )
+        
+        # 应用过滤条件
+        if semester:
+            query = query.filter(CourseOffering.semester == semester)
+        if course_id:
+            query = query.filter(CourseOffering.course_id == course_id)
+        if teacher_id:
+            query = query.filter(CourseOffering.teacher_id == teacher_id)
+        
+        # 计算总数
+        total = query.count()
+        
+        # 分页
+        offerings = query.offset((page - 1) * pageSize).limit(pageSize).all()
+        
+        # 构建响应
+        offering_list = []
+        # 已选人数按本页开课一次获取
+        enrolled_map = enrolled_counts(db, offerings)
+        for offering in offerings:
+            # 获取已选课程人数
+            enrolled_count = enrolled_map.get(offering.offering_id, 0)
+            
+            # 计算选课率
+            enrollment_rate = 0
+            if offering.max_students > 0:
+                enrollment_rate = round((enrolled_count / offering.max_students) * 100, 2)
+            
+            offering_data = {
+                "offering_id": offering.offering_id,
+                "course_code": offering.course.course_code if offering.course else "",
+                "course_name": offering.course.course_name if offering.course else "",
+                "credits": float(offering.course.credits) if offering.course else 0,
+                "hours": offering.course.hours if offering.course else 0,
+                "course_type": offering.course.course_type if offering.course else "",
+                "teacher_name": offering.teacher.user.real_name if offering.teacher and offering.teacher.user else "",
+                "dept_name": offering.teacher.department.dept_name if offering.teacher and offering.teacher.department else "",
+                "semester": offering.semester,
+                "max_students": offering.max_students,
+                "current_students": enrolled_count,
+                "enrollment_rate": enrollment_rate
+            }
+            
+            offering_list.append(offering_data)
+        
+        # 构建前端期望的响应格式
+        response_data = {
+            "list": offering_list,
+            "total": total,
+            "page": page,
+            "pageSize": pageSize,
+            "totalPages": (total + pageSize - 1) // pageSize
+        }
+        
+        return APIResponse(
+            code=0,
+            message="获取成功",
+            data=response_data
+        )
+    except Exception as e:
+        error_msg = f"获取开课信息列表失败: {str(e)}\n{traceback.format_exc()}"
+        print(error_msg)
+        raise HTTPException(status_code=500, detail=f"获取开课信息列表失败: {str(e)}")
+
+
+@router.post("/seat-counters/reconcile", response_model=APIResponse)
+def reconcile_seat_counter_job(
+    semester: str = None,
+    _: Any = Depends(deps.check_permissions(["COURSE_OFFERING_MANAGE", "ENROLLMENT_MANAGE"])),
+) -> Any:
+    """
+    提交已选人数校准任务，按选课记录修正 current_students 的漂移，可按学期限定范围
+    """
+    job = job_registry.submit("seat_reconcile", lambda job: run_seat_reconcile(job, semester), {"semester": semester})
+    return APIResponse(
+        code=0,
+        message="校准任务已提交",
+        data=job.to_dict()
+    )
+
+
+@router.get("/seat-counters/jobs/{job_id}", response_model=APIResponse)
+def get_seat_reconcile_job(
+    job_id: str,
+    _: Any = Depends(deps.check_permissions(["COURSE_OFFERING_MANAGE", "ENROLLMENT_MANAGE"])),
+) -> Any:
+    """
+    查询已选人数校准任务，完成后返回被修正的开课
+    """
+    job = job_registry.get(job_id)
+    if job is None or job.kind != "seat_reconcile":
+        raise HTTPException(status_code=404, detail="校准任务不存在")
+    return APIResponse(
+        code=0,
+        message="获取校准任务成功",
+        data=job.to_dict(include_result=job.status == SUCCEEDED)
+    )
+
+
+def run_seat_reconcile(job: Job, semester: str = None) -> Any:
+    db = SessionLocal()
+    try:
+        drifts = reconcile_seat_counters(db, semester, progress=lambda value: job.update(progress=value))
+    finally:
+        db.close()
+    job.update(message=f"已修正{len(drifts)}个开课")
+    return {"corrected": len(drifts), "drifts": drifts}
+
+
 @router.get("/{offering_id}", response_model=APIResponse)
 def get_course_offering(
     offering_id: int,
@@ -265,10 +434,7 @@ def get_course_offering(
             raise HTTPException(status_code=404, detail="开课记录不存在")
         
         # 获取已选课程人数
-        enrolled_count = db.query(Enrollment).filter(
-            Enrollment.offering_id == offering.offering_id,
-            Enrollment.status == True
-        ).count()
+        enrolled_count = enrolled_counts(db, [offering]).get(offering.offering_id, 0)
         
         # 获取排课信息
         schedules_query = db.query(Schedule).filter(Schedule.offering_id == offering_id).all()
@@ -324,6 +490,7 @@ def get_course_offering(
             "max_students": offering.max_students,
             "current_students": enrolled_count,
             "status": status_map.get(offering.status, 0),
+            "allocation_mode": offering.allocation_mode,
             "schedules": schedules,
             "createdAt": offering.created_at.isoformat() if hasattr(offering, 'created_at') and offering.created_at else None
         }
@@ -375,8 +542,13 @@ def update_course_offering(
             if existing:
                 raise HTTPException(status_code=400, detail="该课程在本学期已由该教师开课")
         
+        if "allocation_mode" in offering_data and offering_data["allocation_mode"] not in ALLOCATION_MODES:
+            raise HTTPException(status_code=400, detail=f"分配方式必须是以下之一: {', '.join(ALLOCATION_MODES)}")
+        
         # 更新字段
-        update_fields = ["teacher_id", "max_students", "status"]
+        old_teacher_id = offering.teacher_id
+        old_max_students = offering.max_students
+        update_fields = ["teacher_id", "max_students", "status", "allocation_mode"]
         for field in update_fields:
             if field in offering_data:
                 setattr(offering, field, offering_data[field])
@@ -384,6 +556,16 @@ def update_course_offering(
         db.commit()
         db.refresh(offering)
         
+        # 更换教师后，两位教师的排课冲突索引都需要重新加载
+        if offering.teacher_id != old_teacher_id:
+            schedule_index.invalidate(TEACHER, old_teacher_id)
+            schedule_index.invalidate(TEACHER, offering.teacher_id)
+            timetable_cache.invalidate_offering(offering.offering_id)
+        
+        # 扩容后按候补顺序递补新增的名额
+        if (offering.max_students or 0) > (old_max_students or 0):
+            promote_waitlist(db, offering_id)
+        
         # 重新加载关联数据
         offering = db.query(CourseOffering).options(
             joinedload(CourseOffering.course),
@@ -391,10 +573,7 @@ def update_course_offering(
         ).filter(CourseOffering.offering_id == offering_id).first()
         
         # 获取已选课程人数
-        enrolled_count = db.query(Enrollment).filter(
-            Enrollment.offering_id == offering.offering_id,
-            Enrollment.status == True
-        ).count()
+        enrolled_count = enrolled_counts(db, [offering]).get(offering.offering_id, 0)
         
         # 获取排课信息
         schedules_query = db.query(Schedule).filter(Schedule.offering_id == offering_id).all()
@@ -441,6 +620,7 @@ def update_course_offering(
             "max_students": offering.max_students,
             "current_students": enrolled_count,
             "status": offering.status,
+            "allocation_mode": offering.allocation_mode,
             "schedules": schedules,
             "createdAt": offering.created_at.isoformat() if hasattr(offering, 'created_at') and offering.created_at else None
         }
@@ -458,6 +638,137 @@ def update_course_offering(
         raise HTTPException(status_code=500, detail=f"更新开课失败: {str(e)}")
 
 
+@router.put("/{offering_id}/grades", response_model=APIResponse)
+def submit_offering_grades(
+    offering_id: int,
+    grade_in: GradeRosterSubmit,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_user),
+    is_manager: bool = Depends(deps.check_permissions(["GRADE_MANAGE"], required=False)),
+    _: Any = Depends(deps.check_permissions(["GRADE_MANAGE", "GRADE_INPUT", "GRADE_UPDATE", "GRADE_EDIT"])),
+) -> Any:
+    """
+    批量录入教学班成绩
+    一次提交整个教学班的成绩，最终成绩和绩点统一计算，已有成绩更新、没有的新增，
+    学生的学分与GPA汇总按差量同步更新，均在同一事务中完成；
+    同一教学班的并发提交按开课行锁串行执行，旧成绩在锁内读取
+    """
+    try:
+        offering = db.query(CourseOffering).filter(
+            CourseOffering.offering_id == offering_id
+        ).with_for_update().first()
+        if not offering:
+            raise HTTPException(status_code=404, detail="开课记录不存在")
+
+        # 非成绩管理员只能录入自己任教的课程
+        teacher = db.query(Teacher).filter(Teacher.user_id == current_user.user_id).first()
+        if not is_manager and (teacher is None or teacher.teacher_id != offering.teacher_id):
+            raise HTTPException(status_code=403, detail="只能录入自己任教课程的成绩")
+
+        if not grade_in.grades:
+            raise HTTPException(status_code=400, detail="没有需要录入的成绩")
+
+        # 一次查询加载教学班的选课记录及已有成绩，使用加锁读取以读到已提交的最新成绩
+        roster = db.query(
+            Enrollment.enrollment_id, Enrollment.student_id, Grade.grade_id,
+            Grade.final_score, Grade.grade_point
+        ).outerjoin(
+            Grade, Grade.enrollment_id == Enrollment.enrollment_id
+        ).filter(
+            Enrollment.offering_id == offering_id,
+            Enrollment.status == True
+        ).with_for_update().all()
+        by_enrollment = {row.enrollment_id: row for row in roster}
+        by_student = {row.student_id: row for row in roster}
+
+        errors = []
+        entries = []
+        seen = set()
+        for row_no, entry in enumerate(grade_in.grades, start=1):
+            if entry.enrollment_id is not None:
+                target = by_enrollment.get(entry.enrollment_id)
+            elif entry.student_id is not None:
+                target = by_student.get(entry.student_id)
+            else:
+                errors.append(f"第{row_no}行: 缺少参数 enrollment_id 或 student_id")
+                continue
+            if target is None:
+                errors.append(f"第{row_no}行: 该学生未选修本课程")
+            elif target.enrollment_id in seen:
+                errors.append(f"第{row_no}行: 同一学生的成绩重复提交")
+            else:
+                seen.add(target.enrollment_id)
+                entries.append((target, entry))
+        if errors:
+            raise HTTPException(status_code=400, detail=f"成绩数据有误，未录入任何成绩: {'；'.join(errors[:20])}")
+
+        final_scores, grade_points = compute_grades(
+            [entry.usual_score for _, entry in entries],
+            [entry.exam_score for _, entry in entries],
+            [entry.final_score for _, entry in entries],
+        )
+
+        recorded_by = teacher.teacher_id if teacher is not None else None
+        recorded_at = datetime.now()
+        credits = offering.course.credits if offering.course else 0
+        inserts, updates, items, changes = [], [], [], []
+        for (target, entry), final_score, grade_point in zip(entries, final_scores, grade_points):
+            values = {
+                "usual_score": entry.usual_score,
+                "exam_score": entry.exam_score,
+                "final_score": final_score,
+                "grade_point": grade_point,
+                "recorded_by": recorded_by,
+                "recorded_at": recorded_at,
+            }
+            if target.grade_id is None:
+                inserts.append(dict(values, enrollment_id=target.enrollment_id))
+            else:
+                updates.append(dict(values, grade_id=target.grade_id))
+            items.append(dict(values, enrollment_id=target.enrollment_id, student_id=target.student_id))
+            changes.append({
+                "student_id": target.student_id,
+                "semester": offering.semester,
+                "credits": credits,
+                "old": (target.final_score, target.grade_point) if target.grade_id is not None else None,
+                "new": (final_score, grade_point),
+            })
+
+        try:
+            if updates:
+                db.execute(update(Grade), updates)
+            if inserts:
+                db.execute(insert(Grade), inserts)
+            apply_grade_changes(db, changes)
+            db.commit()
+        except IntegrityError:
+            # 其他请求已为同一选课新增了成绩
+            db.rollback()
+            raise HTTPException(status_code=409, detail="成绩已被其他请求录入，请刷新后重试")
+        except Exception:
+            db.rollback()
+            raise
+        ranking_cache.invalidate([offering.semester])
+
+        return APIResponse(
+            code=0,
+            message=f"录入成功，新增{len(inserts)}条，更新{len(updates)}条",
+            data={
+                "offering_id": offering_id,
+                "created": len(inserts),
+                "updated": len(updates),
+                "ungraded": sum(1 for row in roster if row.grade_id is None and row.enrollment_id not in seen),
+                "list": items
+            }
+        )
+    except HTTPException as http_exc:
+        raise http_exc
+    except Exception as e:
+        error_msg = f"录入成绩失败: {str(e)}\n{traceback.format_exc()}"
+        print(error_msg)
+        raise HTTPException(status_code=500, detail=f"录入成绩失败: {str(e)}")
+
+
 @router.delete("/{offering_id}", response_model=APIResponse)
 def delete_course_offering(
     offering_id: int,
@@ -532,12 +843,11 @@ def get_offerings_by_course(
         
         # 构建响应
         offering_list = []
+        # 已选人数按本页开课一次获取
+        enrolled_map = enrolled_counts(db, offerings)
         for offering in offerings:
             # 获取已选课程人数
-            enrolled_count = db.query(Enrollment).filter(
-                Enrollment.offering_id == offering.offering_id,
-                Enrollment.status == True
-            ).count()
+            enrolled_count = enrolled_map.get(offering.offering_id, 0)
             
             offering_data = {
                 "id": offering.offering_id,
@@ -594,12 +904,11 @@ def get_offerings_by_teacher(
         
         # 构建响应
         offering_list = []
+        # 已选人数按本页开课一次获取
+        enrolled_map = enrolled_counts(db, offerings)
         for offering in offerings:
             # 获取已选课程人数
-            enrolled_count = db.query(Enrollment).filter(
-                Enrollment.offering_id == offering.offering_id,
-                Enrollment.status == True
-            ).count()
+            enrolled_count = enrolled_map.get(offering.offering_id, 0)
             
             offering_data = {
                 "id": offering.offering_id,
@@ -645,12 +954,11 @@ def get_offerings_by_semester(
         
         # 构建响应
         offering_list = []
+        # 已选人数按本页开课一次获取
+        enrolled_map = enrolled_counts(db, offerings)
         for offering in offerings:
             # 获取已选课程人数
-            enrolled_count = db.query(Enrollment).filter(
-                Enrollment.offering_id == offering.offering_id,
-                Enrollment.status == True
-            ).count()
+            enrolled_count = enrolled_map.get(offering.offering_id, 0)
             
             offering_data = {
                 "id": offering.offering_id,
@@ -698,7 +1006,8 @@ def get_enrollment_list(
         # 查询选课学生
         enrollments = db.query(Enrollment).options(
             joinedload(Enrollment.student).joinedload(Student.user),
-            joinedload(Enrollment.student).joinedload(Student.department)
+            joinedload(Enrollment.student).joinedload(Student.department),
+            joinedload(Enrollment.grade)
         ).filter(
             Enrollment.offering_id == offering_id,
             Enrollment.status == True
@@ -708,6 +1017,7 @@ def get_enrollment_list(
         student_list = []
         for enrollment in enrollments:
             student = enrollment.student
+            grade = enrollment.grade
             if student and student.user:
                 student_data = {
                     "enrollment_id": enrollment.enrollment_id,
@@ -717,8 +1027,11 @@ def get_enrollment_list(
                     "department": student.department.dept_name if student.department else None,
                     "class_name": student.class_name,
                     "grade": student.grade,
-                    "enrollment_time": str(enrollment.enrollment_time),
-                    "score": enrollment.score
+                    "enrollment_time": str(enrollment.enrollment_date) if enrollment.enrollment_date else "",
+                    "usual_score": float(grade.usual_score) if grade and grade.usual_score is not None else None,
+                    "exam_score": float(grade.exam_score) if grade and grade.exam_score is not None else None,
+                    "score": float(grade.final_score) if grade and grade.final_score is not None else None,
+                    "grade_point": float(grade.grade_point) if grade and grade.grade_point is not None else None
                 }
                 student_list.append(student_data)
         
@@ -733,112 +1046,3 @@ def get_enrollment_list(
         error_msg = f"获取选课学生列表失败: {str(e)}\n{traceback.format_exc()}"
         print(error_msg)
         raise HTTPException(status_code=500, detail=f"获取选课学生列表失败: {str(e)}")
-
-
-@router.get("/semesters", response_model=APIResponse)
-def get_semesters(
-    db: Session = Depends(get_db),
-    _: Any = Depends(deps.check_permissions(["COURSE_OFFERING_VIEW"])),
-) -> Any:
-    """
-    获取所有学期列表
-    """
-    try:
-        # 查询所有不同的学期
-        semesters = db.query(CourseOffering.semester).distinct().order_by(desc(CourseOffering.semester)).all()
-        semester_list = [semester[0] for semester in semesters]
-        
-        return APIResponse(
-            code=0,
-            message="获取成功",
-            data=semester_list
-        )
-    except Exception as e:
-        error_msg = f"获取学期列表失败: {str(e)}\n{traceback.format_exc()}"
-        print(error_msg)
-        raise HTTPException(status_code=500, detail=f"获取学期列表失败: {str(e)}")
-
-
-@router.get("/info-list", response_model=APIResponse)
-def get_course_offering_info_list(
-    db: Session = Depends(get_db),
-    page: int = Query(1, ge=1),
-    pageSize: int = Query(20, ge=1, le=100, alias="page_size"),
-    semester: str = None,
-    course_id: int = None,
-    teacher_id: int = None,
-    _: Any = Depends(deps.check_permissions(["COURSE_OFFERING_VIEW"])),
-) -> Any:
-    """
-    获取开课信息列表（详细信息）
-    """
-    try:
-        # 创建一个包含关联对象的查询
-        query = db.query(CourseOffering).options(
-            joinedload(CourseOffering.course),
-            joinedload(CourseOffering.teacher).joinedload(Teacher.user)
-        )
-        
-        # 应用过滤条件
-        if semester:
-            query = query.filter(CourseOffering.semester == semester)
-        if course_id:
-            query = query.filter(CourseOffering.course_id == course_id)
-        if teacher_id:
-            query = query.filter(CourseOffering.teacher_id == teacher_id)
-        
-        # 计算总数
-        total = query.count()
-        
-        # 分页
-        offerings = query.offset((page - 1) * pageSize).limit(pageSize).all()
-        
-        # 构建响应
-        offering_list = []
-        for offering in offerings:
-            # 获取已选课程人数
-            enrolled_count = db.query(Enrollment).filter(
-                Enrollment.offering_id == offering.offering_id,
-                Enrollment.status == True
-            ).count()
-            
-            # 计算选课率
-            enrollment_rate = 0
-            if offering.max_students > 0:
-                enrollment_rate = round((enrolled_count / offering.max_students) * 100, 2)
-            
-            offering_data = {
-                "offering_id": offering.offering_id,
-                "course_code": offering.course.course_code if offering.course else "",
-                "course_name": offering.course.course_name if offering.course else "",
-                "credits": float(offering.course.credits) if offering.course else 0,
-                "hours": offering.course.hours if offering.course else 0,
-                "course_type": offering.course.course_type if offering.course else "",
-                "teacher_name": offering.teacher.user.real_name if offering.teacher and offering.teacher.user else "",
-                "dept_name": offering.teacher.department.dept_name if offering.teacher and offering.teacher.department else "",
-                "semester": offering.semester,
-                "max_students": offering.max_students,
-                "current_students": enrolled_count,
-                "enrollment_rate": enrollment_rate
-            }
-            
-            offering_list.append(offering_data)
-        
-        # 构建前端期望的响应格式
-        response_data = {
-            "list": offering_list,
-            "total": total,
-            "page": page,
-            "pageSize": pageSize,
-            "totalPages": (total + pageSize - 1) // pageSize
-        }
-        
-        return APIResponse(
-            code=0,
-            message="获取成功",
-            data=response_data
-        )
-    except Exception as e:
-        error_msg = f"获取开课信息列表失败: {str(e)}\n{traceback.format_exc()}"
-        print(error_msg)
-        raise HTTPException(status_code=500, detail=f"获取开课信息列表失败: {str(e)}") 
\ No newline at end of file
@@ -5,9 +5,12 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session, joinedload
 
 from app.api import deps
+from app.core.grade_summary import rebuild_grade_summaries
+from app.core.ranking import ranking_cache
 from app.db.database import get_db
 from app.models.course import Course, CourseOffering
 from app.models.department import Department
+from app.models.enrollment import Enrollment, Grade
 from app.schemas.common import APIResponse, PaginatedResponse
 from app.schemas.course import (
     CourseCreate, CourseDetail, CourseResponse, CourseUpdate
@@ -308,12 +311,28 @@ def update_course(
     if "course_type" in update_data:
         update_data["course_type"] = type_mapping.get(update_data["course_type"], "选修")
     
+    # 学分变化时，选修过该课程且已有成绩的学生需要重建学分与GPA汇总
+    credits_changed = update_data.get("credits") is not None and float(update_data["credits"]) != float(course.credits)
+    
     # 更新课程信息
     for key, value in update_data.items():
         setattr(course, key, value)
     
+    if credits_changed:
+        db.flush()
+        affected = [
+            row.student_id for row in db.query(Enrollment.student_id).join(
+                CourseOffering, Enrollment.offering_id == CourseOffering.offering_id
+            ).join(
+                Grade, Grade.enrollment_id == Enrollment.enrollment_id
+            ).filter(CourseOffering.course_id == course_id).distinct().all()
+        ]
+        rebuild_grade_summaries(db, affected, commit=False)
+    
     db.commit()
     db.refresh(course)
+    if credits_changed:
+        ranking_cache.invalidate()
     
     # 准备返回数据，按照前端期望的格式
     department = db.query(Department).filter(Department.dept_id == course.dept_id).first()
@@ -0,0 +1,807 @@
+from typing import Any, Dict, List, Optional
+import csv
+import io
+import traceback
+import uuid
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.api import deps
+from app.core.admission import AdmissionRejected, enrollment_admission
+from app.core.config import settings
+from app.core.enrollment_allocator import allocate
+from app.core.enrollment_engine import (
+    ALLOCATION_PREFERENCE, SLOT_COLUMNS, WAITLIST_WAITING, EnrollmentError, apply_allocation,
+    build_allocation_problem, cancel_waitlist, enroll, join_waitlist, schedule_slots, slots_overlap,
+    submit_preferences, waitlist_position, withdraw
+)
+from app.core.jobs import SUCCEEDED, Job, get_process_pool, job_registry
+from app.core.timetable_cache import timetable_cache
+from app.db.database import get_db
+from app.models.course import Course, CourseOffering, Schedule
+from app.models.enrollment import Enrollment, EnrollmentPreference, EnrollmentWaitlist
+from app.models.student import Student
+from app.models.user import User
+from app.schemas.common import APIResponse
+from app.schemas.enrollment import AllocationJobCreate, EnrollmentCreate, PreferenceSubmit
+
+router = APIRouter()
+
+
+def enrollment_to_dict(enrollment: Enrollment) -> dict:
+    return {
+        "enrollment_id": enrollment.enrollment_id,
+        "student_id": enrollment.student_id,
+        "offering_id": enrollment.offering_id,
+        "enrollment_date": enrollment.enrollment_date,
+        "status": 1 if enrollment.status else 0
+    }
+
+
+def resolve_student_id(current_user: User, requested_id: Any, is_manager: bool) -> int:
+    """
+    确定操作的学生：管理员可指定任意学生，学生只能操作本人
+    """
+    if is_manager and requested_id is not None:
+        return requested_id
+    own_student = getattr(current_user, "student_info", None)
+    if not own_student:
+        raise HTTPException(status_code=400, detail="请指定学生")
+    if requested_id is not None and requested_id != own_student.student_id:
+        raise HTTPException(status_code=403, detail="只能为本人选课")
+    return own_student.student_id
+
+
+def waitlist_to_dict(entry: EnrollmentWaitlist, position: Optional[int] = None) -> dict:
+    return {
+        "waitlist_id": entry.waitlist_id,
+        "student_id": entry.student_id,
+        "offering_id": entry.offering_id,
+        "status": entry.status,
+        "position": position,
+        "created_at": entry.created_at
+    }
+
+
+def admission_error(e: AdmissionRejected) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail=f"{e.detail}，建议{e.retry_after_ms}毫秒后重试",
+        headers={"Retry-After": str(e.retry_after_seconds)}
+    )
+
+
+def load_own_enrollment(db: Session, current_user: User, enrollment_id: int, is_manager: bool) -> Enrollment:
+    """
+    获取选课记录，学生只能获取本人的记录
+    """
+    enrollment = db.query(Enrollment).filter(Enrollment.enrollment_id == enrollment_id).first()
+    if not enrollment:
+        raise HTTPException(status_code=404, detail="选课记录不存在")
+    if not is_manager:
+        own_student = getattr(current_user, "student_info", None)
+        if not own_student or own_student.student_id != enrollment.student_id:
+            raise HTTPException(status_code=403, detail="只能退选本人的课程")
+    return enrollment
+
+
+@router.post("", response_model=APIResponse)
+async def create_enrollment(
+    enrollment_in: EnrollmentCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_active_user),
+    is_manager: bool = Depends(deps.check_permissions(["ENROLLMENT_CREATE", "ENROLLMENT_MANAGE"], required=False)),
+    _: Any = Depends(deps.check_permissions(["ENROLLMENT_CREATE", "ENROLLMENT_MANAGE", "MY_ENROLLMENT_VIEW"])),
+) -> Any:
+    """
+    选课
+
+    在一个短事务内完成学分上限、时间冲突校验与原子占座，课程满员返回409，
+    指定 join_waitlist 时满员则加入候补；
+    请求先经过准入控制排队，繁忙时返回429及 Retry-After
+    """
+    try:
+        student_id = await run_in_threadpool(resolve_student_id, current_user, enrollment_in.student_id, is_manager)
+        # 排队期间不占用数据库连接，获得准入后会话自动重新取得连接
+        await run_in_threadpool(db.close)
+        async with enrollment_admission.admit(student_id, enrollment_in.offering_id):
+            try:
+                enrollment = await run_in_threadpool(enroll, db, student_id, enrollment_in.offering_id)
+            except EnrollmentError as e:
+                if e.status_code != 409 or not enrollment_in.join_waitlist:
+                    raise
+                entry, position = await run_in_threadpool(join_waitlist, db, student_id, enrollment_in.offering_id)
+                return APIResponse(
+                    code=0,
+                    message=f"课程已满，已加入候补，当前排第{position}位",
+                    data=waitlist_to_dict(entry, position)
+                )
+        return APIResponse(
+            code=0,
+            message="选课成功",
+            data=enrollment_to_dict(enrollment)
+        )
+    except AdmissionRejected as e:
+        raise admission_error(e)
+    except EnrollmentError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"选课失败: {str(e)}\n{traceback.format_exc()}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"选课失败: {str(e)}"
+        )
+
+
+@router.delete("/{enrollment_id}", response_model=APIResponse)
+async def delete_enrollment(
+    enrollment_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_active_user),
+    is_manager: bool = Depends(deps.check_permissions(["ENROLLMENT_DELETE", "ENROLLMENT_MANAGE"], required=False)),
+    _: Any = Depends(deps.check_permissions(["ENROLLMENT_DELETE", "ENROLLMENT_MANAGE", "MY_ENROLLMENT_VIEW"])),
+) -> Any:
+    """
+    退课，保留选课记录并释放座位
+    """
+    try:
+        enrollment = await run_in_threadpool(load_own_enrollment, db, current_user, enrollment_id, is_manager)
+        await run_in_threadpool(db.close)
+        async with enrollment_admission.admit(enrollment.student_id, enrollment.offering_id):
+            enrollment = await run_in_threadpool(withdraw, db, enrollment)
+        return APIResponse(
+            code=0,
+            message="退课成功",
+            data=enrollment_to_dict(enrollment)
+        )
+    except AdmissionRejected as e:
+        raise admission_error(e)
+    except EnrollmentError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"退课失败: {str(e)}\n{traceback.format_exc()}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"退课失败: {str(e)}"
+        )
+
+
+@router.get("/preferences", response_model=APIResponse)
+def list_preferences(
+    semester: str = None,
+    student_id: int = None,
+    offering_id: int = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_active_user),
+    is_manager: bool = Depends(deps.check_permissions(["ENROLLMENT_VIEW", "ENROLLMENT_MANAGE"], required=False)),
+    _: Any = Depends(deps.check_permissions(["ENROLLMENT_VIEW", "ENROLLMENT_MANAGE", "MY_ENROLLMENT_VIEW"])),
+) -> Any:
+    """
+    查询志愿，学生只能查询本人的志愿
+    """
+    try:
+        query = db.query(
+            EnrollmentPreference, Course.course_name
+        ).join(
+            CourseOffering, EnrollmentPreference.offering_id == CourseOffering.offering_id
+        ).join(
+            Course, CourseOffering.course_id == Course.course_id
+        )
+        if not is_manager or (student_id is None and offering_id is None):
+            student_id = resolve_student_id(current_user, student_id, is_manager)
+        if student_id is not None:
+            query = query.filter(EnrollmentPreference.student_id == student_id)
+        if offering_id is not None:
+            query = query.filter(EnrollmentPreference.offering_id == offering_id)
+        if semester:
+            query = query.filter(EnrollmentPreference.semester == semester)
+
+        preference_list = [
+            {
+                "preference_id": preference.preference_id,
+                "student_id": preference.student_id,
+                "offering_id": preference.offering_id,
+                "course_name": course_name,
+                "semester": preference.semester,
+                "rank": preference.rank,
+                "status": preference.status,
+                "created_at": preference.created_at
+            }
+            for preference, course_name in query.order_by(
+                EnrollmentPreference.student_id, EnrollmentPreference.semester, EnrollmentPreference.rank
+            ).all()
+        ]
+        return APIResponse(
+            code=0,
+            message="获取志愿成功",
+            data=preference_list
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"获取志愿失败: {str(e)}\n{traceback.format_exc()}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"获取志愿失败: {str(e)}"
+        )
+
+
+@router.post("/preferences", response_model=APIResponse)
+def create_preferences(
+    preference_in: PreferenceSubmit,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_active_user),
+    is_manager: bool = Depends(deps.check_permissions(["ENROLLMENT_CREATE", "ENROLLMENT_MANAGE"], required=False)),
+    _: Any = Depends(deps.check_permissions(["ENROLLMENT_CREATE", "ENROLLMENT_MANAGE", "MY_ENROLLMENT_VIEW"])),
+) -> Any:
+    """
+    提交志愿，offering_ids 的顺序即志愿顺序，重复提交会覆盖本学期尚未分配的志愿
+    只能填报处于志愿分配模式（allocation_mode=preference）的开课
+    """
+    try:
+        student_id = resolve_student_id(current_user, preference_in.student_id, is_manager)
+        preferences = submit_preferences(db, student_id, preference_in.semester, preference_in.offering_ids)
+        return APIResponse(
+            code=0,
+            message="志愿提交成功",
+            data=[
+                {"offering_id": preference.offering_id, "rank": preference.rank}
+                for preference in preferences
+            ]
+        )
+    except EnrollmentError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"提交志愿失败: {str(e)}\n{traceback.format_exc()}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"提交志愿失败: {str(e)}"
+        )
+
+
+@router.post("/allocation/jobs", response_model=APIResponse)
+def create_allocation_job(
+    job_in: AllocationJobCreate,
+    db: Session = Depends(get_db),
+    _: Any = Depends(deps.check_permissions(["ENROLLMENT_MANAGE"])),
+) -> Any:
+    """
+    提交批量分配任务
+    对本学期所有志愿分配模式的开课一次性分配名额，lottery 为抽签，priority 为按年级优先、抽签决定同级顺序；
+    分配在后台进程中执行，结果为草稿，确认后通过提交接口写入
+    """
+    try:
+        problem = build_allocation_problem(db, job_in.semester, job_in.method)
+        if not problem["offerings"]:
+            raise HTTPException(status_code=400, detail="本学期没有处于志愿分配模式的开课")
+
+        seed = job_in.seed if job_in.seed is not None else int.from_bytes(uuid.uuid4().bytes[:4], "big")
+        job_params = {
+            "semester": job_in.semester,
+            "method": job_in.method,
+            "seed": seed,
+            "offerings": len(problem["offerings"]),
+            "preferences": len(problem["preferences"]),
+        }
+        job = job_registry.submit("allocation", lambda job: run_allocation(job, problem, seed), job_params)
+        return APIResponse(
+            code=0,
+            message="分配任务已提交",
+            data=job.to_dict()
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"提交分配任务失败: {str(e)}\n{traceback.format_exc()}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"提交分配任务失败: {str(e)}"
+        )
+
+
+@router.get("/allocation/jobs/{job_id}", response_model=APIResponse)
+def get_allocation_job(
+    job_id: str,
+    _: Any = Depends(deps.check_permissions(["ENROLLMENT_MANAGE"])),
+) -> Any:
+    """
+    查询批量分配任务进度，完成后返回分配草稿
+    """
+    job = job_registry.get(job_id)
+    if job is None or job.kind != "allocation":
+        raise HTTPException(status_code=404, detail="分配任务不存在")
+    return APIResponse(
+        code=0,
+        message="获取分配任务成功",
+        data=job.to_dict(include_result=job.status == SUCCEEDED)
+    )
+
+
+@router.post("/allocation/jobs/{job_id}/commit", response_model=APIResponse)
+def commit_allocation_job(
+    job_id: str,
+    db: Session = Depends(get_db),
+    _: Any = Depends(deps.check_permissions(["ENROLLMENT_MANAGE"])),
+) -> Any:
+    """
+    写入分配草稿：录取的志愿生成选课记录，满员的志愿按分配顺序进入候补，
+    相关开课切换为先到先得，剩余名额开放选课
+    """
+    try:
+        job = job_registry.get(job_id)
+        if job is None or job.kind != "allocation":
+            raise HTTPException(status_code=404, detail="分配任务不存在")
+        if job.status != SUCCEEDED:
+            raise HTTPException(status_code=400, detail="分配任务尚未完成")
+        if job.extra.get("committed"):
+            raise HTTPException(status_code=400, detail="该分配结果已提交")
+
+        report = apply_allocation(db, job.params["semester"], job.result["offering_ids"], job.result)
+        job.extra["committed"] = True
+        return APIResponse(
+            code=0,
+            message=f"分配结果已提交，录取{report['enrolled']}人次，候补{report['waitlisted']}人次",
+            data=report
+        )
+    except EnrollmentError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"提交分配结果失败: {str(e)}\n{traceback.format_exc()}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"提交分配结果失败: {str(e)}"
+        )
+
+
+def run_allocation(job: Job, problem: Dict[str, Any], seed: int) -> Dict[str, Any]:
+    """
+    在计算进程中执行分配，合并构造输入时剔除的志愿
+    """
+    job.update(message="正在分配")
+    result = get_process_pool().submit(allocate, problem, seed).result()
+    result["rejected"] = problem["rejected"] + result["rejected"]
+    result["offering_ids"] = [offering["offering_id"] for offering in problem["offerings"]]
+    result["total_preferences"] = len(problem["preferences"]) + len(problem["rejected"])
+    return result
+
+
+@router.get("/waitlist", response_model=APIResponse)
+def list_waitlist(
+    offering_id: int = None,
+    student_id: int = None,
+    status: int = Query(WAITLIST_WAITING, description="候补状态，默认只看候补中"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_active_user),
+    is_manager: bool = Depends(deps.check_permissions(["ENROLLMENT_VIEW", "ENROLLMENT_MANAGE"], required=False)),
+    _: Any = Depends(deps.check_permissions(["ENROLLMENT_VIEW", "ENROLLMENT_MANAGE", "MY_ENROLLMENT_VIEW"])),
+) -> Any:
+    """
+    查询候补队列，学生只能查询本人的候补
+    """
+    try:
+        query = db.query(EnrollmentWaitlist).filter(EnrollmentWaitlist.status == status)
+        if not is_manager or (student_id is None and offering_id is None):
+            student_id = resolve_student_id(current_user, student_id, is_manager)
+        if student_id is not None:
+            query = query.filter(EnrollmentWaitlist.student_id == student_id)
+        if offering_id is not None:
+            query = query.filter(EnrollmentWaitlist.offering_id == offering_id)
+
+        entries = query.order_by(
+            EnrollmentWaitlist.offering_id, EnrollmentWaitlist.created_at, EnrollmentWaitlist.waitlist_id
+        ).all()
+        return APIResponse(
+            code=0,
+            message="获取候补成功",
+            data=[
+                waitlist_to_dict(entry, waitlist_position(db, entry) if entry.status == WAITLIST_WAITING else None)
+                for entry in entries
+            ]
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"获取候补失败: {str(e)}\n{traceback.format_exc()}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"获取候补失败: {str(e)}"
+        )
+
+
+@router.delete("/waitlist/{waitlist_id}", response_model=APIResponse)
+def delete_waitlist(
+    waitlist_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_active_user),
+    is_manager: bool = Depends(deps.check_permissions(["ENROLLMENT_DELETE", "ENROLLMENT_MANAGE"], required=False)),
+    _: Any = Depends(deps.check_permissions(["ENROLLMENT_DELETE", "ENROLLMENT_MANAGE", "MY_ENROLLMENT_VIEW"])),
+) -> Any:
+    """
+    退出候补
+    """
+    try:
+        entry = db.query(EnrollmentWaitlist).filter(EnrollmentWaitlist.waitlist_id == waitlist_id).first()
+        if not entry:
+            raise HTTPException(status_code=404, detail="候补记录不存在")
+        if not is_manager:
+            own_student = getattr(current_user, "student_info", None)
+            if not own_student or own_student.student_id != entry.student_id:
+                raise HTTPException(status_code=403, detail="只能退出本人的候补")
+
+        entry = cancel_waitlist(db, entry)
+        return APIResponse(
+            code=0,
+            message="已退出候补",
+            data=waitlist_to_dict(entry)
+        )
+    except EnrollmentError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"退出候补失败: {str(e)}\n{traceback.format_exc()}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"退出候补失败: {str(e)}"
+        )
+
+
+# 批量选课的最大行数与每批写入的行数
+MAX_BULK_ENROLLMENT_ROWS = 50000
+BULK_INSERT_CHUNK_SIZE = 1000
+
+
+@router.post("/bulk", response_model=APIResponse)
+async def bulk_create_enrollments(
+    request: Request,
+    allow_partial: bool = Query(True, description="是否允许只导入校验通过的行"),
+    db: Session = Depends(get_db),
+    _: Any = Depends(deps.check_permissions(["ENROLLMENT_CREATE", "ENROLLMENT_MANAGE"])),
+) -> Any:
+    """
+    批量选课
+    支持 multipart 上传或 text/csv 请求体的CSV（列: student_no 或 student_id, offering_id），
+    JSON数组（或 {"rows": [...]}），以及按班级整体选课的规则 {"class_name": "...", "offering_id": 1}；
+    已选的行视为已存在，重复导入不会重复选课
+    """
+    try:
+        content_type = request.headers.get("content-type", "")
+        if content_type.startswith("multipart/form-data"):
+            form = await request.form()
+            upload = form.get("file")
+            if upload is None or not hasattr(upload, "read"):
+                raise HTTPException(status_code=400, detail="缺少上传文件: file")
+            rows = parse_enrollment_csv(await upload.read())
+        elif content_type.startswith("text/csv"):
+            rows = parse_enrollment_csv(await request.body())
+        else:
+            try:
+                payload = await request.json()
+            except ValueError:
+                raise HTTPException(status_code=400, detail="请求体不是有效的JSON")
+            if isinstance(payload, dict) and payload.get("class_name"):
+                if payload.get("offering_id") in (None, ""):
+                    raise HTTPException(status_code=400, detail="缺少参数: offering_id")
+                rows = await run_in_threadpool(
+                    expand_class_rule, db, str(payload["class_name"]), payload["offering_id"]
+                )
+                if not rows:
+                    raise HTTPException(status_code=404, detail="该班级没有学生")
+            else:
+                rows = payload.get("rows") if isinstance(payload, dict) else payload
+                if not isinstance(rows, list):
+                    raise HTTPException(status_code=400, detail="请求体应为选课数组或班级规则")
+
+        if not rows:
+            raise HTTPException(status_code=400, detail="没有需要导入的选课")
+        if len(rows) > MAX_BULK_ENROLLMENT_ROWS:
+            raise HTTPException(status_code=400, detail=f"单次最多导入{MAX_BULK_ENROLLMENT_ROWS}条选课")
+
+        report = await run_in_threadpool(import_enrollment_batch, db, rows, allow_partial)
+        if report["created"] or not report["failed"]:
+            message = f"导入完成，新增{report['created']}条，已存在{report['existing']}条，失败{report['failed']}条"
+        else:
+            message = f"导入失败，{report['failed']}条记录存在错误，未导入任何选课"
+        return APIResponse(
+            code=0,
+            message=message,
+            data=report
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"批量选课失败: {str(e)}\n{traceback.format_exc()}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"批量选课失败: {str(e)}"
+        )
+
+
+def parse_enrollment_csv(content: bytes) -> List[Dict[str, Any]]:
+    """
+    解析选课CSV，首行为表头
+    """
+    try:
+        text_content = content.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="CSV文件需使用UTF-8编码")
+
+    reader = csv.DictReader(io.StringIO(text_content))
+    fieldnames = reader.fieldnames or []
+    if "offering_id" not in fieldnames or not ({"student_no", "student_id"} & set(fieldnames)):
+        raise HTTPException(status_code=400, detail="CSV需包含列: offering_id，以及 student_no 或 student_id")
+    return [dict(row) for row in reader]
+
+
+def expand_class_rule(db: Session, class_name: str, offering_id: Any) -> List[Dict[str, Any]]:
+    """
+    将班级规则展开为逐个学生的选课行
+    """
+    return [
+        {"student_id": row.student_id, "offering_id": offering_id}
+        for row in db.query(Student.student_id).filter(
+            Student.class_name == class_name
+        ).order_by(Student.student_no).all()
+    ]
+
+
+def report_enrollment_conflicts(
+    db: Session,
+    results: List[Dict[str, Any]],
+    accepted: List[Dict[str, Any]],
+    withdrawn: Dict[Any, int],
+    existing: int,
+) -> Dict[str, Any]:
+    """
+    批量写入违反唯一约束时整批回滚，找出待插入但已存在选课记录的行逐行报告，其余行标记为跳过
+    """
+    inserted = [c for c in accepted if (c["student_id"], c["offering_id"]) not in withdrawn]
+    taken = set()
+    student_ids = {c["student_id"] for c in inserted}
+    offering_ids = {c["offering_id"] for c in inserted}
+    if inserted:
+        taken = {
+            (row.student_id, row.offering_id) for row in db.query(Enrollment.student_id, Enrollment.offering_id).filter(
+                Enrollment.student_id.in_(student_ids),
+                Enrollment.offering_id.in_(offering_ids)
+            ).all()
+        }
+    for candidate in accepted:
+        result = candidate["result"]
+        # 找不到冲突行时无法定位，待插入的行全部报告为冲突
+        if (candidate["student_id"], candidate["offering_id"]) in taken \
+                or (not taken and (candidate["student_id"], candidate["offering_id"]) not in withdrawn):
+            result["status"] = "error"
+            result["errors"].append("选课记录已被其他请求写入，请刷新后重试")
+        else:
+            result["status"] = "skipped"
+    failed = sum(1 for result in results if result["errors"])
+    return {"total": len(results), "created": 0, "existing": existing, "failed": failed, "rows": results}
+
+
+def import_enrollment_batch(db: Session, rows: List[Dict[str, Any]], allow_partial: bool = True) -> Dict[str, Any]:
+    """
+    校验并批量写入选课，返回逐行结果
+
+    学生、开课、已选课程和上课时间各用一次IN查询加载，名额、重复选课、学分上限与时间冲突均在内存中检测；
+    与单条选课相同，先锁定涉及的学生行、再锁定开课行，已选课程以加锁读读取，
+    因此校验基于最新提交的数据，名额按锁定后的人数计算，不会与并发选课一起超卖
+    """
+    results = []
+    candidates = []
+
+    # 1. 逐行校验字段
+    for row_no, raw in enumerate(rows, start=1):
+        result = {"row": row_no, "status": "error", "errors": []}
+        results.append(result)
+        if not isinstance(raw, dict):
+            result["errors"].append("行数据格式错误")
+            continue
+        try:
+            offering_id = int(raw.get("offering_id"))
+        except (TypeError, ValueError):
+            result["errors"].append("offering_id 必须为整数")
+            continue
+        student_id = raw.get("student_id")
+        student_no = str(raw.get("student_no") or "").strip()
+        if student_id not in (None, ""):
+            try:
+                student_id = int(student_id)
+            except (TypeError, ValueError):
+                result["errors"].append("student_id 必须为整数")
+                continue
+        elif student_no:
+            student_id = None
+        else:
+            result["errors"].append("缺少参数: student_no 或 student_id")
+            continue
+        result["offering_id"] = offering_id
+        candidates.append({"result": result, "student_id": student_id, "student_no": student_no, "offering_id": offering_id})
+
+    try:
+        # 2. 一次性解析学生
+        student_nos = {c["student_no"] for c in candidates if c["student_id"] is None}
+        student_ids = {c["student_id"] for c in candidates if c["student_id"] is not None}
+        by_no, known_ids = {}, set()
+        if student_nos:
+            for row in db.query(Student.student_id, Student.student_no).filter(Student.student_no.in_(student_nos)).all():
+                by_no[row.student_no] = row.student_id
+                known_ids.add(row.student_id)
+        if student_ids:
+            known_ids.update(
+                row.student_id for row in db.query(Student.student_id).filter(Student.student_id.in_(student_ids)).all()
+            )
+        for candidate in candidates:
+            if candidate["student_id"] is None:
+                candidate["student_id"] = by_no.get(candidate["student_no"])
+            candidate["result"]["student_id"] = candidate["student_id"]
+        # 按ID顺序锁定学生行，与单条选课串行执行
+        if known_ids:
+            db.query(Student.student_id).filter(
+                Student.student_id.in_(known_ids)
+            ).order_by(Student.student_id).with_for_update().all()
+
+        # 3. 锁定涉及的开课，读取名额
+        offering_ids = sorted({c["offering_id"] for c in candidates})
+        offerings = {}
+        if offering_ids:
+            offerings = {
+                row.offering_id: row for row in db.query(
+                    CourseOffering.offering_id, CourseOffering.course_id, CourseOffering.semester,
+                    CourseOffering.status, CourseOffering.allocation_mode, CourseOffering.max_students,
+                    CourseOffering.current_students, Course.credits
+                ).join(
+                    Course, CourseOffering.course_id == Course.course_id
+                ).filter(
+                    CourseOffering.offering_id.in_(offering_ids)
+                ).order_by(CourseOffering.offering_id).with_for_update(of=CourseOffering).all()
+            }
+        seats = {
+            oid: (row.max_students - (row.current_students or 0)) if row.max_students is not None else None
+            for oid, row in offerings.items()
+        }
+
+        # 4. 学生在相关学期的已选课程及其上课时间（加锁读，不使用锁定前建立的事务快照）
+        resolved = {c["student_id"] for c in candidates if c["student_id"] in known_ids}
+        semesters = {row.semester for row in offerings.values()}
+        enrolled = {}
+        withdrawn = {}
+        if resolved and semesters:
+            for row in db.query(
+                Enrollment.enrollment_id, Enrollment.student_id, Enrollment.offering_id, Enrollment.status,
+                CourseOffering.course_id, CourseOffering.semester, Course.credits
+            ).join(
+                CourseOffering, Enrollment.offering_id == CourseOffering.offering_id
+            ).join(
+                Course, CourseOffering.course_id == Course.course_id
+            ).filter(
+                Enrollment.student_id.in_(resolved),
+                CourseOffering.semester.in_(semesters)
+            ).with_for_update(read=True).all():
+                if row.status:
+                    enrolled.setdefault((row.student_id, row.semester), []).append(row)
+                else:
+                    withdrawn[(row.student_id, row.offering_id)] = row.enrollment_id
+        slot_offerings = set(offering_ids) | {row.offering_id for rows_ in enrolled.values() for row in rows_}
+        offering_slots: Dict[int, list] = {}
+        if slot_offerings:
+            for slot in schedule_slots(
+                db.query(*SLOT_COLUMNS).filter(Schedule.offering_id.in_(slot_offerings)).all()
+            ):
+                offering_slots.setdefault(slot[0], []).append(slot)
+
+        # 5. 按行顺序在内存中校验，先出现的行优先占用名额
+        state: Dict[Any, Dict[str, Any]] = {}
+        accepted = []
+        existing = 0
+        for candidate in candidates:
+            result = candidate["result"]
+            student_id, offering_id = candidate["student_id"], candidate["offering_id"]
+            offering = offerings.get(offering_id)
+            if student_id not in known_ids:
+                result["errors"].append("学生不存在")
+            if offering is None:
+                result["errors"].append("开课信息不存在")
+            if result["errors"]:
+                continue
+            if not offering.status:
+                result["errors"].append("该课程未开放选课")
+                continue
+            if offering.allocation_mode == ALLOCATION_PREFERENCE:
+                result["errors"].append("该课程采用志愿分配")
+                continue
+
+            key = (student_id, offering.semester)
+            current = state.get(key)
+            if current is None:
+                rows_ = enrolled.get(key, [])
+                current = state[key] = {
+                    "offerings": {row.offering_id for row in rows_},
+                    "courses": {row.course_id for row in rows_},
+                    "credits": sum(float(row.credits or 0) for row in rows_),
+                    "slots": [slot for row in rows_ for slot in offering_slots.get(row.offering_id, ())],
+                }
+            if offering_id in current["offerings"]:
+                result["status"] = "exists"
+                existing += 1
+                continue
+            if offering.course_id in current["courses"]:
+                result["errors"].append("本学期已选过该课程的其他教学班")
+                continue
+            credits = float(offering.credits or 0)
+            if settings.MAX_SEMESTER_CREDITS and current["credits"] + credits > settings.MAX_SEMESTER_CREDITS:
+                result["errors"].append(f"超出本学期学分上限{settings.MAX_SEMESTER_CREDITS}")
+                continue
+            target_slots = offering_slots.get(offering_id, [])
+            if target_slots and slots_overlap(target_slots, current["slots"]):
+                result["errors"].append("与已选课程上课时间冲突")
+                continue
+            if seats[offering_id] is not None and seats[offering_id] <= 0:
+                result["errors"].append("课程已满")
+                continue
+
+            if seats[offering_id] is not None:
+                seats[offering_id] -= 1
+            current["offerings"].add(offering_id)
+            current["courses"].add(offering.course_id)
+            current["credits"] += credits
+            current["slots"].extend(target_slots)
+            accepted.append(candidate)
+
+        failed = sum(1 for result in results if result["errors"])
+        if not accepted or (failed and not allow_partial):
+            db.rollback()
+            for candidate in accepted:
+                candidate["result"]["status"] = "skipped"
+            return {"total": len(results), "created": 0, "existing": existing, "failed": failed, "rows": results}
+
+        # 6. 同一事务中分批写入：退选过的记录恢复，其余批量插入，最后按开课更新已选人数
+        reactivate = [withdrawn[(c["student_id"], c["offering_id"])] for c in accepted if (c["student_id"], c["offering_id"]) in withdrawn]
+        new_rows = [
+            {"student_id": c["student_id"], "offering_id": c["offering_id"], "status": True}
+            for c in accepted if (c["student_id"], c["offering_id"]) not in withdrawn
+        ]
+        for start in range(0, len(reactivate), BULK_INSERT_CHUNK_SIZE):
+            db.execute(
+                update(Enrollment)
+                .where(Enrollment.enrollment_id.in_(reactivate[start:start + BULK_INSERT_CHUNK_SIZE]))
+                .values(status=True, enrollment_date=func.now())
+                .execution_options(synchronize_session=False)
+            )
+        for start in range(0, len(new_rows), BULK_INSERT_CHUNK_SIZE):
+            db.execute(insert(Enrollment), new_rows[start:start + BULK_INSERT_CHUNK_SIZE])
+        added: Dict[int, int] = {}
+        for candidate in accepted:
+            added[candidate["offering_id"]] = added.get(candidate["offering_id"], 0) + 1
+        for offering_id, count in added.items():
+            db.execute(
+                update(CourseOffering)
+                .where(CourseOffering.offering_id == offering_id)
+                .values(current_students=func.coalesce(CourseOffering.current_students, 0) + count)
+                .execution_options(synchronize_session=False)
+            )
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return report_enrollment_conflicts(db, results, accepted, withdrawn, existing)
+    except Exception:
+        db.rollback()
+        raise
+
+    for candidate in accepted:
+        candidate["result"]["status"] = "created"
+    for student_id in {c["student_id"] for c in accepted}:
+        timetable_cache.invalidate_student(student_id)
+    return {"total": len(results), "created": len(accepted), "existing": existing, "failed": failed, "rows": results}
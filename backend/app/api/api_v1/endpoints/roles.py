@@ -5,6 +5,7 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session, joinedload
 
 from app.api import deps
+from app.core.permission_cache import permission_cache
 from app.db.database import get_db
 from app.models.role import Role, Permission, role_permission
 from app.schemas.common import APIResponse, PaginatedResponse
@@ -277,6 +278,7 @@ def update_role(
     
     db.commit()
     db.refresh(role)
+    permission_cache.invalidate_all()
     
     return APIResponse(
         code=0,
@@ -310,6 +312,7 @@ def delete_role(
     
     db.delete(role)
     db.commit()
+    permission_cache.invalidate_all()
     
     return APIResponse(
         code=0,
@@ -367,6 +370,7 @@ def assign_permissions(
         role.permissions = permissions
         db.commit()
         db.refresh(role)
+        permission_cache.invalidate_all()
                 
         # 构建响应，包括详细的角色信息和权限
         # 注意：需要获取所有权限（包括禁用的）以确保前端显示正确
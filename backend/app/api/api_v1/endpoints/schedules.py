@@ -1,15 +1,33 @@
-from typing import Any, List, Dict, Optional
+from typing import Any, List, Dict, Optional, Tuple
+import base64
+import csv
+import io
+import json
 import traceback
+from concurrent.futures import as_completed
 from datetime import datetime, timedelta
+from functools import lru_cache
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import text, func, and_, or_
+from sqlalchemy import text, func, and_, or_, insert
 
 from app.api import deps
+from app.core.config import settings
+from app.core.jobs import SUCCEEDED, Job, get_process_pool, job_registry
+from app.core.room_occupancy import room_occupancy
+from app.core.schedule_index import (
+    CLASSROOM, DAY_MINUTES, TEACHER, IntervalBucket, find_overlapping_pairs, schedule_index
+)
+from app.core.schedule_time import minutes_to_time, resolve_minutes, time_to_minutes
+from app.core.timetable_cache import timetable_cache
+from app.core.timetable_solver import parse_slot, sessions_per_week, solve_timetable
+from app.core.week_mask import WeekMask
 from app.db.database import get_db
-from app.models.course import Schedule, CourseOffering, Classroom
+from app.models.course import Course, Schedule, CourseOffering, Classroom
 from app.models.teacher import Teacher
+from app.models.user import User
 from app.models.student import Student
 from app.models.enrollment import Enrollment
 from app.schemas.common import APIResponse, PaginatedResponse
@@ -17,8 +35,7 @@ from app.schemas.common import APIResponse, PaginatedResponse
 router = APIRouter()
 
 # 通用时间格式转换辅助函数 - 处理各种时间格式
-def format_time(time_value):
-    print(f"DEBUG - 正在处理时间值: {time_value}, 类型: {type(time_value)}")
+def _format_time(time_value):
     if time_value is None:
         return "08:00"  # 默认值
     
@@ -45,7 +62,6 @@ def format_time(time_value):
                 minutes = (total_seconds % 3600) // 60
                 return f"{hours:02d}:{minutes:02d}"
             except Exception as e:
-                print(f"处理timedelta时出错: {e}")
                 return "08:00"
                 
         # 同样检查类名，以防导入问题
@@ -85,27 +101,23 @@ def format_time(time_value):
                 return "08:00"
         
         # 其他情况，返回默认值
-        print(f"DEBUG - 无法识别的时间类型: {type(time_value)}")
         # 尝试字符串转换
         try:
             return str(time_value)[:5] if len(str(time_value)) >= 5 else "08:00"
         except:
             return "08:00"
     except Exception as e:
-        print(f"时间格式化出错: {e}, 原始值: {time_value}, 类型: {type(time_value)}")
         return "08:00"  # 出错时返回默认值
 
 # 确保周数格式正确的辅助函数
-def ensure_valid_weeks_format(weeks_str):
+def _ensure_valid_weeks_format(weeks_str):
     """
     确保周数格式正确
     返回格式化后的周数字符串，如"1-16"或"1,3,5-7"
     """
     if not weeks_str:
-        print("周数为空，使用默认值: 1-16")
         return "1-16"  # 默认为1-16周
         
-    print(f"检查周数格式: {weeks_str}")
     
     # 如果是字符串，检查格式是否正确
     if isinstance(weeks_str, str):
@@ -113,7 +125,6 @@ def ensure_valid_weeks_format(weeks_str):
         
         # 如果是空字符串，返回默认值
         if not weeks_str:
-            print("周数为空字符串，使用默认值: 1-16")
             return "1-16"
             
         try:
@@ -133,12 +144,10 @@ def ensure_valid_weeks_format(weeks_str):
                     
                     # 确保开始周不大于结束周
                     if start > end:
-                        print(f"警告: 周数范围错误 {start}-{end}，自动交换")
                         start, end = end, start
                         
                     # 限制最大周数范围
                     if end - start > 30:
-                        print(f"警告: 周数范围过大 {start}-{end}，限制为最多30周")
                         end = start + 30
                         
                     formatted_parts.append(f"{start}-{end}")
@@ -149,14 +158,11 @@ def ensure_valid_weeks_format(weeks_str):
                     
             if formatted_parts:
                 result = ",".join(formatted_parts)
-                print(f"格式化后的周数: {result}")
                 return result
             else:
-                print("格式化后周数为空，使用默认值: 1-16")
                 return "1-16"
         except (ValueError, TypeError) as e:
             # 如果格式不正确，记录错误并返回默认值
-            print(f"周数格式无效: {e}，使用默认值: 1-16")
             return "1-16"
     else:
         # 非字符串类型，尝试转换
@@ -167,7 +173,6 @@ def ensure_valid_weeks_format(weeks_str):
                 for item in sorted(weeks_str):
                     formatted_parts.append(str(int(item)))
                 result = ",".join(formatted_parts)
-                print(f"非字符串类型转换为: {result}")
                 return result
             elif isinstance(weeks_str, dict):
                 # 如果是字典，使用键
@@ -175,21 +180,75 @@ def ensure_valid_weeks_format(weeks_str):
                 for key in sorted(weeks_str.keys()):
                     formatted_parts.append(str(int(key)))
                 result = ",".join(formatted_parts)
-                print(f"字典类型转换为: {result}")
                 return result
             elif weeks_str is None:
-                print("周数为None，使用默认值: 1-16")
                 return "1-16"
             else:
                 # 其他类型，尝试直接转换为字符串
                 result = str(weeks_str)
-                print(f"其他类型转换为: {result}")
                 return result
         except Exception as e:
             # 转换失败，返回默认值
-            print(f"转换周数格式失败: {e}，使用默认值: 1-16")
             return "1-16"
 
+
+# 历史数据的格式化结果缓存，新写入的排课直接使用持久化的分钟数和周次掩码
+@lru_cache(maxsize=4096, typed=True)
+def _format_time_cached(time_value):
+    return _format_time(time_value)
+
+
+@lru_cache(maxsize=4096, typed=True)
+def _ensure_valid_weeks_format_cached(weeks_str):
+    return _ensure_valid_weeks_format(weeks_str)
+
+
+def format_time(time_value):
+    """
+    将各种时间格式转换为 "HH:MM"，结果按原始值缓存
+    """
+    try:
+        return _format_time_cached(time_value)
+    except TypeError:
+        # 不可哈希的值（如字典）不缓存
+        return _format_time(time_value)
+
+
+def ensure_valid_weeks_format(weeks_str):
+    """
+    确保周数格式正确，结果按原始值缓存
+    """
+    try:
+        return _ensure_valid_weeks_format_cached(weeks_str)
+    except TypeError:
+        return _ensure_valid_weeks_format(weeks_str)
+
+
+def schedule_display_fields(schedule) -> Tuple[str, str, str, Optional[int], Optional[int], int]:
+    """
+    返回排课的 (开始时间, 结束时间, 周数, 开始分钟, 结束分钟, 周次掩码)
+    写入时已持久化分钟数和周次掩码的排课不再重复解析，历史数据退回带缓存的格式化函数
+    """
+    start_minutes = getattr(schedule, 'start_minutes', None)
+    end_minutes = getattr(schedule, 'end_minutes', None)
+    if start_minutes is not None and end_minutes is not None:
+        start_time = minutes_to_time(start_minutes)
+        end_time = minutes_to_time(end_minutes)
+    else:
+        start_time = format_time(getattr(schedule, 'start_time', None))
+        end_time = format_time(getattr(schedule, 'end_time', None))
+        start_minutes = time_to_minutes(start_time)
+        end_minutes = time_to_minutes(end_time)
+    
+    weeks_mask = getattr(schedule, 'weeks_mask', None)
+    if weeks_mask:
+        weeks_value = schedule.weeks
+    else:
+        weeks_value = ensure_valid_weeks_format(getattr(schedule, 'weeks', None))
+        weeks_mask = WeekMask.parse(weeks_value)
+    return start_time, end_time, weeks_value, start_minutes, end_minutes, int(weeks_mask)
+
+
 @router.get("/all-classrooms", response_model=APIResponse)
 def get_all_classrooms(
     db: Session = Depends(get_db),
@@ -266,256 +325,89 @@ def list_schedules(
     teacher_id: int = None,
     day_of_week: int = None,
     keyword: str = None,
+    cursor: str = Query(None, description="游标，传入上一页返回的next_cursor时忽略page"),
+    include_total: bool = Query(True, description="是否统计总数"),
     _: Any = Depends(deps.check_permissions(["SCHEDULE_VIEW"])),
 ) -> Any:
     """
     获取排课列表
+    单条显式JOIN查询所需列，按 (星期, 开始时间, 排课ID) 排序；
+    传入cursor时使用游标分页，避免深分页时OFFSET变慢，总数使用相同的过滤条件单独统计
     """
     try:
-        # 验证并标准化分页参数
-        try:
-            page = max(1, page)
-            pageSize = max(1, min(100, pageSize))
-            print(f"初始分页参数: page={page}, pageSize={pageSize}")
-        except Exception as e:
-            print(f"分页参数验证错误: {e}，使用默认值")
-            page = 1
-            pageSize = 20
-        
-        # 使用ORM查询，预加载关联对象
-        query = db.query(Schedule).options(
-            joinedload(Schedule.offering).joinedload(CourseOffering.course),
-            joinedload(Schedule.offering).joinedload(CourseOffering.teacher).joinedload(Teacher.user),
-            joinedload(Schedule.classroom)
-        )
-        
-        # 应用过滤条件并记录日志
-        print(f"应用过滤条件: offering_id={offering_id}, classroom_id={classroom_id}, semester={semester}, teacher_id={teacher_id}, day_of_week={day_of_week}, keyword={keyword}")
-        
+        filters = []
         if offering_id:
-            query = query.filter(Schedule.offering_id == offering_id)
-            print(f"应用offering_id过滤: {offering_id}")
-            
+            filters.append(Schedule.offering_id == offering_id)
         if classroom_id:
-            query = query.filter(Schedule.classroom_id == classroom_id)
-            print(f"应用classroom_id过滤: {classroom_id}")
-            
+            filters.append(Schedule.classroom_id == classroom_id)
         if semester:
-            if 'CourseOffering' not in str(query.statement):
-                query = query.join(CourseOffering, Schedule.offering_id == CourseOffering.offering_id, isouter=True)
-            query = query.filter(CourseOffering.semester == semester)
-            print(f"应用semester过滤: {semester}")
-            
+            filters.append(CourseOffering.semester == semester)
         if day_of_week is not None:
-            query = query.filter(Schedule.day_of_week == day_of_week)
-            print(f"应用day_of_week过滤: {day_of_week}")
-        
+            filters.append(Schedule.day_of_week == day_of_week)
         if teacher_id:
-            if 'CourseOffering' not in str(query.statement):
-                query = query.join(CourseOffering, Schedule.offering_id == CourseOffering.offering_id, isouter=True)
-            query = query.filter(CourseOffering.teacher_id == teacher_id)
-            print(f"应用teacher_id过滤: {teacher_id}")
-            
+            filters.append(CourseOffering.teacher_id == teacher_id)
         # 关键词搜索，与info-list接口保持一致
         if keyword:
-            print(f"应用关键词搜索: {keyword}")
-            # 确保已经连接了需要的表
-            if 'CourseOffering' not in str(query.statement):
-                query = query.join(CourseOffering, Schedule.offering_id == CourseOffering.offering_id, isouter=True)
-                
-            # 确保连接了课程表
-            if 'Course' not in str(query.statement):
-                query = query.join(CourseOffering.course, isouter=True)
-            
-            # 确保连接了教师表
-            if 'Teacher' not in str(query.statement):
-                query = query.join(CourseOffering.teacher, isouter=True)
-            
-            # 确保连接了用户表
-            if 'User' not in str(query.statement):
-                query = query.join(Teacher.user, isouter=True)
-            
-            # 确保连接了教室表
-            if 'Classroom' not in str(query.statement):
-                query = query.join(Schedule.classroom, isouter=True)
-                
-            # 对多个字段应用模糊搜索
-            from sqlalchemy import or_
-            from app.models.user import User  # 添加必要的导入
-            from app.models.course import Course  # 添加必要的导入
-            
-            keyword_filter = or_(
+            filters.append(or_(
                 Course.course_name.like(f"%{keyword}%"),
                 Course.course_code.like(f"%{keyword}%"),
                 User.real_name.like(f"%{keyword}%"),
                 Classroom.room_no.like(f"%{keyword}%"),
                 Classroom.building.like(f"%{keyword}%")
-            )
-            query = query.filter(keyword_filter)
+            ))
+        
+        query = join_schedule_list_tables(db.query(
+            Schedule.schedule_id, Schedule.offering_id, Schedule.classroom_id, Schedule.day_of_week,
+            Schedule.start_time, Schedule.end_time, Schedule.start_minutes, Schedule.end_minutes,
+            Schedule.weeks, Schedule.weeks_mask, CourseOffering.semester,
+            Course.course_id, Course.course_code, Course.course_name, Course.course_type,
+            Teacher.teacher_id, User.real_name.label("teacher_name"),
+            Classroom.classroom_id.label("room_id"), Classroom.room_no, Classroom.building
+        )).filter(*filters)
+        
+        total = None
+        totalPages = None
+        if include_total:
+            count_query = join_schedule_list_tables(db.query(func.count(Schedule.schedule_id)))
+            total = count_query.filter(*filters).scalar() or 0
+            totalPages = (total + pageSize - 1) // pageSize if total > 0 else 1
         
-        # 添加排序，确保结果一致性
         query = query.order_by(Schedule.day_of_week, Schedule.start_time, Schedule.schedule_id)
+        if cursor:
+            cursor_key = decode_schedule_cursor(cursor)
+            query = query.filter(schedule_keyset_after(*cursor_key))
+        else:
+            # 确保请求的页码不超过总页数
+            if totalPages is not None and page > totalPages and total > 0:
+                page = totalPages
+            query = query.offset((page - 1) * pageSize)
         
-        # 优化计数查询
-        try:
-            # 使用新版SQLAlchemy API获取计数
-            count_query = db.query(func.count(Schedule.schedule_id))
-            
-            # 应用与主查询相同的过滤条件
-            if hasattr(query, 'whereclause') and hasattr(query.whereclause, 'clauses'):
-                for clause in query.whereclause.clauses:
-                    count_query = count_query.filter(clause)
-            
-            total = count_query.scalar() or 0
-            print(f"查询到总记录数: {total}")
-        except Exception as e:
-            print(f"优化计数查询失败: {str(e)}，回退到普通count方法")
-            # 回退到普通count方法
-            total = query.count()
-            print(f"回退方法计算总数: {total}")
-        
-        # 计算总页数
-        totalPages = (total + pageSize - 1) // pageSize if total > 0 else 1
-        print(f"计算总页数: {totalPages}")
-        
-        # 确保请求的页码不超过总页数
-        if page > totalPages and total > 0:
-            page = totalPages
-            print(f"页码超出范围，调整为: {page}")
-        
-        # 显式应用分页 - 计算偏移量
-        offset_value = (page - 1) * pageSize
-        limit_value = pageSize
-        print(f"应用分页: offset={offset_value}, limit={limit_value}")
-        
-        # 分页处理 - 无论如何都应用分页，确保不会返回全部数据
-        schedules = query.offset(offset_value).limit(limit_value).all()
-        print(f"查询到 {len(schedules)} 条排课记录")
+        # 多取一条用于判断是否还有下一页
+        rows = query.limit(pageSize + 1).all()
+        has_more = len(rows) > pageSize
+        rows = rows[:pageSize]
+        next_cursor = encode_schedule_cursor(rows[-1]) if has_more and rows else None
         
         # 星期几映射到中文
         day_map = {1: "周一", 2: "周二", 3: "周三", 4: "周四", 5: "周五", 6: "周六", 7: "周日"}
+        schedule_list = [build_schedule_list_item(row, day_map) for row in rows]
         
-        # 构建响应
-        schedule_list = []
-        for schedule in schedules:
-            try:
-                # 获取课程信息 - 使用与前端期望一致的字段名
-                course_data = {
-                    "id": 0,
-                    "code": "未知代码",
-                    "name": "未知课程",
-                    "course_type": "DEFAULT",
-                    "course_code": "未知代码",  # 添加前端可能需要的字段
-                    "course_name": "未知课程"   # 添加前端可能需要的字段
-                }
-                
-                if schedule.offering and schedule.offering.course:
-                    course = schedule.offering.course
-                    course_data = {
-                        "id": course.course_id,
-                        "code": course.course_code or "未知代码",
-                        "name": course.course_name or "未知课程",
-                        "course_type": getattr(course, 'course_type', "DEFAULT") or "DEFAULT",
-                        "course_code": course.course_code or "未知代码",
-                        "course_name": course.course_name or "未知课程"
-                    }
-                
-                # 获取教师信息 - 按照前端期望的结构
-                teacher_data = {
-                    "id": 0,
-                    "name": "未知教师",
-                    "user": {"real_name": "未知教师"}
-                }
-                
-                if schedule.offering and schedule.offering.teacher and schedule.offering.teacher.user:
-                    teacher = schedule.offering.teacher
-                    user = teacher.user
-                    teacher_data = {
-                        "id": teacher.teacher_id,
-                        "name": user.real_name or "未知教师",
-                        "user": {"real_name": user.real_name or "未知教师"}
-                    }
-                
-                # 获取教室信息 - 按照前端期望的结构
-                classroom_data = {
-                    "id": 0,
-                    "name": "未安排",
-                    "building": "未安排",
-                    "room_no": "未安排"  # 添加前端可能需要的字段
-                }
-                
-                if schedule.classroom:
-                    classroom = schedule.classroom
-                    classroom_data = {
-                        "id": classroom.classroom_id,
-                        "name": classroom.room_no or "未安排",
-                        "building": classroom.building or "未安排",
-                        "room_no": classroom.room_no or "未安排"
-                    }
-                
-                # 获取学期和学年信息
-                semester_value = "未知"
-                if schedule.offering and hasattr(schedule.offering, 'semester'):
-                    semester_value = schedule.offering.semester or "未知"
-                
-                # 确保时间格式正确
-                start_time = format_time(getattr(schedule, 'start_time', None))
-                end_time = format_time(getattr(schedule, 'end_time', None))
-                
-                # 确保weeks字段格式正确
-                weeks_value = ensure_valid_weeks_format(schedule.weeks or "")
-                
-                # 构建排课数据 - 确保结构与前端期望一致
-                schedule_data = {
-                    "id": schedule.schedule_id,
-                    "schedule_id": schedule.schedule_id,
-                    "offering_id": schedule.offering_id,
-                    "classroom_id": schedule.classroom_id,
-                    "day_of_week": schedule.day_of_week,
-                    "day_of_week_text": day_map.get(schedule.day_of_week, "未知"),
-                    "day_name": day_map.get(schedule.day_of_week, "未知"),  # 添加前端可能需要的字段
-                    "start_time": start_time,
-                    "end_time": end_time,
-                    "weeks": weeks_value,
-                    "course": course_data,
-                    "teacher": teacher_data,
-                    "classroom": classroom_data,
-                    "semester": semester_value,
-                    "academicYear": "2023-2024",  # 默认学年
-                    "course_name": course_data["name"],      # 添加快捷访问字段
-                    "teacher_name": teacher_data["name"],    # 添加快捷访问字段
-                    "room_no": classroom_data["name"],       # 添加快捷访问字段
-                    "building": classroom_data["building"],  # 添加快捷访问字段
-                    "course_offering": {
-                        "offering_id": schedule.offering_id,
-                        "course": course_data,
-                        "teacher": teacher_data,
-                        "semester": semester_value,
-                        "academicYear": "2023-2024"  # 默认学年
-                    }
-                }
-                
-                schedule_list.append(schedule_data)
-            except Exception as e:
-                print(f"处理排课数据时出错: {str(e)}")
-                # 继续处理下一条记录
-        
-        # 构建前端期望的响应格式，确保分页信息正确
-        response_data = {
-            "list": schedule_list,
-            "total": total,
-            "page": int(page),           # 确保是整数类型
-            "pageSize": int(pageSize),   # 确保是整数类型
-            "totalPages": totalPages
-        }
-        
-        print(f"返回数据: 总数={total}, 当前页={page}, 页大小={pageSize}, 总页数={totalPages}, 结果数量={len(schedule_list)}")
+        print(f"获取排课列表: 总数={total}, 结果数量={len(schedule_list)}, 游标分页={bool(cursor)}")
         
         return APIResponse(
             code=0,
             message="获取成功",
-            data=response_data
+            data={
+                "list": schedule_list,
+                "total": total,
+                "page": int(page),
+                "pageSize": int(pageSize),
+                "totalPages": totalPages,
+                "next_cursor": next_cursor
+            }
         )
+    except HTTPException as http_exc:
+        raise http_exc
     except Exception as e:
         error_msg = f"获取排课列表失败: {str(e)}\n{traceback.format_exc()}"
         print(error_msg)
@@ -528,11 +420,152 @@ def list_schedules(
                 "total": 0,
                 "page": int(page) if page else 1,
                 "pageSize": int(pageSize) if pageSize else 20,
-                "totalPages": 0
+                "totalPages": 0,
+                "next_cursor": None
             }
         )
 
 
+def join_schedule_list_tables(query):
+    """
+    排课列表的关联表，列表查询和计数查询共用，保证两者的过滤条件一致
+    """
+    return query.select_from(Schedule).outerjoin(
+        CourseOffering, Schedule.offering_id == CourseOffering.offering_id
+    ).outerjoin(
+        Course, CourseOffering.course_id == Course.course_id
+    ).outerjoin(
+        Teacher, CourseOffering.teacher_id == Teacher.teacher_id
+    ).outerjoin(
+        User, Teacher.user_id == User.user_id
+    ).outerjoin(
+        Classroom, Schedule.classroom_id == Classroom.classroom_id
+    )
+
+
+def encode_schedule_cursor(row) -> str:
+    """
+    游标为 (星期, 开始时间, 排课ID) 的JSON经URL安全的base64编码
+    """
+    start_time = row.start_time
+    if isinstance(start_time, timedelta):
+        # MySQL TIME 列
+        total_seconds = int(start_time.total_seconds())
+        start_time = f"{total_seconds // 3600:02d}:{total_seconds % 3600 // 60:02d}:{total_seconds % 60:02d}"
+    payload = json.dumps([row.day_of_week, str(start_time), row.schedule_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_schedule_cursor(cursor: str) -> Tuple[int, str, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        day, start_time, schedule_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return int(day), str(start_time), int(schedule_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="无效的分页游标")
+
+
+def schedule_keyset_after(day_of_week: int, start_time: str, schedule_id: int):
+    """
+    排序键大于游标的条件，展开为 OR/AND 以便使用 (day_of_week, start_time) 上的索引
+    """
+    return or_(
+        Schedule.day_of_week > day_of_week,
+        and_(Schedule.day_of_week == day_of_week, Schedule.start_time > start_time),
+        and_(
+            Schedule.day_of_week == day_of_week,
+            Schedule.start_time == start_time,
+            Schedule.schedule_id > schedule_id
+        )
+    )
+
+
+def build_schedule_list_item(row, day_map: Dict[int, str]) -> Dict[str, Any]:
+    """
+    将列表查询的一行转换为前端期望的排课结构
+    """
+    # 获取课程信息 - 使用与前端期望一致的字段名
+    course_data = {
+        "id": 0,
+        "code": "未知代码",
+        "name": "未知课程",
+        "course_type": "DEFAULT",
+        "course_code": "未知代码",
+        "course_name": "未知课程"
+    }
+    if row.course_id is not None:
+        course_data = {
+            "id": row.course_id,
+            "code": row.course_code or "未知代码",
+            "name": row.course_name or "未知课程",
+            "course_type": row.course_type or "DEFAULT",
+            "course_code": row.course_code or "未知代码",
+            "course_name": row.course_name or "未知课程"
+        }
+    
+    # 获取教师信息 - 按照前端期望的结构
+    teacher_data = {
+        "id": 0,
+        "name": "未知教师",
+        "user": {"real_name": "未知教师"}
+    }
+    if row.teacher_id is not None and row.teacher_name is not None:
+        teacher_data = {
+            "id": row.teacher_id,
+            "name": row.teacher_name or "未知教师",
+            "user": {"real_name": row.teacher_name or "未知教师"}
+        }
+    
+    # 获取教室信息 - 按照前端期望的结构
+    classroom_data = {
+        "id": 0,
+        "name": "未安排",
+        "building": "未安排",
+        "room_no": "未安排"
+    }
+    if row.room_id is not None:
+        classroom_data = {
+            "id": row.room_id,
+            "name": row.room_no or "未安排",
+            "building": row.building or "未安排",
+            "room_no": row.room_no or "未安排"
+        }
+    
+    semester_value = row.semester or "未知"
+    
+    # 时间和周数使用写入时规范化的值
+    start_time, end_time, weeks_value = schedule_display_fields(row)[:3]
+    
+    return {
+        "id": row.schedule_id,
+        "schedule_id": row.schedule_id,
+        "offering_id": row.offering_id,
+        "classroom_id": row.classroom_id,
+        "day_of_week": row.day_of_week,
+        "day_of_week_text": day_map.get(row.day_of_week, "未知"),
+        "day_name": day_map.get(row.day_of_week, "未知"),
+        "start_time": start_time,
+        "end_time": end_time,
+        "weeks": weeks_value,
+        "course": course_data,
+        "teacher": teacher_data,
+        "classroom": classroom_data,
+        "semester": semester_value,
+        "academicYear": "2023-2024",  # 默认学年
+        "course_name": course_data["name"],      # 添加快捷访问字段
+        "teacher_name": teacher_data["name"],    # 添加快捷访问字段
+        "room_no": classroom_data["name"],       # 添加快捷访问字段
+        "building": classroom_data["building"],  # 添加快捷访问字段
+        "course_offering": {
+            "offering_id": row.offering_id,
+            "course": course_data,
+            "teacher": teacher_data,
+            "semester": semester_value,
+            "academicYear": "2023-2024"  # 默认学年
+        }
+    }
+
+
 @router.post("", response_model=APIResponse)
 def create_schedule(
     schedule_data: dict,
@@ -573,7 +606,14 @@ def create_schedule(
         except ValueError:
             raise HTTPException(status_code=400, detail="时间格式错误，应为HH:MM")
         
-        # 验证时间冲突
+        # 验证周数，无效周数的掩码为0，会被所有冲突检测忽略
+        try:
+            WeekMask.parse_strict(schedule_data["weeks"])
+        except ValueError:
+            raise HTTPException(status_code=400, detail="周数格式无效")
+        
+        # 验证时间冲突：锁定教室和教师后按数据库最新排课校验，不依赖进程内缓存
+        lock_schedule_resources(db, [schedule_data["classroom_id"]], [offering.teacher_id])
         # 1. 教室在同一天同一时间段是否已被占用
         conflicts = check_classroom_conflicts(
             db, 
@@ -582,7 +622,9 @@ def create_schedule(
             schedule_data["day_of_week"], 
             schedule_data["start_time"], 
             schedule_data["end_time"],
-            schedule_data["weeks"]
+            schedule_data["weeks"],
+            offering.semester,
+            fresh=True
         )
         if conflicts:
             raise HTTPException(status_code=400, detail="该教室在所选时间段已被占用")
@@ -595,7 +637,9 @@ def create_schedule(
             schedule_data["day_of_week"], 
             schedule_data["start_time"], 
             schedule_data["end_time"],
-            schedule_data["weeks"]
+            schedule_data["weeks"],
+            offering.semester,
+            fresh=True
         )
         if teacher_conflicts:
             raise HTTPException(status_code=400, detail="该教师在所选时间段已有其他课程")
@@ -613,6 +657,9 @@ def create_schedule(
         db.add(new_schedule)
         db.commit()
         db.refresh(new_schedule)
+        schedule_index.record(new_schedule, offering.semester, offering.teacher_id)
+        room_occupancy.record(new_schedule, offering.semester)
+        timetable_cache.invalidate_offering(new_schedule.offering_id)
         
         # 星期几映射到中文
         day_map = {1: "周一", 2: "周二", 3: "周三", 4: "周四", 5: "周五", 6: "周六", 7: "周日"}
@@ -804,8 +851,9 @@ def get_schedule_grid_view(
         # 用于检测冲突的数据结构
         if include_conflicts:
             print("将检测排课冲突...")
-            classroom_bookings = {}  # 教室预订: {classroom_id: {day_of_week: [{schedule_id, start_minutes, end_minutes, weeks_set}]}}
-            teacher_bookings = {}    # 教师预订: {teacher_id: {day_of_week: [{schedule_id, start_minutes, end_minutes, weeks_set}]}}
+            schedule_rows = {}       # 排课ID到响应行的映射
+            classroom_bookings = {}  # 教室预订: {(classroom_id, day_of_week): [(start_minutes, end_minutes, weeks_mask, schedule_id)]}
+            teacher_bookings = {}    # 教师预订: {(teacher_id, day_of_week): [(start_minutes, end_minutes, weeks_mask, schedule_id)]}
         
         for schedule in schedules:
             try:
@@ -876,13 +924,8 @@ def get_schedule_grid_view(
                 # 获取学期信息
                 semester_value = safe_get(schedule, 'offering.semester', "未知")
                 
-                # 安全获取时间属性并格式化
-                start_time = format_time(getattr(schedule, 'start_time', None))
-                end_time = format_time(getattr(schedule, 'end_time', None))
-                
-                # 安全获取周数
-                weeks_value = ensure_valid_weeks_format(getattr(schedule, 'weeks', None))
-                weeks_set = parse_weeks(weeks_value)
+                # 时间和周数使用写入时规范化的值
+                start_time, end_time, weeks_value, start_minutes, end_minutes, weeks_mask = schedule_display_fields(schedule)
                 
                 # 获取排课ID和开课ID
                 schedule_id = getattr(schedule, 'schedule_id', 0)
@@ -916,48 +959,25 @@ def get_schedule_grid_view(
                     "teacher_name": teacher_data["name"],   # 添加快捷访问字段
                     "room_no": classroom_data["name"],      # 添加快捷访问字段
                     "building": classroom_data["building"], # 添加快捷访问字段
-                    "has_conflict": False  # 默认无冲突
+                    "has_conflict": False,  # 默认无冲突
+                    "conflict_with": []     # 冲突的排课ID
                 }
                 
                 # 如果需要检测冲突
                 if include_conflicts:
-                    # 将时间转换为分钟
-                    try:
-                        s_hour, s_minute = map(int, start_time.split(':'))
-                        e_hour, e_minute = map(int, end_time.split(':'))
-                        
-                        start_minutes = s_hour * 60 + s_minute
-                        end_minutes = e_hour * 60 + e_minute
+                    if start_minutes is None or end_minutes is None:
+                        print(f"处理时间数据时出错: {start_time}-{end_time}")
+                    else:
+                        schedule_rows[schedule_id] = schedule_data
+                        booking = (start_minutes, end_minutes, weeks_mask, schedule_id)
                         
                         # 添加到教室预订
                         if classroom_id > 0:
-                            if classroom_id not in classroom_bookings:
-                                classroom_bookings[classroom_id] = {}
-                            if day_of_week not in classroom_bookings[classroom_id]:
-                                classroom_bookings[classroom_id][day_of_week] = []
-                                
-                            classroom_bookings[classroom_id][day_of_week].append({
-                                "schedule_id": schedule_id,
-                                "start_minutes": start_minutes,
-                                "end_minutes": end_minutes,
-                                "weeks_set": weeks_set
-                            })
+                            classroom_bookings.setdefault((classroom_id, day_of_week), []).append(booking)
                         
                         # 添加到教师预订
                         if teacher_id > 0:
-                            if teacher_id not in teacher_bookings:
-                                teacher_bookings[teacher_id] = {}
-                            if day_of_week not in teacher_bookings[teacher_id]:
-                                teacher_bookings[teacher_id][day_of_week] = []
-                                
-                            teacher_bookings[teacher_id][day_of_week].append({
-                                "schedule_id": schedule_id,
-                                "start_minutes": start_minutes,
-                                "end_minutes": end_minutes,
-                                "weeks_set": weeks_set
-                            })
-                    except Exception as e:
-                        print(f"处理时间数据时出错: {e}")
+                            teacher_bookings.setdefault((teacher_id, day_of_week), []).append(booking)
                 
                 schedule_list.append(schedule_data)
             except Exception as e:
@@ -968,59 +988,21 @@ def get_schedule_grid_view(
         if include_conflicts and schedule_list:
             print("开始检测排课冲突...")
             
-            # 检查教室冲突
-            for classroom_id, days in classroom_bookings.items():
-                for day, bookings in days.items():
-                    if len(bookings) < 2:
-                        continue  # 如果同一教室同一天只有一个预订，不会有冲突
-                    
-                    # 检查该教室该天的所有预订是否有冲突
-                    for i in range(len(bookings)):
-                        for j in range(i + 1, len(bookings)):
-                            booking_i = bookings[i]
-                            booking_j = bookings[j]
-                            
-                            # 检查时间是否重叠
-                            time_overlap = (booking_i["end_minutes"] > booking_j["start_minutes"] and 
-                                           booking_i["start_minutes"] < booking_j["end_minutes"])
-                            
-                            if time_overlap:
-                                # 检查周数是否重叠
-                                if not booking_i["weeks_set"].isdisjoint(booking_j["weeks_set"]):
-                                    # 标记这两个预订有冲突
-                                    for schedule_data in schedule_list:
-                                        if schedule_data["id"] == booking_i["schedule_id"] or schedule_data["id"] == booking_j["schedule_id"]:
-                                            schedule_data["has_conflict"] = True
-                                            schedule_data["conflict_type"] = "classroom"
-            
-            # 检查教师冲突
-            for teacher_id, days in teacher_bookings.items():
-                for day, bookings in days.items():
+            # 按教室和教师分别做扫描线检测，每对冲突只标记一次
+            for conflict_type, bookings_map in (("classroom", classroom_bookings), ("teacher", teacher_bookings)):
+                for bookings in bookings_map.values():
                     if len(bookings) < 2:
-                        continue  # 如果同一教师同一天只有一个预订，不会有冲突
+                        continue  # 同一资源同一天只有一个预订，不会有冲突
                     
-                    # 检查该教师该天的所有预订是否有冲突
-                    for i in range(len(bookings)):
-                        for j in range(i + 1, len(bookings)):
-                            booking_i = bookings[i]
-                            booking_j = bookings[j]
-                            
-                            # 检查时间是否重叠
-                            time_overlap = (booking_i["end_minutes"] > booking_j["start_minutes"] and 
-                                           booking_i["start_minutes"] < booking_j["end_minutes"])
-                            
-                            if time_overlap:
-                                # 检查周数是否重叠
-                                if not booking_i["weeks_set"].isdisjoint(booking_j["weeks_set"]):
-                                    # 标记这两个预订有冲突
-                                    for schedule_data in schedule_list:
-                                        if schedule_data["id"] == booking_i["schedule_id"] or schedule_data["id"] == booking_j["schedule_id"]:
-                                            schedule_data["has_conflict"] = True
-                                            conflict_type = schedule_data.get("conflict_type", "")
-                                            if conflict_type:
-                                                schedule_data["conflict_type"] = conflict_type + ",teacher"
-                                            else:
-                                                schedule_data["conflict_type"] = "teacher"
+                    for id_a, id_b in find_overlapping_pairs(bookings):
+                        for row_id, other_id in ((id_a, id_b), (id_b, id_a)):
+                            schedule_data = schedule_rows[row_id]
+                            schedule_data["has_conflict"] = True
+                            existing_type = schedule_data.get("conflict_type", "")
+                            if conflict_type not in existing_type.split(","):
+                                schedule_data["conflict_type"] = f"{existing_type},{conflict_type}" if existing_type else conflict_type
+                            if other_id not in schedule_data["conflict_with"]:
+                                schedule_data["conflict_with"].append(other_id)
             
             conflict_count = sum(1 for s in schedule_list if s.get("has_conflict", False))
             print(f"冲突检测完成，发现 {conflict_count} 个冲突")
@@ -1043,42 +1025,220 @@ def get_schedule_grid_view(
         )
 
 
-@router.get("/{schedule_id}", response_model=APIResponse)
-def get_schedule(
-    schedule_id: int,
+# 各课程类型适合的教室类型，按优先级排列
+PREFERRED_ROOM_TYPES = {
+    "必修": ["多媒体教室", "普通教室"],
+    "选修": ["普通教室", "多媒体教室"],
+    "公选": ["多媒体教室", "普通教室"],
+}
+
+# 推荐评分权重
+ROOM_FIT_WEIGHT = 50
+ROOM_TYPE_WEIGHT = 30
+ROOM_BUILDING_WEIGHT = 20
+
+
+@router.get("/recommend-rooms", response_model=APIResponse)
+def recommend_rooms(
     db: Session = Depends(get_db),
+    offering_id: int = Query(..., description="开课ID"),
+    day_of_week: int = Query(..., ge=1, le=7, description="星期几，1-7表示周一到周日"),
+    start_time: str = Query(..., description="开始时间，格式HH:MM"),
+    end_time: str = Query(..., description="结束时间，格式HH:MM"),
+    weeks: str = Query(..., description="周次，例如 1-16"),
+    schedule_id: int = Query(None, description="调整已有排课时传入，忽略其自身占用"),
+    limit: int = Query(10, ge=1, le=100),
     _: Any = Depends(deps.check_permissions(["SCHEDULE_VIEW"])),
 ) -> Any:
     """
-    获取排课详情
+    为排课推荐空闲教室
+    按容量匹配度、教室类型与课程类型的匹配度、是否与教师其他课程同楼综合排序，
+    同时返回教师在该时间段的冲突，一次请求即可完成排课前的检查
     """
     try:
-        schedule = db.query(Schedule).options(
-            joinedload(Schedule.offering).joinedload(CourseOffering.course),
-            joinedload(Schedule.offering).joinedload(CourseOffering.teacher).joinedload(Teacher.user),
-            joinedload(Schedule.classroom)
-        ).filter(Schedule.schedule_id == schedule_id).first()
+        start_minutes = time_to_minutes(start_time)
+        end_minutes = time_to_minutes(end_time)
+        if start_minutes is None or end_minutes is None:
+            raise HTTPException(status_code=400, detail="时间格式错误，应为HH:MM")
+        if start_minutes >= end_minutes:
+            raise HTTPException(status_code=400, detail="开始时间必须早于结束时间")
+        weeks_mask = WeekMask.parse(weeks)
+        if not weeks_mask:
+            raise HTTPException(status_code=400, detail="周数格式无效")
         
-        if not schedule:
-            raise HTTPException(status_code=404, detail="排课记录不存在")
+        offering = db.query(
+            CourseOffering.offering_id, CourseOffering.teacher_id, CourseOffering.semester,
+            CourseOffering.max_students, Course.course_type
+        ).join(
+            Course, CourseOffering.course_id == Course.course_id
+        ).filter(CourseOffering.offering_id == offering_id).first()
+        if not offering:
+            raise HTTPException(status_code=404, detail="开课信息不存在")
         
-        # 星期几映射到中文
-        day_map = {1: "周一", 2: "周二", 3: "周三", 4: "周四", 5: "周五", 6: "周六", 7: "周日"}
-
-        # 构建课程、教师和教室数据
-        course_data = None
-        if schedule.offering and schedule.offering.course:
-            course_data = {
-                "id": schedule.offering.course.course_id,
-                "code": schedule.offering.course.course_code,
-                "name": schedule.offering.course.course_name
-            }
+        teacher_conflicts = []
+        if offering.teacher_id is not None:
+            teacher_conflicts = schedule_index.find_conflicts(
+                db, TEACHER, offering.teacher_id, day_of_week, start_minutes, end_minutes,
+                int(weeks_mask), semester=offering.semester, exclude_schedule_id=schedule_id
+            )
         
-        teacher_data = None
-        if schedule.offering and schedule.offering.teacher and schedule.offering.teacher.user:
-            teacher_data = {
-                "id": schedule.offering.teacher.teacher_id,
-                "name": schedule.offering.teacher.user.real_name
+        # 容量足够的可用教室
+        size = offering.max_students or 0
+        rooms = db.query(
+            Classroom.classroom_id, Classroom.room_no, Classroom.building,
+            Classroom.floor, Classroom.capacity, Classroom.room_type
+        ).filter(
+            Classroom.status == 1,
+            Classroom.capacity >= size
+        ).all()
+        free_ids = set(room_occupancy.free_classrooms(
+            db, [room.classroom_id for room in rooms], day_of_week, start_minutes, end_minutes,
+            int(weeks_mask), offering.semester, exclude_schedule_id=schedule_id
+        ))
+        
+        # 教师本学期其他课程所在教学楼
+        building_counts: Dict[str, int] = {}
+        if offering.teacher_id is not None:
+            building_query = db.query(Classroom.building, func.count(Schedule.schedule_id)).join(
+                Schedule, Schedule.classroom_id == Classroom.classroom_id
+            ).join(
+                CourseOffering, Schedule.offering_id == CourseOffering.offering_id
+            ).filter(
+                CourseOffering.teacher_id == offering.teacher_id,
+                CourseOffering.semester == offering.semester
+            )
+            if schedule_id:
+                building_query = building_query.filter(Schedule.schedule_id != schedule_id)
+            building_counts = dict(building_query.group_by(Classroom.building).all())
+        teacher_sessions = sum(building_counts.values())
+        
+        preferred_types = PREFERRED_ROOM_TYPES.get(offering.course_type, [])
+        recommendations = []
+        for room in rooms:
+            if room.classroom_id not in free_ids:
+                continue
+            fit = size / room.capacity if room.capacity else 0
+            if room.room_type in preferred_types:
+                type_score = 1 - preferred_types.index(room.room_type) / len(preferred_types)
+            else:
+                type_score = 0
+            building_share = building_counts.get(room.building, 0) / teacher_sessions if teacher_sessions else 0
+            score = ROOM_FIT_WEIGHT * fit + ROOM_TYPE_WEIGHT * type_score + ROOM_BUILDING_WEIGHT * building_share
+            
+            reasons = [f"容量{room.capacity}，利用率{fit:.0%}"]
+            if type_score:
+                reasons.append(f"{room.room_type}适合{offering.course_type}课程")
+            if building_share:
+                reasons.append(f"与教师其他课程同在{room.building}")
+            recommendations.append({
+                "classroom_id": room.classroom_id,
+                "room_no": room.room_no,
+                "building": room.building,
+                "floor": room.floor,
+                "capacity": room.capacity,
+                "room_type": room.room_type,
+                "score": round(score, 2),
+                "reasons": reasons
+            })
+        
+        recommendations.sort(key=lambda item: (-item["score"], item["capacity"], item["classroom_id"]))
+        
+        return APIResponse(
+            code=0,
+            message="获取推荐教室成功",
+            data={
+                "offering_id": offering.offering_id,
+                "semester": offering.semester,
+                "max_students": size,
+                "teacher_conflict": bool(teacher_conflicts),
+                "teacher_conflicts": teacher_conflicts,
+                "total_free": len(recommendations),
+                "list": recommendations[:limit]
+            }
+        )
+    except HTTPException as http_exc:
+        raise http_exc
+    except Exception as e:
+        error_msg = f"获取推荐教室失败: {str(e)}\n{traceback.format_exc()}"
+        print(error_msg)
+        raise HTTPException(status_code=500, detail=f"获取推荐教室失败: {str(e)}")
+
+
+@router.get("/my-schedule", response_model=APIResponse)
+def get_my_schedule(
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db),
+    current_user: Any = Depends(deps.get_current_active_user),
+    semester: str = None,
+    _: Any = Depends(deps.check_permissions(["MY_SCHEDULE_VIEW"])),
+) -> Any:
+    """
+    获取当前用户的课程表
+    """
+    try:
+        # 检查用户是否是学生
+        student = None
+        teacher = None
+        
+        if hasattr(current_user, 'student_info') and current_user.student_info:
+            student = current_user.student_info
+        elif hasattr(current_user, 'teacher_info') and current_user.teacher_info:
+            teacher = current_user.teacher_info
+        
+        if student:
+            # 获取学生的课程表
+            return get_schedules_by_student(student.student_id, request, response, db, semester)
+        elif teacher:
+            # 获取教师的课程表
+            return get_schedules_by_teacher(teacher.teacher_id, db, semester)
+        else:
+            raise HTTPException(status_code=400, detail="当前用户不是学生或教师")
+        
+    except HTTPException as http_exc:
+        raise http_exc
+    except Exception as e:
+        error_msg = f"获取课程表失败: {str(e)}\n{traceback.format_exc()}"
+        print(error_msg)
+        raise HTTPException(status_code=500, detail=f"获取课程表失败: {str(e)}")
+
+
+@router.get("/{schedule_id}", response_model=APIResponse)
+def get_schedule(
+    schedule_id: int,
+    db: Session = Depends(get_db),
+    _: Any = Depends(deps.check_permissions(["SCHEDULE_VIEW"])),
+) -> Any:
+    """
+    获取排课详情
+    """
+    try:
+        schedule = db.query(Schedule).options(
+            joinedload(Schedule.offering).joinedload(CourseOffering.course),
+            joinedload(Schedule.offering).joinedload(CourseOffering.teacher).joinedload(Teacher.user),
+            joinedload(Schedule.classroom)
+        ).filter(Schedule.schedule_id == schedule_id).first()
+        
+        if not schedule:
+            raise HTTPException(status_code=404, detail="排课记录不存在")
+        
+        # 星期几映射到中文
+        day_map = {1: "周一", 2: "周二", 3: "周三", 4: "周四", 5: "周五", 6: "周六", 7: "周日"}
+
+        # 构建课程、教师和教室数据
+        course_data = None
+        if schedule.offering and schedule.offering.course:
+            course_data = {
+                "id": schedule.offering.course.course_id,
+                "code": schedule.offering.course.course_code,
+                "name": schedule.offering.course.course_name
+            }
+        
+        teacher_data = None
+        if schedule.offering and schedule.offering.teacher and schedule.offering.teacher.user:
+            teacher_data = {
+                "id": schedule.offering.teacher.teacher_id,
+                "name": schedule.offering.teacher.user.real_name
             }
         
         classroom_data = None
@@ -1142,6 +1302,10 @@ def update_schedule(
         if not schedule:
             raise HTTPException(status_code=404, detail="排课记录不存在")
         
+        offering = db.query(CourseOffering).filter(
+            CourseOffering.offering_id == schedule.offering_id
+        ).first()
+        
         # 如果更新了教室
         if "classroom_id" in schedule_data and schedule_data["classroom_id"] != schedule.classroom_id:
             classroom = db.query(Classroom).filter(
@@ -1160,6 +1324,13 @@ def update_schedule(
             except ValueError:
                 raise HTTPException(status_code=400, detail="时间格式错误，应为HH:MM")
         
+        # 如果更新了周数，验证周数
+        if "weeks" in schedule_data:
+            try:
+                WeekMask.parse_strict(schedule_data["weeks"])
+            except ValueError:
+                raise HTTPException(status_code=400, detail="周数格式无效")
+        
         # 验证时间冲突
         if any(key in schedule_data for key in ["classroom_id", "day_of_week", "start_time", "end_time", "weeks"]):
             classroom_id = schedule_data.get("classroom_id", schedule.classroom_id)
@@ -1168,6 +1339,9 @@ def update_schedule(
             end_time = schedule_data.get("end_time", schedule.end_time)
             weeks = schedule_data.get("weeks", schedule.weeks)
             
+            # 锁定教室和教师后按数据库最新排课校验
+            lock_schedule_resources(db, [classroom_id], [offering.teacher_id] if offering else [])
+            
             # 检查教室冲突
             conflicts = check_classroom_conflicts(
                 db, 
@@ -1176,15 +1350,14 @@ def update_schedule(
                 day_of_week, 
                 start_time, 
                 end_time,
-                weeks
+                weeks,
+                offering.semester if offering else None,
+                fresh=True
             )
             if conflicts:
                 raise HTTPException(status_code=400, detail="该教室在所选时间段已被占用")
             
             # 检查教师冲突
-            offering = db.query(CourseOffering).filter(
-                CourseOffering.offering_id == schedule.offering_id
-            ).first()
             if offering:
                 teacher_conflicts = check_teacher_conflicts(
                     db, 
@@ -1193,7 +1366,9 @@ def update_schedule(
                     day_of_week, 
                     start_time, 
                     end_time,
-                    weeks
+                    weeks,
+                    offering.semester,
+                    fresh=True
                 )
                 if teacher_conflicts:
                     raise HTTPException(status_code=400, detail="该教师在所选时间段已有其他课程")
@@ -1206,6 +1381,13 @@ def update_schedule(
         
         db.commit()
         db.refresh(schedule)
+        schedule_index.record(
+            schedule,
+            offering.semester if offering else None,
+            offering.teacher_id if offering else None
+        )
+        room_occupancy.record(schedule, offering.semester if offering else None)
+        timetable_cache.invalidate_offering(schedule.offering_id)
         
         # 重新加载关联数据
         schedule = db.query(Schedule).options(
@@ -1294,8 +1476,12 @@ def delete_schedule(
         if not schedule:
             raise HTTPException(status_code=404, detail="排课记录不存在")
         
+        offering_id = schedule.offering_id
         db.delete(schedule)
         db.commit()
+        schedule_index.discard(schedule_id)
+        room_occupancy.discard(schedule_id)
+        timetable_cache.invalidate_offering(offering_id)
         
         return APIResponse(
             code=0,
@@ -1459,62 +1645,29 @@ def get_schedules_by_teacher(
 @router.get("/by-student/{student_id}", response_model=APIResponse)
 def get_schedules_by_student(
     student_id: int,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     semester: str = None,
     _: Any = Depends(deps.check_permissions(["SCHEDULE_VIEW", "MY_SCHEDULE_VIEW"])),
 ) -> Any:
     """
     根据学生ID获取排课列表
+    课程表按(学生, 学期)缓存，响应携带ETag，内容未变化时对 If-None-Match 返回304
     """
     try:
-        # 使用SQL查询获取学生选课的排课信息
-        query = """
-        SELECT s.schedule_id, s.offering_id, s.classroom_id, s.day_of_week, 
-               s.start_time, s.end_time, s.weeks, 
-               c.course_name, c.course_code, u.real_name AS teacher_name, 
-               cr.room_no, cr.building, co.semester
-        FROM schedule s
-        JOIN course_offering co ON s.offering_id = co.offering_id
-        JOIN enrollment e ON co.offering_id = e.offering_id
-        JOIN course c ON co.course_id = c.course_id
-        JOIN teacher t ON co.teacher_id = t.teacher_id
-        JOIN user u ON t.user_id = u.user_id
-        JOIN classroom cr ON s.classroom_id = cr.classroom_id
-        WHERE e.student_id = :student_id AND e.status = 1
-        """
-        
-        params = {"student_id": student_id}
-        
-        if semester:
-            query += " AND co.semester = :semester"
-            params["semester"] = semester
+        entry = timetable_cache.get(student_id, semester)
+        if entry is None:
+            entry = build_student_timetable(db, student_id, semester)
         
-        result = db.execute(text(query), params).fetchall()
-        
-        # 构建响应
-        schedule_list = []
-        for row in result:
-            schedule_data = {
-                "id": row[0],
-                "offering_id": row[1],
-                "classroom_id": row[2],
-                "day_of_week": row[3],
-                "start_time": row[4],
-                "end_time": row[5],
-                "weeks": row[6],
-                "course_name": row[7],
-                "course_code": row[8],
-                "teacher_name": row[9],
-                "classroom_name": row[10],
-                "building": row[11],
-                "semester": row[12]
-            }
-            schedule_list.append(schedule_data)
+        if request.headers.get("if-none-match") == entry["etag"]:
+            return Response(status_code=304, headers={"ETag": entry["etag"]})
+        response.headers["ETag"] = entry["etag"]
         
         return APIResponse(
             code=0,
             message="获取成功",
-            data=schedule_list
+            data=entry["data"]
         )
     except Exception as e:
         error_msg = f"获取排课列表失败: {str(e)}\n{traceback.format_exc()}"
@@ -1522,41 +1675,69 @@ def get_schedules_by_student(
         raise HTTPException(status_code=500, detail=f"获取排课列表失败: {str(e)}")
 
 
-@router.get("/my-schedule", response_model=APIResponse)
-def get_my_schedule(
-    db: Session = Depends(get_db),
-    current_user: Any = Depends(deps.get_current_active_user),
-    semester: str = None,
-    _: Any = Depends(deps.check_permissions(["MY_SCHEDULE_VIEW"])),
-) -> Any:
+def build_student_timetable(db: Session, student_id: int, semester: Optional[str]) -> Dict[str, Any]:
     """
-    获取当前用户的课程表
+    查询并缓存学生课程表
+    缓存按学生已选的全部开课建立反向索引，尚未排课的开课新增排课后同样能使缓存失效；
+    版本号在查询之前读取：学生版本先于选课列表，开课版本先于排课查询，期间的任何失效都会使本次结果不写入缓存
     """
-    try:
-        # 检查用户是否是学生
-        student = None
-        teacher = None
-        
-        if hasattr(current_user, 'student_info') and current_user.student_info:
-            student = current_user.student_info
-        elif hasattr(current_user, 'teacher_info') and current_user.teacher_info:
-            teacher = current_user.teacher_info
-        
-        if student:
-            # 获取学生的课程表
-            return get_schedules_by_student(student.student_id, db, semester)
-        elif teacher:
-            # 获取教师的课程表
-            return get_schedules_by_teacher(teacher.teacher_id, db, semester)
-        else:
-            raise HTTPException(status_code=400, detail="当前用户不是学生或教师")
-        
-    except HTTPException as http_exc:
-        raise http_exc
-    except Exception as e:
-        error_msg = f"获取课程表失败: {str(e)}\n{traceback.format_exc()}"
-        print(error_msg)
-        raise HTTPException(status_code=500, detail=f"获取课程表失败: {str(e)}")
+    versions = timetable_cache.versions(student_id=student_id)
+    offering_ids = [
+        offering_id for (offering_id,) in db.query(Enrollment.offering_id).filter(
+            Enrollment.student_id == student_id,
+            Enrollment.status == True
+        ).all()
+    ]
+    if versions is not None:
+        offering_versions = timetable_cache.versions(offering_ids=offering_ids)
+        versions = None if offering_versions is None else {**versions, **offering_versions}
+    
+    # 使用SQL查询获取学生选课的排课信息
+    query = """
+    SELECT s.schedule_id, s.offering_id, s.classroom_id, s.day_of_week, 
+           s.start_time, s.end_time, s.start_minutes, s.end_minutes, s.weeks, s.weeks_mask,
+           c.course_name, c.course_code, u.real_name AS teacher_name, 
+           cr.room_no, cr.building, co.semester
+    FROM schedule s
+    JOIN course_offering co ON s.offering_id = co.offering_id
+    JOIN enrollment e ON co.offering_id = e.offering_id
+    JOIN course c ON co.course_id = c.course_id
+    JOIN teacher t ON co.teacher_id = t.teacher_id
+    JOIN user u ON t.user_id = u.user_id
+    JOIN classroom cr ON s.classroom_id = cr.classroom_id
+    WHERE e.student_id = :student_id AND e.status = 1
+    """
+    
+    params = {"student_id": student_id}
+    
+    if semester:
+        query += " AND co.semester = :semester"
+        params["semester"] = semester
+    query += " ORDER BY s.day_of_week, s.start_time, s.schedule_id"
+    
+    result = db.execute(text(query), params).fetchall()
+    
+    # 构建响应
+    schedule_list = []
+    for row in result:
+        start_time, end_time, weeks_value = schedule_display_fields(row)[:3]
+        schedule_list.append({
+            "id": row.schedule_id,
+            "offering_id": row.offering_id,
+            "classroom_id": row.classroom_id,
+            "day_of_week": row.day_of_week,
+            "start_time": start_time,
+            "end_time": end_time,
+            "weeks": weeks_value,
+            "course_name": row.course_name,
+            "course_code": row.course_code,
+            "teacher_name": row.teacher_name,
+            "classroom_name": row.room_no,
+            "building": row.building,
+            "semester": row.semester
+        })
+    
+    return timetable_cache.set(student_id, semester, schedule_list, versions)
 
 
 @router.get("/by-semester/{semester}", response_model=APIResponse)
@@ -1779,12 +1960,8 @@ def get_schedule_info_list(
                 if schedule.offering:
                     semester_value = schedule.offering.semester or "未知学期"
                 
-                # 确保时间格式正确
-                start_time = format_time(getattr(schedule, 'start_time', None))
-                end_time = format_time(getattr(schedule, 'end_time', None))
-                
-                # 确保weeks字段格式正确
-                weeks_value = ensure_valid_weeks_format(schedule.weeks or "")
+                # 时间和周数使用写入时规范化的值
+                start_time, end_time, weeks_value = schedule_display_fields(schedule)[:3]
                 
                 # 构建排课信息 - 确保与前端期望的字段对应
                 schedule_info = {
@@ -1852,104 +2029,17 @@ def check_classroom_conflicts(
     day_of_week: int, 
     start_time: str, 
     end_time: str,
-    weeks: str
+    weeks: str,
+    semester: Optional[str] = None,
+    fresh: bool = False
 ) -> bool:
     """
     检查教室时间冲突
+    通过排课冲突索引查询，semester为None时不区分学期；写操作传入fresh=True按数据库最新数据校验
     """
-    print(f"检查教室时间冲突: 教室ID={classroom_id}, 星期={day_of_week}, 时间={start_time}-{end_time}, 周数={weeks}")
-    
-    # 查询同一教室、同一天的所有排课
-    query = db.query(Schedule).filter(
-        Schedule.classroom_id == classroom_id,
-        Schedule.day_of_week == day_of_week
-    )
-    
-    # 如果是更新排课，排除自身
-    if schedule_id:
-        query = query.filter(Schedule.schedule_id != schedule_id)
-        print(f"排除当前排课ID: {schedule_id}")
-    
-    existing_schedules = query.all()
-    print(f"找到 {len(existing_schedules)} 条相同教室相同天的排课")
-    
-    # 如果没有现有排课，则不会有冲突
-    if not existing_schedules:
-        print("没有找到现有排课，不存在冲突")
-        return False
-    
-    # 将传入的时间转换为分钟数
-    try:
-        start_hour, start_minute = map(int, start_time.split(':'))
-        end_hour, end_minute = map(int, end_time.split(':'))
-        
-        new_start_minutes = start_hour * 60 + start_minute
-        new_end_minutes = end_hour * 60 + end_minute
-        
-        print(f"新排课时间: {start_time}({new_start_minutes}分钟) - {end_time}({new_end_minutes}分钟)")
-        
-        # 检查时间是否有效
-        if new_start_minutes >= new_end_minutes:
-            print(f"警告: 开始时间不早于结束时间，可能导致冲突判断不准确")
-    except Exception as e:
-        print(f"时间格式解析错误: {e}")
-        return True  # 出错时保守地返回有冲突
-    
-    # 解析周数
-    new_weeks_set = parse_weeks(weeks)
-    if not new_weeks_set:
-        print("新排课的周数为空，不会有冲突")
-        return False
-    
-    # 检查每个现有排课是否与新排课时间重叠
-    for i, schedule in enumerate(existing_schedules):
-        print(f"\n检查排课 {i+1}/{len(existing_schedules)} [ID:{schedule.schedule_id}]:")
-        
-        # 解析现有排课的周数
-        existing_weeks = schedule.weeks or ""
-        print(f"  现有排课周数: {existing_weeks}")
-        existing_weeks_set = parse_weeks(existing_weeks)
-        
-        if not existing_weeks_set:
-            print("  现有排课的周数为空，跳过")
-            continue
-        
-        # 检查是否有周数重叠
-        weeks_overlap = not new_weeks_set.isdisjoint(existing_weeks_set)
-        if not weeks_overlap:
-            print("  周数不重叠，不存在冲突")
-            continue
-        
-        # 打印重叠的周数
-        overlapping_weeks = new_weeks_set.intersection(existing_weeks_set)
-        print(f"  周数重叠: {sorted(overlapping_weeks)}")
-        
-        # 将现有排课的时间转换为分钟数
-        try:
-            s_hour, s_minute = map(int, schedule.start_time.split(':'))
-            e_hour, e_minute = map(int, schedule.end_time.split(':'))
-            
-            existing_start_minutes = s_hour * 60 + s_minute
-            existing_end_minutes = e_hour * 60 + e_minute
-            
-            print(f"  现有排课时间: {schedule.start_time}({existing_start_minutes}分钟) - {schedule.end_time}({existing_end_minutes}分钟)")
-            
-            # 检查时间段是否重叠
-            # 不重叠的条件: 新课结束时间 <= 现有课开始时间 或 新课开始时间 >= 现有课结束时间
-            # 重叠的条件: 新课结束时间 > 现有课开始时间 且 新课开始时间 < 现有课结束时间
-            time_overlap = (new_end_minutes > existing_start_minutes and new_start_minutes < existing_end_minutes)
-            
-            if time_overlap:
-                print(f"  时间重叠，存在冲突")
-                return True
-            else:
-                print(f"  时间不重叠，不存在冲突")
-        except Exception as e:
-            print(f"  时间格式解析错误: {e}")
-            return True  # 出错时保守地返回有冲突
-    
-    print("\n所有排课检查完毕，不存在冲突")
-    return False
+    return bool(find_schedule_conflicts(
+        db, CLASSROOM, schedule_id, classroom_id, day_of_week, start_time, end_time, weeks, semester, fresh
+    ))
 
 
 def check_teacher_conflicts(
@@ -1959,168 +2049,70 @@ def check_teacher_conflicts(
     day_of_week: int, 
     start_time: str, 
     end_time: str,
-    weeks: str
+    weeks: str,
+    semester: Optional[str] = None,
+    fresh: bool = False
 ) -> bool:
     """
     检查教师时间冲突
+    通过排课冲突索引查询，semester为None时不区分学期；写操作传入fresh=True按数据库最新数据校验
     """
-    print(f"检查教师时间冲突: 教师ID={teacher_id}, 星期={day_of_week}, 时间={start_time}-{end_time}, 周数={weeks}")
-    
-    # 使用SQL查询查找同一教师在同一天的所有排课
-    query = """
-    SELECT s.schedule_id, s.start_time, s.end_time, s.weeks
-    FROM schedule s
-    JOIN course_offering co ON s.offering_id = co.offering_id
-    WHERE co.teacher_id = :teacher_id AND s.day_of_week = :day_of_week
+    return bool(find_schedule_conflicts(
+        db, TEACHER, schedule_id, teacher_id, day_of_week, start_time, end_time, weeks, semester, fresh
+    ))
+
+
+def find_schedule_conflicts(
+    db: Session,
+    kind: str,
+    schedule_id: Optional[int],
+    resource_id: int,
+    day_of_week: int,
+    start_time: str,
+    end_time: str,
+    weeks: str,
+    semester: Optional[str] = None,
+    fresh: bool = False
+) -> List[int]:
     """
-    
-    params = {"teacher_id": teacher_id, "day_of_week": day_of_week}
-    
-    # 如果是更新排课，排除自身
-    if schedule_id:
-        query += " AND s.schedule_id != :schedule_id"
-        params["schedule_id"] = schedule_id
-        print(f"排除当前排课ID: {schedule_id}")
-    
-    result = db.execute(text(query), params).fetchall()
-    print(f"找到 {len(result)} 条相同教师相同天的排课")
-    
-    # 如果没有现有排课，则不会有冲突
-    if not result:
-        print("没有找到现有排课，不存在冲突")
-        return False
-    
-    # 将传入的时间转换为分钟数
-    try:
-        start_hour, start_minute = map(int, start_time.split(':'))
-        end_hour, end_minute = map(int, end_time.split(':'))
-        
-        new_start_minutes = start_hour * 60 + start_minute
-        new_end_minutes = end_hour * 60 + end_minute
-        
-        print(f"新排课时间: {start_time}({new_start_minutes}分钟) - {end_time}({new_end_minutes}分钟)")
-        
-        # 检查时间是否有效
-        if new_start_minutes >= new_end_minutes:
-            print(f"警告: 开始时间不早于结束时间，可能导致冲突判断不准确")
-    except Exception as e:
-        print(f"时间格式解析错误: {e}")
-        return True  # 出错时保守地返回有冲突
-    
-    # 解析周数
-    new_weeks_set = parse_weeks(weeks)
-    if not new_weeks_set:
-        print("新排课的周数为空，不会有冲突")
-        return False
-    
-    # 检查每个现有排课是否与新排课时间重叠
-    for i, row in enumerate(result):
-        schedule_id = row[0]
-        existing_start_time = row[1]
-        existing_end_time = row[2]
-        existing_weeks = row[3] or ""
-        
-        print(f"\n检查排课 {i+1}/{len(result)} [ID:{schedule_id}]:")
-        print(f"  现有排课周数: {existing_weeks}")
-        
-        # 解析现有排课的周数
-        existing_weeks_set = parse_weeks(existing_weeks)
-        
-        if not existing_weeks_set:
-            print("  现有排课的周数为空，跳过")
-            continue
-        
-        # 检查是否有周数重叠
-        weeks_overlap = not new_weeks_set.isdisjoint(existing_weeks_set)
-        if not weeks_overlap:
-            print("  周数不重叠，不存在冲突")
-            continue
-        
-        # 打印重叠的周数
-        overlapping_weeks = new_weeks_set.intersection(existing_weeks_set)
-        print(f"  周数重叠: {sorted(overlapping_weeks)}")
-        
-        # 将现有排课的时间转换为分钟数
-        try:
-            s_hour, s_minute = map(int, existing_start_time.split(':'))
-            e_hour, e_minute = map(int, existing_end_time.split(':'))
-            
-            existing_start_minutes = s_hour * 60 + s_minute
-            existing_end_minutes = e_hour * 60 + e_minute
-            
-            print(f"  现有排课时间: {existing_start_time}({existing_start_minutes}分钟) - {existing_end_time}({existing_end_minutes}分钟)")
-            
-            # 检查时间段是否重叠
-            # 不重叠的条件: 新课结束时间 <= 现有课开始时间 或 新课开始时间 >= 现有课结束时间
-            # 重叠的条件: 新课结束时间 > 现有课开始时间 且 新课开始时间 < 现有课结束时间
-            time_overlap = (new_end_minutes > existing_start_minutes and new_start_minutes < existing_end_minutes)
-            
-            if time_overlap:
-                print(f"  时间重叠，存在冲突")
-                return True
-            else:
-                print(f"  时间不重叠，不存在冲突")
-        except Exception as e:
-            print(f"  时间格式解析错误: {e}")
-            return True  # 出错时保守地返回有冲突
-    
-    print("\n所有排课检查完毕，不存在冲突")
-    return False
+    返回与给定时间段冲突的排课ID列表
+    """
+    new_start_minutes = time_to_minutes(start_time)
+    new_end_minutes = time_to_minutes(end_time)
+    if new_start_minutes is None or new_end_minutes is None:
+        print(f"时间格式解析错误: {start_time}-{end_time}")
+        # 出错时保守地视为整天占用
+        new_start_minutes, new_end_minutes = 0, DAY_MINUTES
+
+    return schedule_index.find_conflicts(
+        db,
+        kind,
+        resource_id,
+        day_of_week,
+        new_start_minutes,
+        new_end_minutes,
+        WeekMask.parse(weeks),
+        semester=semester,
+        exclude_schedule_id=schedule_id,
+        fresh=fresh
+    )
 
 
-def parse_weeks(weeks_str: str) -> set:
+def lock_schedule_resources(db: Session, classroom_ids: Any, teacher_ids: Any) -> None:
     """
-    解析周数字符串，返回包含所有周数的集合
-    例如: "1-3,5,7-9" 会返回 {1, 2, 3, 5, 7, 8, 9}
+    写入排课前锁定相关的教室和教师行，使同一资源的排课写操作（可能来自不同进程）串行执行
+    按先教室后教师、ID升序加锁，避免死锁
     """
-    weeks_set = set()
-    
-    if not weeks_str:
-        print(f"警告: 周数字符串为空，返回空集合")
-        return weeks_set
-    
-    print(f"解析周数字符串: {weeks_str}")
-    
-    try:
-        parts = weeks_str.split(',')
-        
-        for part in parts:
-            part = part.strip()
-            if not part:
-                continue
-                
-            if '-' in part:
-                try:
-                    start_str, end_str = part.split('-')
-                    start = int(start_str.strip())
-                    end = int(end_str.strip())
-                    
-                    # 确保开始周不大于结束周
-                    if start > end:
-                        print(f"警告: 周数范围错误 {start}-{end}，自动交换")
-                        start, end = end, start
-                        
-                    # 限制最大周数范围，防止过大的范围
-                    if end - start > 30:
-                        print(f"警告: 周数范围过大 {start}-{end}，限制为最多30周")
-                        end = start + 30
-                        
-                    weeks_set.update(range(start, end + 1))
-                except ValueError as e:
-                    print(f"错误: 无法解析周数范围 '{part}': {e}")
-            else:
-                try:
-                    week = int(part)
-                    weeks_set.add(week)
-                except ValueError as e:
-                    print(f"错误: 无法解析单周 '{part}': {e}")
-    except Exception as e:
-        print(f"解析周数字符串时出现异常: {e}")
-        # 发生异常时返回默认的1-16周，以便继续运行
-        return set(range(1, 17))
-    
-    print(f"解析结果: {sorted(weeks_set)}")
-    return weeks_set
+    classroom_ids = sorted({int(i) for i in classroom_ids if i is not None})
+    teacher_ids = sorted({int(i) for i in teacher_ids if i is not None})
+    if classroom_ids:
+        db.query(Classroom.classroom_id).filter(
+            Classroom.classroom_id.in_(classroom_ids)
+        ).order_by(Classroom.classroom_id).with_for_update().all()
+    if teacher_ids:
+        db.query(Teacher.teacher_id).filter(
+            Teacher.teacher_id.in_(teacher_ids)
+        ).order_by(Teacher.teacher_id).with_for_update().all()
 
 
 @router.post("/conflicts", response_model=APIResponse)
@@ -2143,11 +2135,21 @@ def check_conflicts(
         end_time = conflict_data.get("end_time")
         weeks = conflict_data.get("weeks")
         exclude_schedule_id = conflict_data.get("exclude_schedule_id")
+        semester = conflict_data.get("semester")
+        offering_id = conflict_data.get("offering_id")
+        
+        # 未指定学期时，尝试从开课信息中获取
+        if not semester and offering_id:
+            offering = db.query(CourseOffering).filter(CourseOffering.offering_id == offering_id).first()
+            if offering:
+                semester = offering.semester
+                if not teacher_id:
+                    teacher_id = offering.teacher_id
         
         # 记录参数信息
         print(f"排课冲突检查参数: classroom_id={classroom_id}, teacher_id={teacher_id}, "
               f"day_of_week={day_of_week}, start_time={start_time}, end_time={end_time}, "
-              f"weeks={weeks}, exclude_schedule_id={exclude_schedule_id}")
+              f"weeks={weeks}, exclude_schedule_id={exclude_schedule_id}, semester={semester}")
         
         # 验证必要参数
         if day_of_week is None:
@@ -2176,9 +2178,8 @@ def check_conflicts(
         if start_minutes >= end_minutes:
             raise HTTPException(status_code=400, detail="开始时间必须早于结束时间")
         
-        # 解析周数为集合，以便检查重叠
-        weeks_set = parse_weeks(weeks)
-        if not weeks_set:
+        # 解析周数为位掩码，以便检查重叠
+        if not WeekMask.parse(weeks):
             raise HTTPException(status_code=400, detail="周数格式无效")
         
         # 检查教室冲突
@@ -2190,7 +2191,8 @@ def check_conflicts(
                 day_of_week, 
                 start_time, 
                 end_time,
-                weeks
+                weeks,
+                semester or None
             )
             if classroom_conflicts:
                 # 获取教室名称
@@ -2207,7 +2209,8 @@ def check_conflicts(
                 day_of_week, 
                 start_time, 
                 end_time,
-                weeks
+                weeks,
+                semester or None
             )
             if teacher_conflicts:
                 # 获取教师姓名
@@ -2235,277 +2238,578 @@ def check_conflicts(
         print(error_msg)
         raise HTTPException(status_code=500, detail=f"检查排课冲突失败: {str(e)}")
 
-def check_classroom_conflicts(
-    db: Session, 
-    schedule_id: int, 
-    classroom_id: int, 
-    day_of_week: int, 
-    start_time: str, 
-    end_time: str,
-    weeks: str
-) -> bool:
+
+# 批量导入排课的最大行数
+MAX_BATCH_SCHEDULE_ROWS = 10000
+SCHEDULE_IMPORT_FIELDS = ["offering_id", "classroom_id", "day_of_week", "start_time", "end_time", "weeks"]
+
+# 批量导入每条INSERT语句写入的行数
+SCHEDULE_INSERT_CHUNK_SIZE = 1000
+
+# 批量导入的冲突类型：SLOT 为违反唯一键 uk_time_classroom（同一教室、星期、起止时间，不区分学期和周次）
+SLOT = "slot"
+SCHEDULE_IMPORT_CONFLICT_MESSAGES = {
+    SLOT: "教室该时间段已存在排课",
+    CLASSROOM: "该教室在所选时间段已被占用",
+    TEACHER: "该教师在所选时间段已有其他课程",
+}
+
+
+def schedule_slot_key(row: Any) -> Tuple[int, int, Optional[int], Optional[int]]:
     """
-    检查教室时间冲突
+    排课在唯一键 uk_time_classroom 上的取值，起止时间统一为当天分钟数
     """
-    print(f"检查教室时间冲突: 教室ID={classroom_id}, 星期={day_of_week}, 时间={start_time}-{end_time}, 周数={weeks}")
-    
-    # 查询同一教室、同一天的所有排课
-    query = db.query(Schedule).filter(
-        Schedule.classroom_id == classroom_id,
-        Schedule.day_of_week == day_of_week
+    return (
+        row.classroom_id,
+        row.day_of_week,
+        resolve_minutes(row.start_minutes, row.start_time),
+        resolve_minutes(row.end_minutes, row.end_time),
     )
-    
-    # 如果是更新排课，排除自身
-    if schedule_id:
-        query = query.filter(Schedule.schedule_id != schedule_id)
-        print(f"排除当前排课ID: {schedule_id}")
-    
-    existing_schedules = query.all()
-    print(f"找到 {len(existing_schedules)} 条相同教室相同天的排课")
-    
-    # 如果没有现有排课，则不会有冲突
-    if not existing_schedules:
-        print("没有找到现有排课，不存在冲突")
-        return False
-    
-    # 将传入的时间转换为分钟数
+
+
+@router.post("/batch", response_model=APIResponse)
+async def batch_create_schedules(
+    request: Request,
+    allow_partial: bool = Query(False, description="是否允许只导入校验通过的行"),
+    db: Session = Depends(get_db),
+    _: Any = Depends(deps.check_permissions(["SCHEDULE_MANAGE"])),
+) -> Any:
+    """
+    批量导入排课
+    支持JSON数组（或 {"schedules": [...]}）、text/csv 请求体以及 multipart 上传的CSV文件
+    """
     try:
-        start_hour, start_minute = map(int, start_time.split(':'))
-        end_hour, end_minute = map(int, end_time.split(':'))
+        content_type = request.headers.get("content-type", "")
+        if content_type.startswith("multipart/form-data"):
+            form = await request.form()
+            upload = form.get("file")
+            if upload is None or not hasattr(upload, "read"):
+                raise HTTPException(status_code=400, detail="缺少上传文件: file")
+            rows = parse_schedule_csv(await upload.read())
+        elif content_type.startswith("text/csv"):
+            rows = parse_schedule_csv(await request.body())
+        else:
+            try:
+                payload = await request.json()
+            except ValueError:
+                raise HTTPException(status_code=400, detail="请求体不是有效的JSON")
+            rows = payload.get("schedules") if isinstance(payload, dict) else payload
+            if not isinstance(rows, list):
+                raise HTTPException(status_code=400, detail="请求体应为排课数组")
         
-        new_start_minutes = start_hour * 60 + start_minute
-        new_end_minutes = end_hour * 60 + end_minute
+        if not rows:
+            raise HTTPException(status_code=400, detail="没有需要导入的排课")
+        if len(rows) > MAX_BATCH_SCHEDULE_ROWS:
+            raise HTTPException(status_code=400, detail=f"单次最多导入{MAX_BATCH_SCHEDULE_ROWS}条排课")
         
-        print(f"新排课时间: {start_time}({new_start_minutes}分钟) - {end_time}({new_end_minutes}分钟)")
+        report = await run_in_threadpool(import_schedule_batch, db, rows, allow_partial)
         
-        # 检查时间是否有效
-        if new_start_minutes >= new_end_minutes:
-            print(f"警告: 开始时间不早于结束时间，可能导致冲突判断不准确")
+        if report["created"]:
+            message = f"导入完成，成功{report['created']}条，失败{report['failed']}条"
+        else:
+            message = f"导入失败，{report['failed']}条记录存在错误，未导入任何排课"
+        return APIResponse(
+            code=0,
+            message=message,
+            data=report
+        )
+    except HTTPException as http_exc:
+        raise http_exc
     except Exception as e:
-        print(f"时间格式解析错误: {e}")
-        return True  # 出错时保守地返回有冲突
+        error_msg = f"批量导入排课失败: {str(e)}\n{traceback.format_exc()}"
+        print(error_msg)
+        raise HTTPException(status_code=500, detail=f"批量导入排课失败: {str(e)}")
+
+
+def parse_schedule_csv(content: bytes) -> List[Dict[str, Any]]:
+    """
+    解析排课CSV，首行为表头，列名与JSON字段一致
+    """
+    try:
+        text_content = content.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="CSV文件需使用UTF-8编码")
     
-    # 解析周数
-    new_weeks_set = parse_weeks(weeks)
-    if not new_weeks_set:
-        print("新排课的周数为空，不会有冲突")
-        return False
+    reader = csv.DictReader(io.StringIO(text_content))
+    missing = [field for field in SCHEDULE_IMPORT_FIELDS if field not in (reader.fieldnames or [])]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"CSV缺少列: {', '.join(missing)}")
+    return [dict(row) for row in reader]
+
+
+def import_schedule_batch(db: Session, rows: List[Dict[str, Any]], allow_partial: bool = False) -> Dict[str, Any]:
+    """
+    校验并批量写入排课，返回逐行结果
+    开课和教室各用一次IN查询校验，与已有排课及批次内部的冲突均在内存中检测
+    """
+    results = []
+    candidates = []
     
-    # 检查每个现有排课是否与新排课时间重叠
-    for i, schedule in enumerate(existing_schedules):
-        print(f"\n检查排课 {i+1}/{len(existing_schedules)} [ID:{schedule.schedule_id}]:")
-        
-        # 解析现有排课的周数
-        existing_weeks = schedule.weeks or ""
-        print(f"  现有排课周数: {existing_weeks}")
-        existing_weeks_set = parse_weeks(existing_weeks)
+    # 1. 逐行校验字段
+    for row_no, raw in enumerate(rows, start=1):
+        result = {"row": row_no, "status": "error", "errors": []}
+        results.append(result)
+        if not isinstance(raw, dict):
+            result["errors"].append("行数据格式错误")
+            continue
         
-        if not existing_weeks_set:
-            print("  现有排课的周数为空，跳过")
+        missing = [field for field in SCHEDULE_IMPORT_FIELDS if raw.get(field) in (None, "")]
+        if missing:
+            result["errors"].append(f"缺少参数: {', '.join(missing)}")
             continue
         
-        # 检查是否有周数重叠
-        weeks_overlap = not new_weeks_set.isdisjoint(existing_weeks_set)
-        if not weeks_overlap:
-            print("  周数不重叠，不存在冲突")
+        try:
+            offering_id = int(raw["offering_id"])
+            classroom_id = int(raw["classroom_id"])
+            day_of_week = int(raw["day_of_week"])
+        except (TypeError, ValueError):
+            result["errors"].append("offering_id、classroom_id、day_of_week 必须为整数")
+            continue
+        if day_of_week < 1 or day_of_week > 7:
+            result["errors"].append("day_of_week 应为1-7")
             continue
         
-        # 打印重叠的周数
-        overlapping_weeks = new_weeks_set.intersection(existing_weeks_set)
-        print(f"  周数重叠: {sorted(overlapping_weeks)}")
+        start_time = str(raw["start_time"]).strip()
+        end_time = str(raw["end_time"]).strip()
+        try:
+            datetime.strptime(start_time, "%H:%M")
+            datetime.strptime(end_time, "%H:%M")
+        except ValueError:
+            result["errors"].append("时间格式错误，应为HH:MM")
+            continue
+        start_minutes = time_to_minutes(start_time)
+        end_minutes = time_to_minutes(end_time)
+        if start_minutes >= end_minutes:
+            result["errors"].append("开始时间必须早于结束时间")
+            continue
         
-        # 将现有排课的时间转换为分钟数
+        weeks = str(raw["weeks"]).strip()
         try:
-            s_hour, s_minute = map(int, schedule.start_time.split(':'))
-            e_hour, e_minute = map(int, schedule.end_time.split(':'))
-            
-            existing_start_minutes = s_hour * 60 + s_minute
-            existing_end_minutes = e_hour * 60 + e_minute
-            
-            print(f"  现有排课时间: {schedule.start_time}({existing_start_minutes}分钟) - {schedule.end_time}({existing_end_minutes}分钟)")
-            
-            # 检查时间段是否重叠
-            # 不重叠的条件: 新课结束时间 <= 现有课开始时间 或 新课开始时间 >= 现有课结束时间
-            # 重叠的条件: 新课结束时间 > 现有课开始时间 且 新课开始时间 < 现有课结束时间
-            time_overlap = (new_end_minutes > existing_start_minutes and new_start_minutes < existing_end_minutes)
-            
-            if time_overlap:
-                print(f"  时间重叠，存在冲突")
-                return True
-            else:
-                print(f"  时间不重叠，不存在冲突")
-        except Exception as e:
-            print(f"  时间格式解析错误: {e}")
-            return True  # 出错时保守地返回有冲突
+            weeks_mask = WeekMask.parse_strict(weeks)
+        except ValueError:
+            result["errors"].append("周数格式无效")
+            continue
+        
+        candidates.append({
+            "result": result,
+            "offering_id": offering_id,
+            "classroom_id": classroom_id,
+            "day_of_week": day_of_week,
+            "start_time": start_time,
+            "end_time": end_time,
+            "weeks": weeks_mask.to_string(),
+            "weeks_mask": int(weeks_mask),
+            "start_minutes": start_minutes,
+            "end_minutes": end_minutes
+        })
     
-    print("\n所有排课检查完毕，不存在冲突")
-    return False
-
-def check_teacher_conflicts(
-    db: Session, 
-    schedule_id: int, 
-    teacher_id: int, 
-    day_of_week: int, 
-    start_time: str, 
-    end_time: str,
-    weeks: str
-) -> bool:
-    """
-    检查教师时间冲突
-    """
-    print(f"检查教师时间冲突: 教师ID={teacher_id}, 星期={day_of_week}, 时间={start_time}-{end_time}, 周数={weeks}")
+    # 2. 一次性校验开课和教室
+    offering_ids = {c["offering_id"] for c in candidates}
+    classroom_ids = {c["classroom_id"] for c in candidates}
+    offerings = {}
+    if offering_ids:
+        offerings = {
+            row.offering_id: row
+            for row in db.query(
+                CourseOffering.offering_id, CourseOffering.teacher_id, CourseOffering.semester
+            ).filter(CourseOffering.offering_id.in_(offering_ids)).all()
+        }
+    existing_classrooms = set()
+    if classroom_ids:
+        existing_classrooms = {
+            row[0] for row in db.query(Classroom.classroom_id).filter(Classroom.classroom_id.in_(classroom_ids)).all()
+        }
     
-    # 使用SQL查询查找同一教师在同一天的所有排课
-    query = """
-    SELECT s.schedule_id, s.start_time, s.end_time, s.weeks
-    FROM schedule s
-    JOIN course_offering co ON s.offering_id = co.offering_id
-    WHERE co.teacher_id = :teacher_id AND s.day_of_week = :day_of_week
-    """
+    valid = []
+    for candidate in candidates:
+        offering = offerings.get(candidate["offering_id"])
+        if offering is None:
+            candidate["result"]["errors"].append("开课信息不存在")
+        if candidate["classroom_id"] not in existing_classrooms:
+            candidate["result"]["errors"].append("教室不存在")
+        if offering is not None and candidate["classroom_id"] in existing_classrooms:
+            candidate["semester"] = offering.semester
+            candidate["teacher_id"] = offering.teacher_id
+            valid.append(candidate)
     
-    params = {"teacher_id": teacher_id, "day_of_week": day_of_week}
+    # 3. 锁定这些教室和教师后，加载相关学期中的已有排课（加锁读，读取其他进程最新提交的数据）
+    buckets: Dict[Any, IntervalBucket] = {}
+    slot_keys: Dict[Tuple[int, int, Any, Any], int] = {}
+    if valid:
+        semesters = {c["semester"] for c in valid}
+        batch_classrooms = {c["classroom_id"] for c in valid}
+        batch_teachers = {c["teacher_id"] for c in valid if c["teacher_id"] is not None}
+        lock_schedule_resources(db, batch_classrooms, batch_teachers)
+        resource_filter = Schedule.classroom_id.in_(batch_classrooms)
+        if batch_teachers:
+            resource_filter = or_(resource_filter, CourseOffering.teacher_id.in_(batch_teachers))
+        existing_rows = db.query(
+            Schedule.schedule_id, Schedule.classroom_id, Schedule.day_of_week,
+            Schedule.start_time, Schedule.end_time, Schedule.start_minutes, Schedule.end_minutes,
+            Schedule.weeks, Schedule.weeks_mask, CourseOffering.semester, CourseOffering.teacher_id
+        ).join(
+            CourseOffering, Schedule.offering_id == CourseOffering.offering_id
+        ).filter(
+            CourseOffering.semester.in_(semesters),
+            resource_filter
+        ).with_for_update(read=True).all()
+        
+        for row in existing_rows:
+            start = resolve_minutes(row.start_minutes, row.start_time)
+            end = resolve_minutes(row.end_minutes, row.end_time)
+            if start is None or end is None:
+                start, end = 0, DAY_MINUTES
+            mask = int(WeekMask.resolve(row.weeks_mask, row.weeks))
+            keys = [(row.semester, CLASSROOM, row.classroom_id, row.day_of_week)]
+            if row.teacher_id is not None:
+                keys.append((row.semester, TEACHER, row.teacher_id, row.day_of_week))
+            for key in keys:
+                buckets.setdefault(key, IntervalBucket()).add(row.schedule_id, start, end, mask)
+        
+        # 唯一键 uk_time_classroom 不区分学期和周次，同一教室、星期、起止时间只能有一条排课
+        for row in db.query(
+            Schedule.schedule_id, Schedule.classroom_id, Schedule.day_of_week,
+            Schedule.start_time, Schedule.end_time, Schedule.start_minutes, Schedule.end_minutes
+        ).filter(
+            Schedule.classroom_id.in_(batch_classrooms)
+        ).with_for_update(read=True).all():
+            slot_keys[schedule_slot_key(row)] = row.schedule_id
     
-    # 如果是更新排课，排除自身
-    if schedule_id:
-        query += " AND s.schedule_id != :schedule_id"
-        params["schedule_id"] = schedule_id
-        print(f"排除当前排课ID: {schedule_id}")
+    # 4. 按行顺序检测冲突，先出现的行优先；批次内的行使用负数行号作为ID
+    accepted = []
+    for candidate in valid:
+        result = candidate["result"]
+        keys = [(CLASSROOM, (candidate["semester"], CLASSROOM, candidate["classroom_id"], candidate["day_of_week"]))]
+        if candidate["teacher_id"] is not None:
+            keys.append((TEACHER, (candidate["semester"], TEACHER, candidate["teacher_id"], candidate["day_of_week"])))
+        
+        conflicts = {"existing": [], "rows": []}
+        found_by_kind = []
+        slot_key = (candidate["classroom_id"], candidate["day_of_week"], candidate["start_minutes"], candidate["end_minutes"])
+        if slot_key in slot_keys:
+            found_by_kind.append((SLOT, [slot_keys[slot_key]]))
+        for kind, key in keys:
+            bucket = buckets.get(key)
+            if bucket is None:
+                continue
+            found = bucket.find(candidate["start_minutes"], candidate["end_minutes"], candidate["weeks_mask"], None)
+            if found:
+                found_by_kind.append((kind, found))
+        for kind, found in found_by_kind:
+            result["errors"].append(SCHEDULE_IMPORT_CONFLICT_MESSAGES[kind])
+            for conflict_id in found:
+                target = conflicts["existing"] if conflict_id > 0 else conflicts["rows"]
+                value = conflict_id if conflict_id > 0 else -conflict_id
+                if value not in target:
+                    target.append(value)
+        if result["errors"]:
+            result["conflicts"] = conflicts
+            continue
+        
+        slot_keys[slot_key] = -result["row"]
+        for _, key in keys:
+            buckets.setdefault(key, IntervalBucket()).add(
+                -result["row"], candidate["start_minutes"], candidate["end_minutes"], candidate["weeks_mask"]
+            )
+        accepted.append(candidate)
     
-    result = db.execute(text(query), params).fetchall()
-    print(f"找到 {len(result)} 条相同教师相同天的排课")
+    failed = sum(1 for result in results if result["errors"])
+    if not accepted or (failed and not allow_partial):
+        # 不写入时结束事务，释放第3步加的锁
+        db.rollback()
+        for candidate in accepted:
+            candidate["result"]["status"] = "skipped"
+        return {"total": len(results), "created": 0, "failed": failed, "rows": results}
     
-    # 如果没有现有排课，则不会有冲突
-    if not result:
-        print("没有找到现有排课，不存在冲突")
-        return False
+    # 5. 单事务分批写入（executemany），再按唯一键 uk_time_classroom 回查每行的自增ID；
+    #    第3、4步已保证唯一键在库中和批次内均不重复，且教室行已加锁，回查结果唯一对应本批写入的行
+    try:
+        new_rows = [
+            {field: candidate[field] for field in SCHEDULE_IMPORT_FIELDS + ["weeks_mask", "start_minutes", "end_minutes"]}
+            for candidate in accepted
+        ]
+        for start in range(0, len(new_rows), SCHEDULE_INSERT_CHUNK_SIZE):
+            db.execute(insert(Schedule), new_rows[start:start + SCHEDULE_INSERT_CHUNK_SIZE])
+        
+        inserted_ids = {}
+        for row in db.query(
+            Schedule.schedule_id, Schedule.classroom_id, Schedule.day_of_week,
+            Schedule.start_time, Schedule.end_time, Schedule.start_minutes, Schedule.end_minutes
+        ).filter(
+            Schedule.classroom_id.in_({c["classroom_id"] for c in accepted}),
+            Schedule.day_of_week.in_({c["day_of_week"] for c in accepted})
+        ).with_for_update(read=True).all():
+            inserted_ids[schedule_slot_key(row)] = row.schedule_id
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
     
-    # 将传入的时间转换为分钟数
+    for candidate in accepted:
+        result = candidate["result"]
+        result["status"] = "created"
+        result["schedule_id"] = inserted_ids.get(
+            (candidate["classroom_id"], candidate["day_of_week"], candidate["start_minutes"], candidate["end_minutes"])
+        )
+    
+    # 受影响的教室和教师重新加载冲突索引
+    schedule_index.invalidate_resources(
+        [(CLASSROOM, c["classroom_id"]) for c in accepted]
+        + [(TEACHER, c["teacher_id"]) for c in accepted if c["teacher_id"] is not None]
+    )
+    for semester in {c["semester"] for c in accepted}:
+        room_occupancy.invalidate(semester)
+    for offering_id in {c["offering_id"] for c in accepted}:
+        timetable_cache.invalidate_offering(offering_id)
+    
+    return {"total": len(results), "created": len(accepted), "failed": failed, "rows": results}
+
+
+@router.post("/solver/jobs", response_model=APIResponse)
+def create_solver_job(
+    params: Dict[str, Any],
+    db: Session = Depends(get_db),
+    _: Any = Depends(deps.check_permissions(["SCHEDULE_MANAGE"])),
+) -> Any:
+    """
+    提交自动排课任务
+    参数: semester（必填）、offering_ids（默认为该学期尚未排课的有效开课）、weeks（默认"1-16"）、days（默认周一至周五）
+    求解在后台进程中执行，结果为草稿，确认后通过提交接口写入
+    """
     try:
-        start_hour, start_minute = map(int, start_time.split(':'))
-        end_hour, end_minute = map(int, end_time.split(':'))
+        semester = params.get("semester")
+        if not semester:
+            raise HTTPException(status_code=400, detail="缺少参数: semester")
         
-        new_start_minutes = start_hour * 60 + start_minute
-        new_end_minutes = end_hour * 60 + end_minute
+        weeks = str(params.get("weeks") or "1-16")
+        try:
+            weeks_mask = WeekMask.parse_strict(weeks)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="周数格式无效")
         
-        print(f"新排课时间: {start_time}({new_start_minutes}分钟) - {end_time}({new_end_minutes}分钟)")
+        days = params.get("days") or [1, 2, 3, 4, 5]
+        try:
+            days = sorted({int(day) for day in days})
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="days 必须为1-7的整数列表")
+        if any(day < 1 or day > 7 for day in days):
+            raise HTTPException(status_code=400, detail="days 必须为1-7的整数列表")
+        
+        problem = build_solver_problem(db, semester, params.get("offering_ids"), weeks_mask, days)
+        if not problem["offerings"]:
+            raise HTTPException(status_code=400, detail="没有需要排课的开课")
+        if not problem["classrooms"]:
+            raise HTTPException(status_code=400, detail="没有可用的教室")
+        
+        job_params = {
+            "semester": semester,
+            "weeks": weeks_mask.to_string(),
+            "days": days,
+            "offerings": len(problem["offerings"]),
+            "restarts": max(1, settings.TIMETABLE_SOLVER_RESTARTS),
+        }
+        job = job_registry.submit("timetable", lambda job: run_timetable_solver(job, problem), job_params)
         
-        # 检查时间是否有效
-        if new_start_minutes >= new_end_minutes:
-            print(f"警告: 开始时间不早于结束时间，可能导致冲突判断不准确")
+        return APIResponse(
+            code=0,
+            message="排课任务已提交",
+            data=job.to_dict()
+        )
+    except HTTPException as http_exc:
+        raise http_exc
+    except Exception as e:
+        error_msg = f"提交排课任务失败: {str(e)}\n{traceback.format_exc()}"
+        print(error_msg)
+        raise HTTPException(status_code=500, detail=f"提交排课任务失败: {str(e)}")
+
+
+@router.get("/solver/jobs/{job_id}", response_model=APIResponse)
+def get_solver_job(
+    job_id: str,
+    _: Any = Depends(deps.check_permissions(["SCHEDULE_MANAGE"])),
+) -> Any:
+    """
+    查询自动排课任务进度，完成后返回排课草稿
+    """
+    job = job_registry.get(job_id)
+    if job is None or job.kind != "timetable":
+        raise HTTPException(status_code=404, detail="排课任务不存在")
+    return APIResponse(
+        code=0,
+        message="获取排课任务成功",
+        data=job.to_dict(include_result=job.status == SUCCEEDED)
+    )
+
+
+@router.post("/solver/jobs/{job_id}/commit", response_model=APIResponse)
+async def commit_solver_job(
+    job_id: str,
+    allow_partial: bool = Query(False, description="是否允许只导入校验通过的行"),
+    db: Session = Depends(get_db),
+    _: Any = Depends(deps.check_permissions(["SCHEDULE_MANAGE"])),
+) -> Any:
+    """
+    将排课草稿写入数据库，写入前按批量导入的规则重新检测冲突
+    """
+    try:
+        job = job_registry.get(job_id)
+        if job is None or job.kind != "timetable":
+            raise HTTPException(status_code=404, detail="排课任务不存在")
+        if job.status != SUCCEEDED:
+            raise HTTPException(status_code=400, detail="排课任务尚未完成")
+        if job.extra.get("committed"):
+            raise HTTPException(status_code=400, detail="该排课草稿已提交")
+        
+        rows = [
+            {field: item[field] for field in SCHEDULE_IMPORT_FIELDS}
+            for item in job.result["assignments"]
+        ]
+        if not rows:
+            raise HTTPException(status_code=400, detail="排课草稿为空")
+        
+        report = await run_in_threadpool(import_schedule_batch, db, rows, allow_partial)
+        if report["created"]:
+            job.extra["committed"] = True
+            message = f"排课草稿已提交，成功{report['created']}条，失败{report['failed']}条"
+        else:
+            message = f"提交失败，{report['failed']}条记录存在错误，未写入任何排课"
+        return APIResponse(
+            code=0,
+            message=message,
+            data=report
+        )
+    except HTTPException as http_exc:
+        raise http_exc
     except Exception as e:
-        print(f"时间格式解析错误: {e}")
-        return True  # 出错时保守地返回有冲突
+        error_msg = f"提交排课草稿失败: {str(e)}\n{traceback.format_exc()}"
+        print(error_msg)
+        raise HTTPException(status_code=500, detail=f"提交排课草稿失败: {str(e)}")
+
+
+def build_solver_problem(
+    db: Session,
+    semester: str,
+    offering_ids: Optional[List[Any]],
+    weeks_mask: WeekMask,
+    days: List[int],
+) -> Dict[str, Any]:
+    """
+    从开课、课程、教室和已有排课构造求解器输入
+    本学期已有排课作为教室和教师的占用时间，其他学期占用同一教室同一节次的排课也视为占用
+    """
+    slots = []
+    for day in days:
+        for slot in settings.TIMETABLE_SLOTS:
+            start, end = parse_slot(slot)
+            slots.append((day, start, end))
     
-    # 解析周数
-    new_weeks_set = parse_weeks(weeks)
-    if not new_weeks_set:
-        print("新排课的周数为空，不会有冲突")
-        return False
+    query = db.query(
+        CourseOffering.offering_id, CourseOffering.teacher_id, CourseOffering.max_students,
+        Course.course_name, Course.hours
+    ).join(
+        Course, CourseOffering.course_id == Course.course_id
+    ).filter(
+        CourseOffering.semester == semester,
+        CourseOffering.status == True
+    )
+    if offering_ids:
+        query = query.filter(CourseOffering.offering_id.in_([int(i) for i in offering_ids]))
+    else:
+        scheduled = db.query(Schedule.offering_id).filter(Schedule.offering_id.isnot(None)).distinct()
+        query = query.filter(CourseOffering.offering_id.notin_(scheduled))
     
-    # 检查每个现有排课是否与新排课时间重叠
-    for i, row in enumerate(result):
-        schedule_id = row[0]
-        existing_start_time = row[1]
-        existing_end_time = row[2]
-        existing_weeks = row[3] or ""
-        
-        print(f"\n检查排课 {i+1}/{len(result)} [ID:{schedule_id}]:")
-        print(f"  现有排课周数: {existing_weeks}")
-        
-        # 解析现有排课的周数
-        existing_weeks_set = parse_weeks(existing_weeks)
-        
-        if not existing_weeks_set:
-            print("  现有排课的周数为空，跳过")
-            continue
-        
-        # 检查是否有周数重叠
-        weeks_overlap = not new_weeks_set.isdisjoint(existing_weeks_set)
-        if not weeks_overlap:
-            print("  周数不重叠，不存在冲突")
-            continue
-        
-        # 打印重叠的周数
-        overlapping_weeks = new_weeks_set.intersection(existing_weeks_set)
-        print(f"  周数重叠: {sorted(overlapping_weeks)}")
-        
-        # 将现有排课的时间转换为分钟数
-        try:
-            s_hour, s_minute = map(int, existing_start_time.split(':'))
-            e_hour, e_minute = map(int, existing_end_time.split(':'))
-            
-            existing_start_minutes = s_hour * 60 + s_minute
-            existing_end_minutes = e_hour * 60 + e_minute
-            
-            print(f"  现有排课时间: {existing_start_time}({existing_start_minutes}分钟) - {existing_end_time}({existing_end_minutes}分钟)")
-            
-            # 检查时间段是否重叠
-            # 不重叠的条件: 新课结束时间 <= 现有课开始时间 或 新课开始时间 >= 现有课结束时间
-            # 重叠的条件: 新课结束时间 > 现有课开始时间 且 新课开始时间 < 现有课结束时间
-            time_overlap = (new_end_minutes > existing_start_minutes and new_start_minutes < existing_end_minutes)
-            
-            if time_overlap:
-                print(f"  时间重叠，存在冲突")
-                return True
-            else:
-                print(f"  时间不重叠，不存在冲突")
-        except Exception as e:
-            print(f"  时间格式解析错误: {e}")
-            return True  # 出错时保守地返回有冲突
+    weeks_count = len(weeks_mask.weeks())
+    offerings = [
+        {
+            "offering_id": row.offering_id,
+            "course_name": row.course_name,
+            "teacher_id": row.teacher_id,
+            "size": row.max_students or 0,
+            "sessions": sessions_per_week(row.hours, weeks_count),
+            "weeks_mask": int(weeks_mask),
+        }
+        for row in query.all()
+    ]
+    
+    classrooms = [
+        {"classroom_id": row.classroom_id, "capacity": row.capacity, "room_type": row.room_type}
+        for row in db.query(
+            Classroom.classroom_id, Classroom.capacity, Classroom.room_type
+        ).filter(Classroom.status == 1).all()
+    ]
+    
+    busy = []
+    existing = db.query(
+        Schedule.classroom_id, Schedule.day_of_week, Schedule.start_time, Schedule.end_time,
+        Schedule.start_minutes, Schedule.end_minutes, Schedule.weeks, Schedule.weeks_mask,
+        CourseOffering.teacher_id
+    ).join(
+        CourseOffering, Schedule.offering_id == CourseOffering.offering_id
+    ).filter(CourseOffering.semester == semester).all()
+    for row in existing:
+        start = resolve_minutes(row.start_minutes, row.start_time)
+        end = resolve_minutes(row.end_minutes, row.end_time)
+        if start is None or end is None:
+            start, end = 0, DAY_MINUTES
+        mask = int(WeekMask.resolve(row.weeks_mask, row.weeks))
+        if row.classroom_id is not None:
+            busy.append((CLASSROOM, row.classroom_id, row.day_of_week, start, end, mask))
+        if row.teacher_id is not None:
+            busy.append((TEACHER, row.teacher_id, row.day_of_week, start, end, mask))
     
-    print("\n所有排课检查完毕，不存在冲突")
-    return False
+    # 唯一键 uk_time_classroom 不区分学期和周次：任何学期的排课只要与候选节次的教室、星期、起止时间完全相同，
+    # 该教室该节次在所有周次上都不可用
+    slot_set = set(slots)
+    for row in db.query(
+        Schedule.classroom_id, Schedule.day_of_week, Schedule.start_time, Schedule.end_time,
+        Schedule.start_minutes, Schedule.end_minutes
+    ).filter(
+        Schedule.classroom_id.isnot(None),
+        Schedule.day_of_week.in_(days)
+    ).all():
+        classroom_id, day, start, end = schedule_slot_key(row)
+        if (day, start, end) in slot_set:
+            busy.append((CLASSROOM, classroom_id, day, start, end, int(weeks_mask)))
+    
+    return {"slots": slots, "offerings": offerings, "classrooms": classrooms, "busy": busy}
+
 
-def parse_weeks(weeks_str: str) -> set:
+def run_timetable_solver(job: Job, problem: Dict[str, Any]) -> Dict[str, Any]:
     """
-    解析周数字符串，返回包含所有周数的集合
-    例如: "1-3,5,7-9" 会返回 {1, 2, 3, 5, 7, 8, 9}
+    在计算进程池中并行执行多次随机重启，取未排课次最少、代价最低的结果作为草稿
     """
-    weeks_set = set()
-    
-    if not weeks_str:
-        print(f"警告: 周数字符串为空，返回空集合")
-        return weeks_set
+    restarts = max(1, settings.TIMETABLE_SOLVER_RESTARTS)
+    pool = get_process_pool()
+    futures = [pool.submit(solve_timetable, problem, seed) for seed in range(restarts)]
     
-    print(f"解析周数字符串: {weeks_str}")
+    best = None
+    for done, future in enumerate(as_completed(futures), start=1):
+        result = future.result()
+        if best is None or (len(result["unassigned"]), result["cost"]) < (len(best["unassigned"]), best["cost"]):
+            best = result
+        job.update(progress=done / restarts, message=f"已完成{done}/{restarts}次求解")
     
-    try:
-        parts = weeks_str.split(',')
-        
-        for part in parts:
-            part = part.strip()
-            if not part:
-                continue
-                
-            if '-' in part:
-                try:
-                    start_str, end_str = part.split('-')
-                    start = int(start_str.strip())
-                    end = int(end_str.strip())
-                    
-                    # 确保开始周不大于结束周
-                    if start > end:
-                        print(f"警告: 周数范围错误 {start}-{end}，自动交换")
-                        start, end = end, start
-                        
-                    # 限制最大周数范围，防止过大的范围
-                    if end - start > 30:
-                        print(f"警告: 周数范围过大 {start}-{end}，限制为最多30周")
-                        end = start + 30
-                        
-                    weeks_set.update(range(start, end + 1))
-                except ValueError as e:
-                    print(f"错误: 无法解析周数范围 '{part}': {e}")
-            else:
-                try:
-                    week = int(part)
-                    weeks_set.add(week)
-                except ValueError as e:
-                    print(f"错误: 无法解析单周 '{part}': {e}")
-    except Exception as e:
-        print(f"解析周数字符串时出现异常: {e}")
-        # 发生异常时返回默认的1-16周，以便继续运行
-        return set(range(1, 17))
+    offerings = {offering["offering_id"]: offering for offering in problem["offerings"]}
+    assignments = []
+    for item in best["assignments"]:
+        offering = offerings[item["offering_id"]]
+        day, start, end = problem["slots"][item["slot_index"]]
+        assignments.append({
+            "offering_id": item["offering_id"],
+            "course_name": offering["course_name"],
+            "teacher_id": offering["teacher_id"],
+            "classroom_id": item["classroom_id"],
+            "day_of_week": day,
+            "start_time": f"{start // 60:02d}:{start % 60:02d}",
+            "end_time": f"{end // 60:02d}:{end % 60:02d}",
+            "weeks": WeekMask(offering["weeks_mask"]).to_string(),
+        })
     
-    print(f"解析结果: {sorted(weeks_set)}")
-    return weeks_set
\ No newline at end of file
+    return {
+        "seed": best["seed"],
+        "cost": best["cost"],
+        "total_sessions": sum(offering["sessions"] for offering in problem["offerings"]),
+        "assigned_sessions": len(assignments),
+        "assignments": assignments,
+        "unassigned": best["unassigned"],
+    }
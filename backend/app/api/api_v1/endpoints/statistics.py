@@ -1,17 +1,20 @@
 from typing import Any
 import traceback
 
-from fastapi import APIRouter, Depends, HTTPException
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy import func
 from sqlalchemy.orm import Session
 
 from app.api import deps
+from app.core.grade_analytics import grouped_distributions, score_distribution
+from app.core.grade_summary import get_student_summary
 from app.db.database import get_db
 from app.models.user import User
 from app.models.student import Student
 from app.models.teacher import Teacher
 from app.models.course import Course, CourseOffering
-from app.models.enrollment import Enrollment
+from app.models.enrollment import Enrollment, Grade
 from app.schemas.common import APIResponse
 
 router = APIRouter()
@@ -138,12 +141,13 @@ def get_dashboard_stats(
                     Enrollment.status == 1
                 ).scalar() or 0
                 
-                # 计算总学分
-                completed_credits = 0  # 这里需要根据实际数据模型计算已修学分
+                # 已修学分与GPA读取增量维护的汇总
+                summary = get_student_summary(db, student.student_id)
                 
                 stats = {
                     "myCourseCount": course_count,
-                    "myCredits": completed_credits
+                    "myCredits": summary["credits_earned"],
+                    "myGpa": summary["gpa"]
                 }
         
         return APIResponse(
@@ -158,4 +162,88 @@ def get_dashboard_stats(
             code=500,
             message=f"获取仪表盘统计数据失败: {str(e)}",
             data=None
-        ) 
\ No newline at end of file
+        ) 
+
+# 成绩分布的分组方式及对应的分组列
+GRADE_DISTRIBUTION_GROUPS = {
+    "offering": CourseOffering.offering_id,
+    "course": CourseOffering.course_id,
+    "teacher": CourseOffering.teacher_id,
+    "department": Course.dept_id,
+}
+
+
+@router.get("/grade-distribution", response_model=APIResponse)
+def get_grade_distribution(
+    db: Session = Depends(get_db),
+    offering_id: int = None,
+    course_id: int = None,
+    teacher_id: int = None,
+    dept_id: int = None,
+    class_name: str = None,
+    semester: str = None,
+    group_by: str = Query(None, description="分组方式: offering、course、teacher 或 department"),
+    bin_width: int = Query(10, ge=1, le=50, description="直方图区间宽度"),
+    _: Any = Depends(deps.check_permissions(["GRADE_VIEW", "GRADE_MANAGE"])),
+) -> Any:
+    """
+    获取成绩分布统计
+    按开课、课程、教师、院系（课程所属院系）、班级和学期筛选，返回直方图、均值、中位数、标准差、及格率和成绩等级分布；
+    指定 group_by 时同时返回每组的统计
+    """
+    try:
+        if group_by and group_by not in GRADE_DISTRIBUTION_GROUPS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"分组方式必须是以下之一: {', '.join(GRADE_DISTRIBUTION_GROUPS)}"
+            )
+        
+        # 一次按列取出最终成绩及分组键
+        columns = [Grade.final_score]
+        if group_by:
+            columns.append(GRADE_DISTRIBUTION_GROUPS[group_by])
+        query = db.query(*columns).join(
+            Enrollment, Grade.enrollment_id == Enrollment.enrollment_id
+        ).join(
+            CourseOffering, Enrollment.offering_id == CourseOffering.offering_id
+        ).filter(
+            Enrollment.status == True,
+            Grade.final_score.isnot(None)
+        )
+        if group_by == "department" or dept_id:
+            query = query.join(Course, CourseOffering.course_id == Course.course_id)
+        if class_name:
+            query = query.join(Student, Enrollment.student_id == Student.student_id).filter(Student.class_name == class_name)
+        if offering_id:
+            query = query.filter(CourseOffering.offering_id == offering_id)
+        if course_id:
+            query = query.filter(CourseOffering.course_id == course_id)
+        if teacher_id:
+            query = query.filter(CourseOffering.teacher_id == teacher_id)
+        if dept_id:
+            query = query.filter(Course.dept_id == dept_id)
+        if semester:
+            query = query.filter(CourseOffering.semester == semester)
+        
+        rows = query.all()
+        scores = np.asarray([float(row[0]) for row in rows], dtype=np.float64)
+        stats = score_distribution(scores, bin_width)
+        if group_by:
+            # 分组键为空（如课程未设置院系）的成绩只计入总体统计
+            keyed = [(row[1], float(row[0])) for row in rows if row[1] is not None]
+            stats["groups"] = grouped_distributions(
+                [key for key, _ in keyed], [score for _, score in keyed], bin_width
+            )
+            stats["group_by"] = group_by
+        
+        return APIResponse(
+            code=0,
+            message="获取成功",
+            data=stats
+        )
+    except HTTPException as http_exc:
+        raise http_exc
+    except Exception as e:
+        error_msg = f"获取成绩分布统计失败: {str(e)}\n{traceback.format_exc()}"
+        print(error_msg)
+        raise HTTPException(status_code=500, detail=f"获取成绩分布统计失败: {str(e)}")
@@ -2,10 +2,15 @@ from typing import Any, List
 from sqlalchemy import text, func
 
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session, joinedload
 
 from app.api import deps
-from app.db.database import get_db
+from app.core.grade_summary import get_student_summary, rebuild_grade_summaries
+from app.core.jobs import SUCCEEDED, Job, job_registry
+from app.core.ranking import RANK_MODES, RANK_STANDARD, ranking_cache
+from app.core.transcript_export import group_transcripts, render_csv, render_pdf, transcript_rows
+from app.db.database import SessionLocal, get_db
 from app.models.student import Student
 from app.models.user import User
 from app.models.department import Department
@@ -20,6 +25,12 @@ import traceback
 
 router = APIRouter()
 
+# 成绩单导出格式及对应的响应类型与生成函数
+EXPORT_RENDERERS = {
+    "csv": ("text/csv", render_csv),
+    "pdf": ("application/pdf", render_pdf),
+}
+
 
 @router.get("", response_model=APIResponse)
 def list_students(
@@ -199,6 +210,145 @@ def create_student(
     )
 
 
+@router.get("/rankings", response_model=APIResponse)
+def get_student_rankings(
+    db: Session = Depends(get_db),
+    page: int = Query(1, ge=1),
+    pageSize: int = Query(20, ge=1, le=100, alias="page_size"),
+    dept_id: int = None,
+    class_name: str = None,
+    grade: int = None,
+    semester: str = None,
+    mode: str = Query(RANK_STANDARD, description="排名方式: standard 或 dense"),
+    _: Any = Depends(deps.check_permissions(["STUDENT_VIEW"])),
+) -> Any:
+    """
+    获取学生GPA排名
+    按院系、班级、年级筛选出的学生群体内排名，指定学期时按该学期GPA排名，只包含已有成绩的学生
+    """
+    try:
+        if mode not in RANK_MODES:
+            raise HTTPException(status_code=400, detail=f"排名方式必须是以下之一: {', '.join(RANK_MODES)}")
+        
+        snapshot = ranking_cache.get(db, semester)
+        ranking = snapshot.rank(dept_id, class_name, grade, mode)
+        
+        total = len(ranking["index"])
+        start = (page - 1) * pageSize
+        rows = []
+        for position in range(start, min(start + pageSize, total)):
+            i = ranking["index"][position]
+            rows.append({
+                "rank": int(ranking["rank"][position]),
+                "percentile": float(ranking["percentile"][position]),
+                "student_id": int(snapshot.student_id[i]),
+                "student_no": snapshot.student_no[i],
+                "student_name": snapshot.student_name[i],
+                "dept_id": int(snapshot.dept_id[i]) if snapshot.dept_id[i] >= 0 else None,
+                "class_name": snapshot.class_name[i],
+                "grade": int(snapshot.grade[i]) if snapshot.grade[i] >= 0 else None,
+                "gpa": float(snapshot.gpa[i]),
+                "credits_attempted": float(snapshot.credits_attempted[i]),
+                "credits_earned": float(snapshot.credits_earned[i])
+            })
+        
+        return APIResponse(
+            code=0,
+            message="获取成功",
+            data=PaginatedResponse(
+                list=rows,
+                total=total,
+                page=page,
+                pageSize=pageSize,
+                totalPages=(total + pageSize - 1) // pageSize
+            )
+        )
+    except HTTPException as http_exc:
+        raise http_exc
+    except Exception as e:
+        error_msg = f"获取学生排名失败: {str(e)}\n{traceback.format_exc()}"
+        print(error_msg)
+        raise HTTPException(status_code=500, detail=f"获取学生排名失败: {str(e)}")
+
+
+@router.get("/transcripts/export")
+def export_transcripts(
+    dept_id: int = None,
+    class_name: str = None,
+    grade: int = None,
+    format: str = Query("csv", description="导出格式: csv 或 pdf"),
+    _: Any = Depends(deps.check_permissions(["STUDENT_VIEW"])),
+) -> Any:
+    """
+    批量导出成绩单
+    按院系、班级、年级筛选学生，单次有序查询后逐个学生生成并流式输出
+    """
+    if format not in EXPORT_RENDERERS:
+        raise HTTPException(status_code=400, detail=f"导出格式必须是以下之一: {', '.join(EXPORT_RENDERERS)}")
+    media_type, render = EXPORT_RENDERERS[format]
+
+    def generate():
+        # 响应在接口返回后才开始输出，使用独立会话并在输出结束时关闭
+        db = SessionLocal()
+        try:
+            yield from render(group_transcripts(transcript_rows(db, dept_id, class_name, grade)))
+        except Exception as e:
+            print(f"导出成绩单失败: {str(e)}\n{traceback.format_exc()}")
+            raise
+        finally:
+            db.close()
+
+    return StreamingResponse(
+        generate(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="transcripts.{format}"'}
+    )
+
+
+@router.post("/grade-summaries/rebuild", response_model=APIResponse)
+def rebuild_grade_summary_job(
+    _: Any = Depends(deps.check_permissions(["GRADE_MANAGE"])),
+) -> Any:
+    """
+    提交学分与GPA汇总重建任务，按成绩记录重新统计全部学生
+    """
+    job = job_registry.submit("grade_summary_rebuild", run_grade_summary_rebuild, {})
+    return APIResponse(
+        code=0,
+        message="重建任务已提交",
+        data=job.to_dict()
+    )
+
+
+@router.get("/grade-summaries/jobs/{job_id}", response_model=APIResponse)
+def get_grade_summary_rebuild_job(
+    job_id: str,
+    _: Any = Depends(deps.check_permissions(["GRADE_MANAGE"])),
+) -> Any:
+    """
+    查询学分与GPA汇总重建任务
+    """
+    job = job_registry.get(job_id)
+    if job is None or job.kind != "grade_summary_rebuild":
+        raise HTTPException(status_code=404, detail="重建任务不存在")
+    return APIResponse(
+        code=0,
+        message="获取重建任务成功",
+        data=job.to_dict(include_result=job.status == SUCCEEDED)
+    )
+
+
+def run_grade_summary_rebuild(job: Job) -> Any:
+    db = SessionLocal()
+    try:
+        result = rebuild_grade_summaries(db, progress=lambda value: job.update(progress=value))
+    finally:
+        db.close()
+    ranking_cache.invalidate()
+    job.update(message=f"已重建{result['students']}名学生的汇总")
+    return result
+
+
 @router.get("/{student_id}", response_model=APIResponse)
 def get_student(
     student_id: int,
@@ -688,7 +838,7 @@ def get_student_transcript(
     JOIN grade g ON e.enrollment_id = g.enrollment_id
     JOIN course_offering co ON e.offering_id = co.offering_id
     JOIN course c ON co.course_id = c.course_id
-    WHERE s.student_id = :student_id
+    WHERE s.student_id = :student_id AND e.status = 1 AND g.grade_point IS NOT NULL
     """
     
     params = {"student_id": student_id}
@@ -701,18 +851,11 @@ def get_student_transcript(
     
     result = db.execute(text(query), params).fetchall()
     
-    # 计算总学分和GPA
-    total_credits = 0
-    total_grade_points = 0
-    
     courses = []
     for row in result:
         course_credit = float(row[2])
         grade_point = float(row[5])
         
-        total_credits += course_credit
-        total_grade_points += course_credit * grade_point
-        
         course = {
             "course_code": row[0],
             "course_name": row[1],
@@ -724,16 +867,14 @@ def get_student_transcript(
         }
         courses.append(TranscriptItem(**course))
     
-    # 计算GPA
-    gpa = 0
-    if total_credits > 0:
-        gpa = round(total_grade_points / total_credits, 2)
+    # 总学分和GPA读取增量维护的汇总
+    summary = get_student_summary(db, student_id, semester)
     
     transcript = StudentTranscript(
         student_no=student.student_no,
         student_name=user.real_name,
-        total_credits=total_credits,
-        gpa=gpa,
+        total_credits=summary["credits_attempted"],
+        gpa=summary["gpa"],
         courses=courses
     )
     
@@ -748,6 +889,7 @@ def get_student_transcript(
 def get_student_gpa(
     student_id: int,
     db: Session = Depends(get_db),
+    semester: str = None,
     _: Any = Depends(deps.check_permissions(["STUDENT_VIEW", "MY_GRADE_VIEW"])),
 ) -> Any:
     """
@@ -761,31 +903,13 @@ def get_student_gpa(
             detail="学生不存在"
         )
     
-    # 计算GPA
-    query = """
-    SELECT 
-        SUM(c.credits * g.grade_point) as total_points,
-        SUM(c.credits) as total_credits
-    FROM student s
-    JOIN enrollment e ON s.student_id = e.student_id
-    JOIN grade g ON e.enrollment_id = g.enrollment_id
-    JOIN course_offering co ON e.offering_id = co.offering_id
-    JOIN course c ON co.course_id = c.course_id
-    WHERE s.student_id = :student_id
-    """
-    
-    params = {"student_id": student_id}
-    result = db.execute(text(query), params).first()
-    
-    if result and result[1]:
-        gpa = round(float(result[0]) / float(result[1]), 2)
-    else:
-        gpa = 0
+    # 读取增量维护的学分与GPA汇总，指定学期时返回该学期的汇总
+    summary = get_student_summary(db, student_id, semester)
     
     return APIResponse(
         code=0,
         message="获取成功",
-        data={"gpa": gpa}
+        data=summary
     ) 
 
 
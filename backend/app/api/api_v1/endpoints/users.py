@@ -7,6 +7,7 @@ from sqlalchemy.exc import SQLAlchemyError
 
 from app.api import deps
 from app.core import security
+from app.core.permission_cache import permission_cache
 from app.db.database import get_db
 from app.models.user import User
 from app.models.role import Role, user_role
@@ -322,6 +323,7 @@ def update_user(
         
         db.commit()
         db.refresh(user)
+        permission_cache.invalidate_user(user_id)
         
         # 构建响应
         user_response = UserResponse(
@@ -371,6 +373,7 @@ def delete_user(
     
     db.delete(user)
     db.commit()
+    permission_cache.invalidate_user(user_id)
     
     return APIResponse(
         code=0,
@@ -389,6 +392,7 @@ def batch_delete_users(
     """
     db.query(User).filter(User.user_id.in_(request.ids)).delete(synchronize_session=False)
     db.commit()
+    permission_cache.invalidate_user(*request.ids)
     
     return APIResponse(
         code=0,
@@ -415,6 +419,7 @@ def reset_password(
     
     user.password = security.get_password_hash(password_in.new_password)
     db.commit()
+    permission_cache.invalidate_user(user_id)
     
     return APIResponse(
         code=0,
@@ -440,6 +445,7 @@ def toggle_user_status(
     
     user.status = not user.status
     db.commit()
+    permission_cache.invalidate_user(user_id)
     
     return APIResponse(
         code=0,
@@ -473,6 +479,7 @@ def assign_roles(
         user.roles = roles
         db.commit()
         db.refresh(user)
+        permission_cache.invalidate_user(user_id)
         
         # 处理角色信息 - 只包含启用状态的角色
         roles_data = []
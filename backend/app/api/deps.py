@@ -9,11 +9,13 @@
 """
 
 import traceback
-from typing import Generator, Optional
+from typing import Any, Dict, Generator, Optional
 
 from app.core.config import settings
+from app.core.permission_claims import permissions_from_claims
+from app.core.permission_cache import PermissionSet, permission_cache, permission_versions
+from app.core.token_cache import token_cache
 from app.db.database import get_db
-from app.models.role import Permission, Role
 from app.models.user import User
 from app.schemas.user import UserDetail
 from fastapi import Depends, Header, HTTPException, Request, status
@@ -25,41 +27,86 @@ from sqlalchemy.orm import Session, joinedload
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login")
 
 
-def get_current_user(
-    db: Session = Depends(get_db),
+# 可以按令牌中的权限声明鉴权的请求方法
+CLAIMS_METHODS = ("GET", "HEAD")
+
+
+def credentials_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="无法验证凭据",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+def get_bearer_token(
     token: str = Depends(oauth2_scheme),
     authorization: str = Header(None),
-) -> User:
+) -> str:
     """
-    从JWT令牌获取当前用户
+    取出请求中的Bearer令牌
     """
+    # 如果oauth2_scheme没有提供token，则尝试从header中获取
+    if (
+        token == "undefined"
+        and authorization
+        and authorization.startswith("Bearer ")
+    ):
+        token = authorization.replace("Bearer ", "")
+
+    if not token or token == "undefined":
+        raise credentials_exception()
+    return token
+
+
+def get_token_payload(
+    token: str = Depends(get_bearer_token),
+) -> Dict[str, Any]:
+    """
+    校验并解码JWT令牌，不访问数据库；已验证且未过期的令牌直接取缓存的声明
+    """
+    payload = token_cache.get_payload(token)
+    if payload is not None:
+        return payload
+
     try:
-        credentials_exception = HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="无法验证凭据",
-            headers={"WWW-Authenticate": "Bearer"},
+        payload = jwt.decode(
+            token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
         )
+        if payload.get("sub") is None:
+            raise credentials_exception()
+        int(payload["sub"])
+    except (JWTError, ValidationError, ValueError):
+        raise credentials_exception()
+    token_cache.put_payload(token, payload)
+    return payload
+
+
+def get_token_user_id(
+    payload: Dict[str, Any] = Depends(get_token_payload),
+) -> int:
+    """
+    从JWT令牌解析用户ID，不访问数据库
+    """
+    return int(payload["sub"])
 
-        # 如果oauth2_scheme没有提供token，则尝试从header中获取
-        if (
-            token == "undefined"
-            and authorization
-            and authorization.startswith("Bearer ")
-        ):
-            token = authorization.replace("Bearer ", "")
 
-        if not token or token == "undefined":
-            raise credentials_exception
+def get_current_user(
+    db: Session = Depends(get_db),
+    token: str = Depends(get_bearer_token),
+    user_id: int = Depends(get_token_user_id),
+) -> User:
+    """
+    从JWT令牌获取当前用户
 
-        try:
-            payload = jwt.decode(
-                token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
-            )
-            user_id: str = payload.get("sub")
-            if user_id is None:
-                raise credentials_exception
-        except (JWTError, ValidationError):
-            raise credentials_exception
+    同一令牌的用户快照在权限版本未变化时复用，以 merge(load=False) 放入当前会话，不查询数据库
+    """
+    try:
+        # 先读版本再查询，查询期间发生的变更会使快照立即失配
+        version = permission_versions.current(user_id)
+        snapshot = token_cache.get_user(token, user_id, version)
+        if snapshot is not None:
+            return db.merge(snapshot, load=False)
 
         # 使用joinedload预加载roles关系
         user = (
@@ -70,11 +117,18 @@ def get_current_user(
         )
 
         if user is None:
-            raise credentials_exception
+            raise credentials_exception()
         if not user.status:
             raise HTTPException(status_code=400, detail="用户已被禁用")
 
-        return user
+        # 快照与会话分离后缓存，本次请求同样使用合并到会话中的副本
+        for role in user.roles:
+            db.expunge(role)
+        db.expunge(user)
+        token_cache.put_user(token, user, version)
+        return db.merge(user, load=False)
+    except HTTPException:
+        raise
     except Exception as e:
         print(traceback.format_exc())
         raise
@@ -91,139 +145,54 @@ def get_current_active_user(
     return current_user
 
 
+def get_current_permissions(
+    request: Request,
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_token_user_id),
+    payload: Dict[str, Any] = Depends(get_token_payload),
+) -> PermissionSet:
+    """
+    获取当前用户编译后的权限集，命中缓存时不访问数据库
+
+    开启令牌权限声明时，只读请求在权限版本未变化的情况下直接使用令牌中的权限位图
+    """
+    try:
+        permissions = None
+        if request.method in CLAIMS_METHODS:
+            permissions = permissions_from_claims(db, user_id, payload)
+        if permissions is None:
+            permissions = permission_cache.get(db, user_id)
+    except Exception as e:
+        print(f"获取用户权限时出错: {str(e)}\n{traceback.format_exc()}")
+        # 返回403而不是500，对用户更友好
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="无法验证权限，请重试",
+        )
+
+    if permissions is None:
+        raise credentials_exception()
+    if not permissions.active:
+        raise HTTPException(status_code=400, detail="用户已被禁用")
+    return permissions
+
+
 def check_permissions(required_permissions: list = None, required: bool = True):
     """
-    检查用户是否具有所需权限
+    检查用户是否具有所需权限（具有其中任一权限即可）
+    required 为 False 时不抛出异常，返回是否具有权限
     """
 
     def permissions_checker(
-        db: Session = Depends(get_db),
-        current_user: Optional[User] = Depends(get_current_user),
+        permissions: PermissionSet = Depends(get_current_permissions),
     ):
-        try:
-            # 如果不需要权限，直接通过
-            if not required_permissions:
-                return True
-
-            # 确保current_user非空
-            if not current_user:
-                if required:
-                    raise HTTPException(
-                        status_code=status.HTTP_401_UNAUTHORIZED,
-                        detail="未认证用户",
-                    )
-                return False
-
-            # 超级管理员自动拥有所有权限
-            try:
-                if current_user.username == "admin":
-                    return True
-
-                if hasattr(current_user, "roles"):
-                    for role in current_user.roles:
-                        if (
-                            hasattr(role, "role_code")
-                            and hasattr(role, "status")
-                            and role.status
-                            and role.role_code == "SUPER_ADMIN"
-                        ):
-                            return True
-            except Exception as e:
-                print(f"检查超级管理员权限时出错: {str(e)}")
-                # 继续执行，不中断检查
-
-            # 为了确保权限被正确加载，在这里重新查询用户并加载完整的权限关系
-            user_with_permissions = None
-            try:
-                user_with_permissions = (
-                    db.query(User)
-                    .options(joinedload(User.roles).joinedload(Role.permissions))
-                    .filter(User.user_id == current_user.user_id)
-                    .first()
-                )
-            except Exception as e:
-                print(f"获取用户权限时出错: {str(e)}\n{traceback.format_exc()}")
-                # 如果查询失败但不要求权限，则返回False
-                if not required:
-                    return False
-
-                # 容错处理：如果无法获取权限信息，但用户已通过认证，可以选择允许访问
-                # 或者返回更友好的错误信息，而不是500错误
-                raise HTTPException(
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    detail="无法验证权限，请重试",
-                )
-
-            if not user_with_permissions:
-                if required:
-                    raise HTTPException(
-                        status_code=status.HTTP_404_NOT_FOUND,
-                        detail="用户不存在",
-                    )
-                return False
-
-            # 获取用户所有权限代码
-            user_permissions = set()
-            try:
-                if (
-                    hasattr(user_with_permissions, "roles")
-                    and user_with_permissions.roles
-                ):
-                    for role in user_with_permissions.roles:
-                        # 安全地检查role.status
-                        if not hasattr(role, "status") or not role.status:
-                            continue
-
-                        # 如果是超级管理员角色，授予所有权限
-                        if (
-                            hasattr(role, "role_code")
-                            and role.role_code == "SUPER_ADMIN"
-                        ):
-                            return True
-
-                        # 安全地检查和处理权限
-                        if hasattr(role, "permissions") and role.permissions:
-                            for permission in role.permissions:
-                                if (
-                                    hasattr(permission, "permission_code")
-                                    and hasattr(permission, "status")
-                                    and permission.status
-                                ):
-                                    user_permissions.add(permission.permission_code)
-            except Exception as e:
-                print(f"处理用户权限时出错: {str(e)}")
-                # 如果处理权限出错但不要求权限，则返回False
-                if not required:
-                    return False
-
-                # 容错处理
-                raise HTTPException(
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    detail="权限验证错误，请重试",
-                )
-
-            # 检查是否有所需权限
-            for permission in required_permissions:
-                if permission in user_permissions:
-                    return True
-
-            # 没有权限
-            if required:
-                raise HTTPException(
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    detail="权限不足",
-                )
-            return False
-        except HTTPException:
-            raise
-        except Exception as e:
-            print(f"权限检查失败: {str(e)}\n{traceback.format_exc()}")
-            if required:
-                # 返回403而不是500，对用户更友好
-                raise HTTPException(
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    detail="权限检查失败，请重试",
-                )
-            return False
+        if permissions.allows(required_permissions):
+            return True
+        if required:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="权限不足",
+            )
+        return False
 
     return permissions_checker
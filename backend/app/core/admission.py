@@ -0,0 +1,168 @@
+"""
+@fileoverview 选课准入控制
+@description 选课写操作前的进程内准入控制：按学生的令牌桶限流、按开课的有界FIFO队列，以及全局并发上限
+@author muelovo
+@version 1.0.0
+@date 2026-10-18
+@license MIT
+@copyright © 2025 muelovo. All rights reserved.
+"""
+
+import asyncio
+import math
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+
+from app.core.config import settings
+
+
+class AdmissionRejected(Exception):
+    """
+    请求未被准入，retry_after_ms 为建议的重试间隔
+    """
+
+    def __init__(self, detail: str, retry_after_ms: int):
+        super().__init__(detail)
+        self.detail = detail
+        self.retry_after_ms = max(1, int(retry_after_ms))
+
+    @property
+    def retry_after_seconds(self) -> int:
+        return max(1, math.ceil(self.retry_after_ms / 1000))
+
+
+class TokenBucket:
+    """
+    令牌桶：每秒补充 rate 个令牌，最多积攒 burst 个
+    """
+
+    __slots__ = ("rate", "burst", "tokens", "updated_at")
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+
+    def take(self, now: float) -> float:
+        """
+        取一个令牌，成功返回0，否则返回需要等待的秒数
+        """
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class _OfferingQueue:
+    """
+    单个开课的等待队列，asyncio.Lock 按到达顺序唤醒等待者
+    """
+
+    __slots__ = ("lock", "waiting")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.waiting = 0
+
+
+class AdmissionController:
+    """
+    选课准入控制
+
+    同一开课的选课请求排队串行执行，避免在开课行锁上堆积数据库连接；
+    不同开课之间并行，但同时占用数据库的请求数受全局上限约束，低于连接池大小。
+    队列已满或学生请求过于频繁时直接拒绝，并给出建议的重试间隔。
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        queue_size: int,
+        student_rate: float,
+        student_burst: int,
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.queue_size = max(1, queue_size)
+        self.student_rate = student_rate
+        self.student_burst = max(1, student_burst)
+        self._buckets: Dict[int, TokenBucket] = {}
+        self._buckets_lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queues: Dict[int, _OfferingQueue] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        # 单次选课事务耗时的指数移动平均（毫秒），用于估算重试间隔
+        self._service_ms = 50.0
+
+    def _throttle(self, student_id: int) -> None:
+        if self.student_rate <= 0:
+            return
+        now = time.monotonic()
+        with self._buckets_lock:
+            bucket = self._buckets.get(student_id)
+            if bucket is None:
+                bucket = self._buckets[student_id] = TokenBucket(self.student_rate, self.student_burst)
+            wait = bucket.take(now)
+            # 令牌已补满的桶与新建的桶等价，定期清理以免无限增长
+            if len(self._buckets) > 50000:
+                self._buckets = {
+                    sid: b for sid, b in self._buckets.items()
+                    if b.tokens + (now - b.updated_at) * b.rate < b.burst
+                }
+        if wait > 0:
+            raise AdmissionRejected("操作过于频繁，请稍后重试", wait * 1000)
+
+    def _bind_loop(self) -> None:
+        # asyncio同步原语与事件循环绑定，事件循环变化（如测试中重建）时重新创建
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._queues = {}
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    def _estimate_wait_ms(self, waiting: int) -> float:
+        return (waiting + 1) * self._service_ms
+
+    @asynccontextmanager
+    async def admit(self, student_id: int, offering_id: int) -> AsyncIterator[None]:
+        """
+        获得准入后执行选课，未准入时抛出 AdmissionRejected
+        """
+        self._throttle(student_id)
+        self._bind_loop()
+
+        queue = self._queues.get(offering_id)
+        if queue is None:
+            queue = self._queues[offering_id] = _OfferingQueue()
+        if queue.waiting >= self.queue_size:
+            raise AdmissionRejected("选课人数过多，请稍后重试", self._estimate_wait_ms(queue.waiting))
+
+        queue.waiting += 1
+        try:
+            await queue.lock.acquire()
+        finally:
+            queue.waiting -= 1
+        try:
+            async with self._semaphore:
+                started = time.monotonic()
+                try:
+                    yield
+                finally:
+                    elapsed_ms = (time.monotonic() - started) * 1000
+                    self._service_ms = self._service_ms * 0.9 + elapsed_ms * 0.1
+        finally:
+            queue.lock.release()
+            if queue.waiting == 0 and not queue.lock.locked() and self._queues.get(offering_id) is queue:
+                del self._queues[offering_id]
+
+
+enrollment_admission = AdmissionController(
+    max_concurrency=settings.ENROLLMENT_MAX_CONCURRENCY,
+    queue_size=settings.ENROLLMENT_QUEUE_SIZE,
+    student_rate=settings.ENROLLMENT_STUDENT_RATE,
+    student_burst=settings.ENROLLMENT_STUDENT_BURST,
+)
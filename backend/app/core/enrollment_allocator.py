@@ -0,0 +1,109 @@
+"""
+@fileoverview 选课志愿批量分配
+@description 对志愿分配模式的开课一次性分配名额：按志愿顺序分轮，同一轮内按抽签号或优先级排序，满员的志愿转入候补
+@author muelovo
+@version 1.0.0
+@date 2026-10-18
+@license MIT
+@copyright © 2025 muelovo. All rights reserved.
+"""
+
+from typing import Any, Dict, List, Set, Tuple
+
+import numpy as np
+
+# 分配方式
+LOTTERY = "lottery"
+PRIORITY = "priority"
+
+
+def allocation_order(
+    student_idx: np.ndarray,
+    rank: np.ndarray,
+    lottery: np.ndarray,
+    priority: np.ndarray,
+    method: str,
+) -> np.ndarray:
+    """
+    计算志愿的处理顺序
+
+    第一关键字为志愿顺序（所有学生的第一志愿先处理，相当于按轮分配），
+    同一轮内抽签模式按抽签号排序，优先级模式先按优先级降序、再以抽签号打破平局
+    """
+    keys = [lottery[student_idx]]
+    if method == PRIORITY:
+        keys.append(-priority[student_idx])
+    keys.append(rank)
+    # np.lexsort 以最后一个键为第一关键字
+    return np.lexsort(keys)
+
+
+def allocate(problem: Dict[str, Any], seed: int) -> Dict[str, Any]:
+    """
+    执行一次分配，在计算进程中运行
+
+    problem:
+        method: lottery 或 priority
+        max_credits: 每学期学分上限，0表示不限制
+        students: [{student_id, priority, credits}]，credits 为本学期已选学分
+        offerings: [{offering_id, course_id, credits, seats}]
+        preferences: [(学生下标, 开课下标, 志愿顺序)]，已剔除与已选课程冲突或重复的志愿
+        conflicts: [(开课下标, 开课下标)]，上课时间互相冲突的开课
+        taken_courses: [(学生下标, 课程ID)]，学生本学期已选的课程
+    """
+    students = problem["students"]
+    offerings = problem["offerings"]
+    prefs = np.asarray(problem["preferences"], dtype=np.int64).reshape(-1, 3)
+    student_idx, offering_idx, rank = prefs[:, 0], prefs[:, 1], prefs[:, 2]
+
+    rng = np.random.default_rng(seed)
+    lottery = rng.random(len(students))
+    priority = np.asarray([float(s.get("priority") or 0) for s in students], dtype=np.float64)
+    order = allocation_order(student_idx, rank, lottery, priority, problem.get("method", LOTTERY))
+
+    seats = np.asarray([max(0, int(o["seats"])) for o in offerings], dtype=np.int64)
+    offering_credits = np.asarray([float(o["credits"] or 0) for o in offerings], dtype=np.float64)
+    student_credits = np.asarray([float(s["credits"] or 0) for s in students], dtype=np.float64)
+    max_credits = float(problem.get("max_credits") or 0)
+
+    conflicts: Dict[int, Set[int]] = {}
+    for a, b in problem.get("conflicts", []):
+        conflicts.setdefault(a, set()).add(b)
+        conflicts.setdefault(b, set()).add(a)
+    taken: Set[Tuple[int, Any]] = {(s, course_id) for s, course_id in problem.get("taken_courses", [])}
+    chosen: Dict[int, List[int]] = {}
+
+    assignments = []
+    waitlist = []
+    rejected = []
+    for i in order.tolist():
+        s, o, r = int(student_idx[i]), int(offering_idx[i]), int(rank[i])
+        pair = {"student_id": students[s]["student_id"], "offering_id": offerings[o]["offering_id"], "rank": r}
+        course_key = (s, offerings[o]["course_id"])
+        if course_key in taken:
+            rejected.append(dict(pair, reason="已分配该课程的其他教学班"))
+        elif conflicts.get(o) and any(c in conflicts[o] for c in chosen.get(s, ())):
+            rejected.append(dict(pair, reason="与已分配课程上课时间冲突"))
+        elif max_credits and student_credits[s] + offering_credits[o] > max_credits:
+            rejected.append(dict(pair, reason="超出学分上限"))
+        elif seats[o] <= 0:
+            waitlist.append((course_key, pair))
+        else:
+            seats[o] -= 1
+            student_credits[s] += offering_credits[o]
+            taken.add(course_key)
+            chosen.setdefault(s, []).append(o)
+            assignments.append(pair)
+
+    # 之后的轮次中已分配到同一课程的学生不再候补
+    waitlist = [pair for key, pair in waitlist if key not in taken]
+
+    first_choice = int(np.count_nonzero(rank == 1))
+    first_choice_met = sum(1 for pair in assignments if pair["rank"] == 1)
+    return {
+        "seed": seed,
+        "assignments": assignments,
+        "waitlist": waitlist,
+        "rejected": rejected,
+        "first_choice_rate": round(first_choice_met / first_choice, 4) if first_choice else 0.0,
+    }
@@ -0,0 +1,717 @@
+"""
+@fileoverview 选课引擎
+@description 选课与退课的事务逻辑：条件更新原子占座、学分上限校验、与已选课程的时间冲突检测
+@author muelovo
+@version 1.0.0
+@date 2026-10-18
+@license MIT
+@copyright © 2025 muelovo. All rights reserved.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, func, or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.schedule_time import resolve_minutes
+from app.core.timetable_cache import timetable_cache
+from app.core.week_mask import WeekMask
+from app.models.course import Course, CourseOffering, Schedule
+from app.models.enrollment import Enrollment, EnrollmentPreference, EnrollmentWaitlist, Grade
+from app.models.student import Student
+
+# 开课的名额分配方式
+ALLOCATION_FCFS = "fcfs"
+ALLOCATION_PREFERENCE = "preference"
+ALLOCATION_MODES = (ALLOCATION_FCFS, ALLOCATION_PREFERENCE)
+
+# 志愿状态
+PREFERENCE_PENDING = 0
+PREFERENCE_ADMITTED = 1
+PREFERENCE_REJECTED = 2
+
+# 计算上课时间所需的排课列
+SLOT_COLUMNS = (
+    Schedule.offering_id, Schedule.day_of_week, Schedule.start_time, Schedule.end_time,
+    Schedule.start_minutes, Schedule.end_minutes, Schedule.weeks, Schedule.weeks_mask
+)
+
+# 候补状态
+WAITLIST_WAITING = 0
+WAITLIST_PROMOTED = 1
+WAITLIST_CANCELLED = 2
+WAITLIST_FAILED = 3
+
+
+class EnrollmentError(Exception):
+    """
+    选课失败，status_code 与 detail 直接用于HTTP响应
+    """
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def reserve_seat(db: Session, offering_id: int) -> bool:
+    """
+    原子占座：只有在仍有空位时才增加已选人数，返回是否成功
+    单条条件UPDATE由数据库行锁保证并发下不会超卖
+    """
+    current = func.coalesce(CourseOffering.current_students, 0)
+    result = db.execute(
+        update(CourseOffering)
+        .where(
+            CourseOffering.offering_id == offering_id,
+            or_(CourseOffering.max_students.is_(None), current < CourseOffering.max_students)
+        )
+        .values(current_students=current + 1)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def release_seat(db: Session, offering_id: int) -> None:
+    """
+    释放座位，已选人数不会减到负数
+    """
+    db.execute(
+        update(CourseOffering)
+        .where(CourseOffering.offering_id == offering_id, CourseOffering.current_students > 0)
+        .values(current_students=CourseOffering.current_students - 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def schedule_slots(rows) -> List[Tuple[int, int, int, int, int]]:
+    """
+    将排课行转换为 (开课ID, 星期, 开始分钟, 结束分钟, 周次掩码)，时间无法解析的排课忽略
+    """
+    slots = []
+    for row in rows:
+        start = resolve_minutes(row.start_minutes, row.start_time)
+        end = resolve_minutes(row.end_minutes, row.end_time)
+        if start is None or end is None:
+            continue
+        slots.append((row.offering_id, row.day_of_week, start, end, int(WeekMask.resolve(row.weeks_mask, row.weeks))))
+    return slots
+
+
+def slots_overlap(a, b) -> bool:
+    """
+    两组上课时间是否在同一星期、同一周次内有时间重叠
+    """
+    return any(
+        x[1] == y[1] and x[2] < y[3] and x[3] > y[2] and x[4] & y[4]
+        for x in a for y in b
+    )
+
+
+def find_time_conflicts(db: Session, student_id: int, offering: Any) -> List[int]:
+    """
+    返回与目标开课上课时间冲突的已选开课ID
+    """
+    target = schedule_slots(db.query(*SLOT_COLUMNS).filter(Schedule.offering_id == offering.offering_id).all())
+    if not target:
+        return []
+
+    existing = schedule_slots(
+        db.query(*SLOT_COLUMNS).join(
+            CourseOffering, Schedule.offering_id == CourseOffering.offering_id
+        ).join(
+            Enrollment, Enrollment.offering_id == CourseOffering.offering_id
+        ).filter(
+            Enrollment.student_id == student_id,
+            Enrollment.status == True,
+            CourseOffering.semester == offering.semester,
+            CourseOffering.offering_id != offering.offering_id
+        ).all()
+    )
+
+    conflicts = []
+    for _, day, start, end, mask in target:
+        for other_offering, other_day, other_start, other_end, other_mask in existing:
+            if day == other_day and start < other_end and end > other_start and mask & other_mask:
+                if other_offering not in conflicts:
+                    conflicts.append(other_offering)
+    return conflicts
+
+
+def enroll(db: Session, student_id: int, offering_id: int, waitlist_id: Optional[int] = None) -> Enrollment:
+    """
+    学生选课
+
+    同一学生的选课请求通过锁定学生行串行执行，学分和时间冲突校验因此不会被并发请求绕过；
+    占座为最后一步的条件UPDATE，开课行锁只在提交前短暂持有。
+    waitlist_id 表示由候补递补，递补成功与候补状态在同一事务中更新。
+    """
+    try:
+        student = db.query(Student).filter(Student.student_id == student_id).with_for_update().first()
+        if not student:
+            raise EnrollmentError(404, "学生不存在")
+
+        offering = db.query(
+            CourseOffering.offering_id, CourseOffering.course_id, CourseOffering.semester,
+            CourseOffering.status, CourseOffering.allocation_mode, Course.credits, Course.course_name
+        ).join(
+            Course, CourseOffering.course_id == Course.course_id
+        ).filter(CourseOffering.offering_id == offering_id).first()
+        if not offering:
+            raise EnrollmentError(404, "开课信息不存在")
+        if not offering.status:
+            raise EnrollmentError(400, "该课程未开放选课")
+        if waitlist_id is None:
+            if offering.allocation_mode == ALLOCATION_PREFERENCE:
+                raise EnrollmentError(400, "该课程采用志愿分配，请在志愿填报期间提交志愿")
+            # 有学生候补时空出的名额优先递补，不允许直接选课插队
+            if db.query(EnrollmentWaitlist.waitlist_id).filter(
+                EnrollmentWaitlist.offering_id == offering_id,
+                EnrollmentWaitlist.status == WAITLIST_WAITING
+            ).first():
+                raise EnrollmentError(409, "课程已满")
+
+        enrollment = db.query(Enrollment).filter(
+            Enrollment.student_id == student_id,
+            Enrollment.offering_id == offering_id
+        ).first()
+        if enrollment is not None and enrollment.status:
+            raise EnrollmentError(400, "已选该课程")
+
+        # 本学期已选课程
+        selected = db.query(
+            CourseOffering.offering_id, CourseOffering.course_id, Course.credits
+        ).join(
+            Enrollment, Enrollment.offering_id == CourseOffering.offering_id
+        ).join(
+            Course, CourseOffering.course_id == Course.course_id
+        ).filter(
+            Enrollment.student_id == student_id,
+            Enrollment.status == True,
+            CourseOffering.semester == offering.semester
+        ).all()
+
+        if any(row.course_id == offering.course_id for row in selected):
+            raise EnrollmentError(400, "本学期已选过该课程的其他教学班")
+
+        total_credits = sum(float(row.credits or 0) for row in selected) + float(offering.credits or 0)
+        if settings.MAX_SEMESTER_CREDITS and total_credits > settings.MAX_SEMESTER_CREDITS:
+            raise EnrollmentError(
+                400, f"超出本学期学分上限{settings.MAX_SEMESTER_CREDITS}（选课后共{total_credits:g}学分）"
+            )
+
+        conflicts = find_time_conflicts(db, student_id, offering)
+        if conflicts:
+            raise EnrollmentError(
+                400, f"与已选课程上课时间冲突（开课ID: {', '.join(str(oid) for oid in conflicts)}）"
+            )
+
+        if not reserve_seat(db, offering_id):
+            raise EnrollmentError(409, "课程已满")
+
+        if enrollment is None:
+            enrollment = Enrollment(student_id=student_id, offering_id=offering_id, status=True)
+            db.add(enrollment)
+        else:
+            # 唯一键 (student_id, offering_id)，退选过的课程重新选课时复用原记录
+            enrollment.status = True
+            enrollment.enrollment_date = datetime.now()
+        if waitlist_id is not None:
+            db.query(EnrollmentWaitlist).filter(
+                EnrollmentWaitlist.waitlist_id == waitlist_id
+            ).update({"status": WAITLIST_PROMOTED}, synchronize_session=False)
+        db.commit()
+    except EnrollmentError:
+        db.rollback()
+        raise
+    except IntegrityError:
+        # 同一学生并发提交同一课程，占座随事务一起回滚
+        db.rollback()
+        raise EnrollmentError(400, "已选该课程")
+    except Exception:
+        db.rollback()
+        raise
+
+    db.refresh(enrollment)
+    timetable_cache.invalidate_student(student_id)
+    return enrollment
+
+
+def withdraw(db: Session, enrollment: Enrollment) -> Enrollment:
+    """
+    学生退课，保留选课记录并将状态置为退选，同时释放座位
+    """
+    try:
+        locked = db.query(Enrollment).filter(
+            Enrollment.enrollment_id == enrollment.enrollment_id
+        ).with_for_update().first()
+        if locked is None or not locked.status:
+            raise EnrollmentError(400, "该课程未选或已退选")
+
+        has_grade = db.query(Grade.grade_id).filter(
+            Grade.enrollment_id == locked.enrollment_id,
+            or_(Grade.final_score.isnot(None), and_(Grade.usual_score.isnot(None), Grade.exam_score.isnot(None)))
+        ).first()
+        if has_grade:
+            raise EnrollmentError(400, "已录入成绩，无法退课")
+
+        locked.status = False
+        release_seat(db, locked.offering_id)
+        db.commit()
+    except EnrollmentError:
+        db.rollback()
+        raise
+    except Exception:
+        db.rollback()
+        raise
+
+    db.refresh(locked)
+    timetable_cache.invalidate_student(locked.student_id)
+    promote_waitlist(db, locked.offering_id)
+    return locked
+
+
+def join_waitlist(db: Session, student_id: int, offering_id: int) -> Tuple[EnrollmentWaitlist, int]:
+    """
+    加入候补，返回候补记录及当前排位（从1开始）
+    """
+    try:
+        entry = db.query(EnrollmentWaitlist).filter(
+            EnrollmentWaitlist.student_id == student_id,
+            EnrollmentWaitlist.offering_id == offering_id
+        ).with_for_update().first()
+        if entry is None:
+            entry = EnrollmentWaitlist(student_id=student_id, offering_id=offering_id, status=WAITLIST_WAITING)
+            db.add(entry)
+        elif entry.status != WAITLIST_WAITING:
+            # 唯一键 (student_id, offering_id)，重新候补时复用原记录并排到队尾
+            entry.status = WAITLIST_WAITING
+            entry.created_at = datetime.now()
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise EnrollmentError(400, "已在候补队列中")
+    except Exception:
+        db.rollback()
+        raise
+
+    db.refresh(entry)
+    return entry, waitlist_position(db, entry)
+
+
+def cancel_waitlist(db: Session, entry: EnrollmentWaitlist) -> EnrollmentWaitlist:
+    """
+    退出候补
+    """
+    if entry.status != WAITLIST_WAITING:
+        raise EnrollmentError(400, "该候补已结束")
+    entry.status = WAITLIST_CANCELLED
+    db.commit()
+    db.refresh(entry)
+    return entry
+
+
+def waitlist_position(db: Session, entry: EnrollmentWaitlist) -> int:
+    """
+    候补排位，按加入时间排序，时间相同按记录ID
+    """
+    ahead = db.query(func.count(EnrollmentWaitlist.waitlist_id)).filter(
+        EnrollmentWaitlist.offering_id == entry.offering_id,
+        EnrollmentWaitlist.status == WAITLIST_WAITING,
+        or_(
+            EnrollmentWaitlist.created_at < entry.created_at,
+            and_(
+                EnrollmentWaitlist.created_at == entry.created_at,
+                EnrollmentWaitlist.waitlist_id < entry.waitlist_id
+            )
+        )
+    ).scalar() or 0
+    return ahead + 1
+
+
+def promote_waitlist(db: Session, offering_id: int) -> List[Enrollment]:
+    """
+    按候补顺序递补空出的名额，直到课程满员或候补队列为空
+    不再满足选课条件（时间冲突、学分超限等）的候补记为递补失败并跳过
+    """
+    promoted = []
+    while True:
+        head = db.query(EnrollmentWaitlist.waitlist_id, EnrollmentWaitlist.student_id).filter(
+            EnrollmentWaitlist.offering_id == offering_id,
+            EnrollmentWaitlist.status == WAITLIST_WAITING
+        ).order_by(EnrollmentWaitlist.created_at, EnrollmentWaitlist.waitlist_id).first()
+        if head is None:
+            break
+        try:
+            promoted.append(enroll(db, head.student_id, offering_id, waitlist_id=head.waitlist_id))
+        except EnrollmentError as e:
+            if e.status_code == 409:
+                break
+            print(f"候补递补失败[学生{head.student_id}, 开课{offering_id}]: {e.detail}")
+            db.query(EnrollmentWaitlist).filter(
+                EnrollmentWaitlist.waitlist_id == head.waitlist_id
+            ).update({"status": WAITLIST_FAILED}, synchronize_session=False)
+            db.commit()
+    return promoted
+
+
+def submit_preferences(db: Session, student_id: int, semester: str, offering_ids: List[int]) -> List[EnrollmentPreference]:
+    """
+    提交志愿，按列表顺序依次为第1、2…志愿，覆盖该学生本学期尚未分配的志愿
+    """
+    if len(set(offering_ids)) != len(offering_ids):
+        raise EnrollmentError(400, "志愿中存在重复的开课")
+    if settings.PREFERENCE_MAX_CHOICES and len(offering_ids) > settings.PREFERENCE_MAX_CHOICES:
+        raise EnrollmentError(400, f"最多填报{settings.PREFERENCE_MAX_CHOICES}个志愿")
+
+    try:
+        student = db.query(Student).filter(Student.student_id == student_id).with_for_update().first()
+        if not student:
+            raise EnrollmentError(404, "学生不存在")
+
+        offerings = {
+            row.offering_id: row for row in db.query(
+                CourseOffering.offering_id, CourseOffering.semester,
+                CourseOffering.status, CourseOffering.allocation_mode
+            ).filter(CourseOffering.offering_id.in_(offering_ids)).all()
+        } if offering_ids else {}
+        for offering_id in offering_ids:
+            offering = offerings.get(offering_id)
+            if offering is None:
+                raise EnrollmentError(404, f"开课{offering_id}不存在")
+            if offering.semester != semester:
+                raise EnrollmentError(400, f"开课{offering_id}不属于学期{semester}")
+            if not offering.status or offering.allocation_mode != ALLOCATION_PREFERENCE:
+                raise EnrollmentError(400, f"开课{offering_id}未在志愿填报期")
+
+        db.query(EnrollmentPreference).filter(
+            EnrollmentPreference.student_id == student_id,
+            EnrollmentPreference.semester == semester,
+            EnrollmentPreference.status == PREFERENCE_PENDING
+        ).delete(synchronize_session=False)
+        preferences = [
+            EnrollmentPreference(
+                student_id=student_id, offering_id=offering_id, semester=semester,
+                rank=rank, status=PREFERENCE_PENDING
+            )
+            for rank, offering_id in enumerate(offering_ids, start=1)
+        ]
+        db.add_all(preferences)
+        db.commit()
+    except EnrollmentError:
+        db.rollback()
+        raise
+    except IntegrityError:
+        db.rollback()
+        raise EnrollmentError(400, "志愿中包含已分配过的开课")
+    except Exception:
+        db.rollback()
+        raise
+    return preferences
+
+
+def build_allocation_problem(db: Session, semester: str, method: str) -> Dict[str, Any]:
+    """
+    构造批量分配的输入：本学期志愿分配模式的开课、待分配志愿、学生已选学分与课程、开课间的时间冲突
+    与学生已选课程冲突或重复的志愿在此剔除，记入 rejected
+    """
+    offering_rows = db.query(
+        CourseOffering.offering_id, CourseOffering.course_id, CourseOffering.max_students,
+        CourseOffering.current_students, Course.credits
+    ).join(
+        Course, CourseOffering.course_id == Course.course_id
+    ).filter(
+        CourseOffering.semester == semester,
+        CourseOffering.status == True,
+        CourseOffering.allocation_mode == ALLOCATION_PREFERENCE
+    ).order_by(CourseOffering.offering_id).all()
+    offering_index = {row.offering_id: i for i, row in enumerate(offering_rows)}
+    offerings = [
+        {
+            "offering_id": row.offering_id,
+            "course_id": row.course_id,
+            "credits": float(row.credits or 0),
+            # 未设置人数上限时视为不限
+            "seats": (row.max_students - (row.current_students or 0)) if row.max_students is not None else 1 << 30,
+        }
+        for row in offering_rows
+    ]
+
+    offering_slots: Dict[int, List[Tuple[int, int, int, int, int]]] = {}
+    if offering_index:
+        for slot in schedule_slots(
+            db.query(*SLOT_COLUMNS).filter(Schedule.offering_id.in_(list(offering_index))).all()
+        ):
+            offering_slots.setdefault(slot[0], []).append(slot)
+
+    conflicts = []
+    slotted = sorted(offering_slots)
+    for i, a in enumerate(slotted):
+        for b in slotted[i + 1:]:
+            if slots_overlap(offering_slots[a], offering_slots[b]):
+                conflicts.append((offering_index[a], offering_index[b]))
+
+    pref_rows = db.query(
+        EnrollmentPreference.student_id, EnrollmentPreference.offering_id, EnrollmentPreference.rank
+    ).filter(
+        EnrollmentPreference.semester == semester,
+        EnrollmentPreference.status == PREFERENCE_PENDING,
+        EnrollmentPreference.offering_id.in_(list(offering_index) or [0])
+    ).all()
+    student_ids = sorted({row.student_id for row in pref_rows})
+    student_index = {sid: i for i, sid in enumerate(student_ids)}
+
+    # 学生本学期已选课程
+    enrolled_credits: Dict[int, float] = {}
+    enrolled_courses: Dict[int, set] = {}
+    enrolled_offerings: Dict[int, List[int]] = {}
+    if student_ids:
+        for row in db.query(
+            Enrollment.student_id, CourseOffering.offering_id, CourseOffering.course_id, Course.credits
+        ).join(
+            CourseOffering, Enrollment.offering_id == CourseOffering.offering_id
+        ).join(
+            Course, CourseOffering.course_id == Course.course_id
+        ).filter(
+            Enrollment.student_id.in_(student_ids),
+            Enrollment.status == True,
+            CourseOffering.semester == semester
+        ).all():
+            enrolled_credits[row.student_id] = enrolled_credits.get(row.student_id, 0.0) + float(row.credits or 0)
+            enrolled_courses.setdefault(row.student_id, set()).add(row.course_id)
+            enrolled_offerings.setdefault(row.student_id, []).append(row.offering_id)
+
+    enrolled_slots: Dict[int, List[Tuple[int, int, int, int, int]]] = {}
+    enrolled_ids = {oid for ids in enrolled_offerings.values() for oid in ids}
+    if enrolled_ids:
+        for slot in schedule_slots(
+            db.query(*SLOT_COLUMNS).filter(Schedule.offering_id.in_(list(enrolled_ids))).all()
+        ):
+            enrolled_slots.setdefault(slot[0], []).append(slot)
+
+    priority: Dict[int, float] = {}
+    if method == "priority" and student_ids:
+        # 优先级按年级：入学越早优先级越高
+        for row in db.query(Student.student_id, Student.grade, Student.enrollment_year).filter(
+            Student.student_id.in_(student_ids)
+        ).all():
+            priority[row.student_id] = -float(row.enrollment_year or row.grade or 9999)
+
+    preferences = []
+    rejected = []
+    for row in pref_rows:
+        offering = offerings[offering_index[row.offering_id]]
+        pair = {"student_id": row.student_id, "offering_id": row.offering_id, "rank": row.rank}
+        if offering["course_id"] in enrolled_courses.get(row.student_id, ()):
+            rejected.append(dict(pair, reason="本学期已选过该课程"))
+            continue
+        student_slots = [
+            slot for oid in enrolled_offerings.get(row.student_id, ()) for slot in enrolled_slots.get(oid, ())
+        ]
+        if student_slots and slots_overlap(offering_slots.get(row.offering_id, ()), student_slots):
+            rejected.append(dict(pair, reason="与已选课程上课时间冲突"))
+            continue
+        preferences.append((student_index[row.student_id], offering_index[row.offering_id], row.rank))
+
+    return {
+        "method": method,
+        "semester": semester,
+        "max_credits": settings.MAX_SEMESTER_CREDITS,
+        "students": [
+            {
+                "student_id": sid,
+                "priority": priority.get(sid, 0.0),
+                "credits": enrolled_credits.get(sid, 0.0),
+            }
+            for sid in student_ids
+        ],
+        "offerings": offerings,
+        "preferences": preferences,
+        "conflicts": conflicts,
+        "taken_courses": [
+            (student_index[sid], course_id)
+            for sid, courses in enrolled_courses.items()
+            for course_id in courses
+        ],
+        "rejected": rejected,
+    }
+
+
+def apply_allocation(db: Session, semester: str, offering_ids: List[int], result: Dict[str, Any]) -> Dict[str, int]:
+    """
+    写入分配结果：按开课批量占座并创建选课记录，更新志愿状态，写入候补，
+    并将这些开课切换为先到先得以开放剩余名额
+    """
+    assignments = result["assignments"]
+    by_offering: Dict[int, List[int]] = {}
+    for pair in assignments:
+        by_offering.setdefault(pair["offering_id"], []).append(pair["student_id"])
+
+    try:
+        current = func.coalesce(CourseOffering.current_students, 0)
+        for offering_id, student_ids in by_offering.items():
+            count = len(student_ids)
+            updated = db.execute(
+                update(CourseOffering)
+                .where(
+                    CourseOffering.offering_id == offering_id,
+                    CourseOffering.allocation_mode == ALLOCATION_PREFERENCE,
+                    or_(CourseOffering.max_students.is_(None), current + count <= CourseOffering.max_students)
+                )
+                .values(current_students=current + count)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if updated != 1:
+                raise EnrollmentError(409, f"开课{offering_id}的名额或分配方式已变化，请重新分配")
+
+        # 唯一键 (student_id, offering_id)，退选过的记录直接恢复
+        existing = {}
+        if assignments:
+            for enrollment in db.query(Enrollment).filter(
+                Enrollment.offering_id.in_(list(by_offering)),
+                Enrollment.student_id.in_({pair["student_id"] for pair in assignments})
+            ).all():
+                existing[(enrollment.student_id, enrollment.offering_id)] = enrollment
+        now = datetime.now()
+        for pair in assignments:
+            enrollment = existing.get((pair["student_id"], pair["offering_id"]))
+            if enrollment is None:
+                db.add(Enrollment(student_id=pair["student_id"], offering_id=pair["offering_id"], status=True))
+            elif enrollment.status:
+                raise EnrollmentError(409, f"学生{pair['student_id']}已选开课{pair['offering_id']}，请重新分配")
+            else:
+                enrollment.status = True
+                enrollment.enrollment_date = now
+
+        if offering_ids:
+            db.query(EnrollmentPreference).filter(
+                EnrollmentPreference.semester == semester,
+                EnrollmentPreference.offering_id.in_(offering_ids),
+                EnrollmentPreference.status == PREFERENCE_PENDING
+            ).update({"status": PREFERENCE_REJECTED}, synchronize_session=False)
+        for offering_id, student_ids in by_offering.items():
+            db.query(EnrollmentPreference).filter(
+                EnrollmentPreference.offering_id == offering_id,
+                EnrollmentPreference.student_id.in_(student_ids)
+            ).update({"status": PREFERENCE_ADMITTED}, synchronize_session=False)
+
+        # 候补按分配顺序写入，记录ID递增即为排位
+        waitlist = result["waitlist"]
+        waitlisted: Dict[int, List[int]] = {}
+        for pair in waitlist:
+            waitlisted.setdefault(pair["offering_id"], []).append(pair["student_id"])
+        for offering_id, student_ids in waitlisted.items():
+            db.query(EnrollmentWaitlist).filter(
+                EnrollmentWaitlist.offering_id == offering_id,
+                EnrollmentWaitlist.student_id.in_(student_ids)
+            ).delete(synchronize_session=False)
+        db.add_all([
+            EnrollmentWaitlist(
+                student_id=pair["student_id"], offering_id=pair["offering_id"],
+                status=WAITLIST_WAITING, created_at=now
+            )
+            for pair in waitlist
+        ])
+
+        if offering_ids:
+            db.query(CourseOffering).filter(
+                CourseOffering.offering_id.in_(offering_ids)
+            ).update({"allocation_mode": ALLOCATION_FCFS}, synchronize_session=False)
+        db.commit()
+    except EnrollmentError:
+        db.rollback()
+        raise
+    except Exception:
+        db.rollback()
+        raise
+
+    for student_id in {pair["student_id"] for pair in assignments}:
+        timetable_cache.invalidate_student(student_id)
+    return {"enrolled": len(assignments), "waitlisted": len(result["waitlist"])}
+
+
+def enrolled_counts(db: Session, offerings: List[Any]) -> Dict[int, int]:
+    """
+    返回开课的已选人数
+
+    默认直接读取选课事务维护的 current_students；
+    SEAT_COUNTER_SOURCE=count 时改为对本页开课做一次 GROUP BY 统计，用于计数器尚未校准的库
+    """
+    if settings.SEAT_COUNTER_SOURCE != "count":
+        return {offering.offering_id: offering.current_students or 0 for offering in offerings}
+
+    offering_ids = [offering.offering_id for offering in offerings]
+    if not offering_ids:
+        return {}
+    counts = dict.fromkeys(offering_ids, 0)
+    counts.update(
+        db.query(Enrollment.offering_id, func.count(Enrollment.enrollment_id)).filter(
+            Enrollment.offering_id.in_(offering_ids),
+            Enrollment.status == True
+        ).group_by(Enrollment.offering_id).all()
+    )
+    return counts
+
+
+def reconcile_seat_counters(
+    db: Session,
+    semester: Optional[str] = None,
+    chunk_size: int = 500,
+    progress: Optional[Any] = None,
+) -> List[Dict[str, int]]:
+    """
+    按选课记录校准 current_students，返回被修正的开课
+
+    每批开课先加行锁再以加锁读统计：选课/退课在同一事务中更新计数器与选课记录，
+    因此锁定后的统计结果与计数器应当一致，不一致即为漂移；计数器调低后按候补顺序递补空出的名额
+    """
+    query = db.query(CourseOffering.offering_id)
+    if semester:
+        query = query.filter(CourseOffering.semester == semester)
+    offering_ids = [row.offering_id for row in query.order_by(CourseOffering.offering_id).all()]
+    # 结束读取ID的事务，避免后续统计沿用此时的一致性读快照
+    db.commit()
+
+    drifts = []
+    for start in range(0, len(offering_ids), chunk_size):
+        chunk = offering_ids[start:start + chunk_size]
+        freed = []
+        try:
+            locked = db.query(CourseOffering.offering_id, CourseOffering.current_students).filter(
+                CourseOffering.offering_id.in_(chunk)
+            ).order_by(CourseOffering.offering_id).with_for_update().all()
+            # 加锁读读取最新已提交的选课记录，不受事务快照影响
+            counts = dict(
+                db.query(Enrollment.offering_id, func.count(Enrollment.enrollment_id)).filter(
+                    Enrollment.offering_id.in_(chunk),
+                    Enrollment.status == True
+                ).group_by(Enrollment.offering_id).with_for_update(read=True).all()
+            )
+            for row in locked:
+                actual = counts.get(row.offering_id, 0)
+                if (row.current_students or 0) != actual or row.current_students is None:
+                    db.execute(
+                        update(CourseOffering)
+                        .where(CourseOffering.offering_id == row.offering_id)
+                        .values(current_students=actual)
+                        .execution_options(synchronize_session=False)
+                    )
+                    drifts.append({
+                        "offering_id": row.offering_id,
+                        "counter": row.current_students,
+                        "actual": actual,
+                    })
+                    if actual < (row.current_students or 0):
+                        freed.append(row.offering_id)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        for offering_id in freed:
+            promote_waitlist(db, offering_id)
+        if progress is not None:
+            progress(min(1.0, (start + len(chunk)) / len(offering_ids)))
+    return drifts
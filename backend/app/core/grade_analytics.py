@@ -0,0 +1,88 @@
+"""
+@fileoverview 成绩分布分析
+@description 对按列一次取出的最终成绩用NumPy计算直方图、均值、中位数、标准差、及格率与成绩等级分布，支持按分组键一次计算多组
+@author muelovo
+@version 1.0.0
+@date 2026-10-18
+@license MIT
+@copyright © 2025 muelovo. All rights reserved.
+"""
+
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+from app.core.config import settings
+
+# 成绩等级分段，与成绩单的等级划分一致
+GRADE_LEVELS = (("优秀", 90), ("良好", 80), ("中等", 70), ("及格", 60), ("不及格", 0))
+
+
+def score_distribution(scores: np.ndarray, bin_width: float = 10) -> Dict[str, Any]:
+    """
+    计算一组最终成绩的分布统计，直方图区间为左闭右开，最后一个区间包含100分
+    """
+    count = int(scores.size)
+    edges = np.arange(0, 100 + bin_width, bin_width, dtype=np.float64)
+    edges[-1] = 100
+    histogram = np.histogram(scores, bins=edges)[0] if count else np.zeros(len(edges) - 1, dtype=np.int64)
+
+    # 等级分段为降序分数线，np.digitize 得到每个成绩落在哪一段
+    lines = np.asarray([line for _, line in GRADE_LEVELS][::-1], dtype=np.float64)
+    level_counts = np.bincount(np.digitize(scores, lines[1:]), minlength=len(lines))[::-1] if count \
+        else np.zeros(len(lines), dtype=np.int64)
+
+    def rate(value: int) -> float:
+        return round(value * 100.0 / count, 2) if count else 0.0
+
+    passed = int(np.count_nonzero(scores >= settings.GRADE_PASS_SCORE))
+    excellent = int(level_counts[0])
+    return {
+        "count": count,
+        "mean": round(float(scores.mean()), 2) if count else None,
+        "median": round(float(np.median(scores)), 2) if count else None,
+        "std": round(float(scores.std()), 2) if count else None,
+        "min": round(float(scores.min()), 2) if count else None,
+        "max": round(float(scores.max()), 2) if count else None,
+        "pass_count": passed,
+        "pass_rate": rate(passed),
+        "excellent_rate": rate(excellent),
+        "histogram": [
+            {"min": float(edges[i]), "max": float(edges[i + 1]), "count": int(histogram[i])}
+            for i in range(len(histogram))
+        ],
+        "levels": [
+            {"level": name, "count": int(level_counts[i]), "rate": rate(int(level_counts[i]))}
+            for i, (name, _) in enumerate(GRADE_LEVELS)
+        ],
+    }
+
+
+def grouped_distributions(keys: Sequence[Any], scores: Sequence[Any], bin_width: float = 10) -> List[Dict[str, Any]]:
+    """
+    按分组键计算每组的分布统计，成绩排序后按键切分，只需一次排序
+    """
+    keys = np.asarray(keys, dtype=np.int64)
+    values = np.asarray(scores, dtype=np.float64)
+    if keys.size == 0:
+        return []
+    order = np.argsort(keys, kind="stable")
+    keys, values = keys[order], values[order]
+    group_keys, starts = np.unique(keys, return_index=True)
+    ends = np.append(starts[1:], keys.size)
+    return [
+        dict(score_distribution(values[start:end], bin_width), key=int(key))
+        for key, start, end in zip(group_keys.tolist(), starts.tolist(), ends.tolist())
+    ]
+
+
+def grade_level(score: Any) -> str:
+    """
+    单个最终成绩对应的成绩等级
+    """
+    if score is None:
+        return ""
+    for name, line in GRADE_LEVELS:
+        if float(score) >= line:
+            return name
+    return GRADE_LEVELS[-1][0]
@@ -0,0 +1,224 @@
+"""
+@fileoverview 学生学分与GPA汇总
+@description 按学生及学生-学期维护已修学分、学分绩点与GPA，成绩变化时按差量增量更新，并提供全量重建
+@author muelovo
+@version 1.0.0
+@date 2026-10-18
+@license MIT
+@copyright © 2025 muelovo. All rights reserved.
+"""
+
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.course import Course, CourseOffering
+from app.models.enrollment import Enrollment, Grade, StudentGpa, StudentSemesterGpa
+from app.models.student import Student
+
+ZERO = Decimal("0")
+SUMMARY_FIELDS = ("credits_attempted", "credits_earned", "grade_points", "course_count")
+
+
+def to_decimal(value: Any) -> Decimal:
+    if value is None:
+        return ZERO
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+
+def contribution(credits: Any, final_score: Any, grade_point: Any) -> Tuple[Decimal, Decimal, Decimal, int]:
+    """
+    一门课程成绩对汇总的贡献: (已有绩点学分, 及格学分, 学分绩点, 课程数)，没有绩点的成绩不计入
+    """
+    if grade_point is None:
+        return ZERO, ZERO, ZERO, 0
+    credits = to_decimal(credits)
+    passed = final_score is not None and to_decimal(final_score) >= to_decimal(settings.GRADE_PASS_SCORE)
+    return credits, credits if passed else ZERO, credits * to_decimal(grade_point), 1
+
+
+def compute_gpa(credits_attempted: Any, grade_points: Any) -> Decimal:
+    credits_attempted = to_decimal(credits_attempted)
+    if credits_attempted <= 0:
+        return ZERO
+    return (to_decimal(grade_points) / credits_attempted).quantize(Decimal("0.01"))
+
+
+def summary_to_dict(row: Any) -> Dict[str, Any]:
+    """
+    汇总行转为响应数据，没有汇总行（尚无成绩）时各项为0
+    """
+    return {
+        "credits_attempted": float(row.credits_attempted) if row else 0.0,
+        "credits_earned": float(row.credits_earned) if row else 0.0,
+        "grade_points": float(row.grade_points) if row else 0.0,
+        "course_count": row.course_count if row else 0,
+        "gpa": float(row.gpa) if row else 0.0,
+    }
+
+
+def get_student_summary(db: Session, student_id: int, semester: Optional[str] = None) -> Dict[str, Any]:
+    """
+    读取学生的汇总（指定学期时读取该学期的汇总）
+    """
+    if semester:
+        row = db.query(StudentSemesterGpa).filter(
+            StudentSemesterGpa.student_id == student_id,
+            StudentSemesterGpa.semester == semester
+        ).first()
+    else:
+        row = db.query(StudentGpa).filter(StudentGpa.student_id == student_id).first()
+    return summary_to_dict(row)
+
+
+def _apply_deltas(db: Session, model: Any, keys: List[str], deltas: Dict[Any, List[Any]]) -> None:
+    columns = [getattr(model, key) for key in keys]
+    # 按主键顺序加锁，避免并发录入时互相等待形成死锁
+    ordered = sorted(deltas)
+    if len(keys) == 1:
+        condition = columns[0].in_(ordered)
+        existing = {row.student_id: row for row in db.query(model).filter(condition).order_by(*columns).with_for_update()}
+    else:
+        student_ids = sorted({key[0] for key in ordered})
+        existing = {
+            (row.student_id, row.semester): row
+            for row in db.query(model).filter(columns[0].in_(student_ids)).order_by(*columns).with_for_update()
+            if (row.student_id, row.semester) in deltas
+        }
+
+    for key in ordered:
+        delta = deltas[key]
+        row = existing.get(key)
+        if row is None:
+            row = model(**dict(zip(keys, key if isinstance(key, tuple) else (key,))))
+            for field in SUMMARY_FIELDS:
+                setattr(row, field, 0)
+            db.add(row)
+        for field, value in zip(SUMMARY_FIELDS, delta):
+            setattr(row, field, (getattr(row, field) or 0) + value)
+        row.gpa = compute_gpa(row.credits_attempted, row.grade_points)
+
+
+def apply_grade_changes(db: Session, changes: Iterable[Dict[str, Any]]) -> None:
+    """
+    按成绩变化增量更新汇总，需在写成绩的同一事务中调用，由调用方提交
+
+    changes 每项包含 student_id、semester、credits，以及变化前后的 (final_score, grade_point)：
+    old 为 None 表示新增成绩
+    """
+    student_deltas: Dict[int, List[Any]] = {}
+    semester_deltas: Dict[Tuple[int, str], List[Any]] = {}
+    for change in changes:
+        old = change.get("old") or (None, None)
+        new = change.get("new") or (None, None)
+        before = contribution(change["credits"], *old)
+        after = contribution(change["credits"], *new)
+        delta = [a - b for a, b in zip(after, before)]
+        if not any(delta):
+            continue
+        for deltas, key in (
+            (student_deltas, change["student_id"]),
+            (semester_deltas, (change["student_id"], change["semester"])),
+        ):
+            current = deltas.setdefault(key, [ZERO, ZERO, ZERO, 0])
+            for i, value in enumerate(delta):
+                current[i] += value
+
+    if student_deltas:
+        _apply_deltas(db, StudentGpa, ["student_id"], student_deltas)
+        _apply_deltas(db, StudentSemesterGpa, ["student_id", "semester"], semester_deltas)
+        db.flush()
+
+
+def rebuild_grade_summaries(
+    db: Session,
+    student_ids: Optional[List[int]] = None,
+    chunk_size: int = 500,
+    progress: Optional[Any] = None,
+    commit: bool = True,
+) -> Dict[str, int]:
+    """
+    按成绩记录重建汇总，student_ids 为空时重建全部学生
+
+    每批学生先锁定汇总行，再用一次加锁读的 GROUP BY 统计各学期的汇总，删除旧汇总后整体写入；
+    commit=False 时由调用方在自己的事务中提交
+    """
+    if student_ids is None:
+        student_ids = [row.student_id for row in db.query(Student.student_id).order_by(Student.student_id).all()]
+    else:
+        student_ids = sorted(set(student_ids))
+
+    pass_score = settings.GRADE_PASS_SCORE
+    rebuilt_students = 0
+    rebuilt_semesters = 0
+    for start in range(0, len(student_ids), chunk_size):
+        chunk = student_ids[start:start + chunk_size]
+        try:
+            # 先按与增量更新相同的顺序锁定本批的汇总行，再以加锁读统计成绩：
+            # 统计结果包含锁定前已提交的全部成绩，之后的成绩录入需等待本批提交后再叠加差量
+            db.query(StudentGpa.student_id).filter(
+                StudentGpa.student_id.in_(chunk)
+            ).order_by(StudentGpa.student_id).with_for_update().all()
+            db.query(StudentSemesterGpa.student_id).filter(
+                StudentSemesterGpa.student_id.in_(chunk)
+            ).order_by(StudentSemesterGpa.student_id, StudentSemesterGpa.semester).with_for_update().all()
+
+            rows = db.query(
+                Enrollment.student_id,
+                CourseOffering.semester,
+                func.sum(Course.credits).label("credits_attempted"),
+                func.sum(case((Grade.final_score >= pass_score, Course.credits), else_=0)).label("credits_earned"),
+                func.sum(Course.credits * Grade.grade_point).label("grade_points"),
+                func.count(Grade.grade_id).label("course_count"),
+            ).join(
+                Grade, Grade.enrollment_id == Enrollment.enrollment_id
+            ).join(
+                CourseOffering, Enrollment.offering_id == CourseOffering.offering_id
+            ).join(
+                Course, CourseOffering.course_id == Course.course_id
+            ).filter(
+                Enrollment.student_id.in_(chunk),
+                Enrollment.status == True,
+                Grade.grade_point.isnot(None)
+            ).group_by(Enrollment.student_id, CourseOffering.semester).with_for_update(read=True).all()
+
+            db.query(StudentSemesterGpa).filter(StudentSemesterGpa.student_id.in_(chunk)).delete(synchronize_session=False)
+            db.query(StudentGpa).filter(StudentGpa.student_id.in_(chunk)).delete(synchronize_session=False)
+
+            totals: Dict[int, List[Any]] = {}
+            semester_rows = []
+            for row in rows:
+                values = [
+                    to_decimal(row.credits_attempted), to_decimal(row.credits_earned),
+                    to_decimal(row.grade_points), int(row.course_count or 0),
+                ]
+                semester_rows.append(dict(
+                    zip(SUMMARY_FIELDS, values), student_id=row.student_id, semester=row.semester,
+                    gpa=compute_gpa(values[0], values[2])
+                ))
+                total = totals.setdefault(row.student_id, [ZERO, ZERO, ZERO, 0])
+                for i, value in enumerate(values):
+                    total[i] += value
+            student_rows = [
+                dict(zip(SUMMARY_FIELDS, values), student_id=student_id, gpa=compute_gpa(values[0], values[2]))
+                for student_id, values in totals.items()
+            ]
+            if student_rows:
+                db.bulk_insert_mappings(StudentGpa, student_rows)
+                db.bulk_insert_mappings(StudentSemesterGpa, semester_rows)
+            if commit:
+                db.commit()
+            else:
+                db.flush()
+        except Exception:
+            if commit:
+                db.rollback()
+            raise
+        rebuilt_students += len(student_rows)
+        rebuilt_semesters += len(semester_rows)
+        if progress is not None:
+            progress(min(1.0, (start + len(chunk)) / len(student_ids)))
+    return {"students": rebuilt_students, "semesters": rebuilt_semesters}
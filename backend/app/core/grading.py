@@ -0,0 +1,59 @@
+"""
+@fileoverview 成绩计算
+@description 按配置的平时/考试权重与绩点分段，一次性向量化计算整个教学班的最终成绩和绩点
+@author muelovo
+@version 1.0.0
+@date 2026-10-18
+@license MIT
+@copyright © 2025 muelovo. All rights reserved.
+"""
+
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+
+
+def grade_point_scale() -> Tuple[np.ndarray, np.ndarray]:
+    """
+    返回按分数线升序排列的 (分数线, 绩点) 数组
+    """
+    scale = sorted((float(line), float(point)) for line, point in settings.GRADE_POINT_SCALE)
+    lines = np.asarray([line for line, _ in scale], dtype=np.float64)
+    points = np.asarray([point for _, point in scale], dtype=np.float64)
+    return lines, points
+
+
+def to_array(values: Sequence[Optional[float]]) -> np.ndarray:
+    """
+    将可能为空的分数列表转为浮点数组，空值为 NaN
+    """
+    return np.asarray([np.nan if v is None else float(v) for v in values], dtype=np.float64)
+
+
+def compute_grades(
+    usual_scores: Sequence[Optional[float]],
+    exam_scores: Sequence[Optional[float]],
+    final_scores: Sequence[Optional[float]],
+) -> Tuple[List[Optional[float]], List[Optional[float]]]:
+    """
+    计算最终成绩和绩点
+
+    平时成绩与考试成绩都存在时按权重计算最终成绩，否则沿用提交的最终成绩；
+    绩点取最终成绩达到的最高分数线对应的绩点，低于最低分数线为0，没有最终成绩时为空
+    """
+    usual, exam, final = to_array(usual_scores), to_array(exam_scores), to_array(final_scores)
+    weighted = usual * settings.GRADE_USUAL_WEIGHT + exam * settings.GRADE_EXAM_WEIGHT
+    final = np.where(np.isnan(weighted), final, np.round(weighted, 2))
+
+    lines, points = grade_point_scale()
+    # 加一个极小量，避免恰好落在分数线上的成绩因浮点误差被归入下一档
+    idx = np.searchsorted(lines, final + 1e-9, side="right") - 1
+    grade_points = np.where(idx >= 0, points[np.clip(idx, 0, None)], 0.0)
+    grade_points = np.where(np.isnan(final), np.nan, grade_points)
+
+    def to_list(values: np.ndarray) -> List[Optional[float]]:
+        return [None if np.isnan(v) else float(v) for v in values.tolist()]
+
+    return to_list(final), to_list(grade_points)
@@ -0,0 +1,97 @@
+"""
+@fileoverview 密码哈希强度基准测试
+@description 测量本机在不同算法强度下单进程与多进程每秒可完成的密码校验次数，用于权衡登录吞吐与安全强度；
+             用法: python -m app.core.hash_benchmark [--scheme bcrypt] [--rounds 10 11 12] [--seconds 2] [--processes N]
+@author muelovo
+@version 1.0.0
+@date 2026-10-18
+@license MIT
+@copyright © 2025 muelovo. All rights reserved.
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from app.core.config import settings
+from app.core.security import build_crypt_context
+
+BENCHMARK_PASSWORD = "Benchmark#2026"
+
+
+def measure_verifies(scheme: str, rounds: int, seconds: float) -> Dict[str, float]:
+    """
+    在当前进程中反复校验同一密码，返回完成次数与耗时
+    """
+    context = build_crypt_context([scheme], {scheme: rounds})
+    hashed = context.hash(BENCHMARK_PASSWORD)
+    count = 0
+    started = time.perf_counter()
+    deadline = started + seconds
+    while True:
+        context.verify(BENCHMARK_PASSWORD, hashed)
+        count += 1
+        if time.perf_counter() >= deadline:
+            break
+    return {"count": count, "elapsed": time.perf_counter() - started}
+
+
+def benchmark(
+    scheme: str,
+    rounds_list: List[int],
+    seconds: float,
+    processes: int,
+) -> List[Dict[str, float]]:
+    """
+    对每个强度先测单进程，再用 processes 个进程同时测，得到单次校验耗时与整机吞吐
+    """
+    results = []
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        for rounds in rounds_list:
+            single = measure_verifies(scheme, rounds, seconds)
+            parallel = list(pool.map(measure_verifies, [scheme] * processes, [rounds] * processes, [seconds] * processes))
+            results.append({
+                "rounds": rounds,
+                "verify_ms": single["elapsed"] * 1000 / single["count"],
+                "single_per_second": single["count"] / single["elapsed"],
+                "parallel_per_second": sum(r["count"] / r["elapsed"] for r in parallel),
+            })
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    configured_scheme = settings.PASSWORD_HASH_SCHEMES[0]
+
+    parser = argparse.ArgumentParser(description="测量不同哈希强度下每秒可完成的密码校验次数")
+    parser.add_argument("--scheme", default=configured_scheme, help="哈希算法，默认取 PASSWORD_HASH_SCHEMES 的第一个")
+    parser.add_argument("--rounds", type=int, nargs="+", help="要测试的强度列表，bcrypt 默认为当前配置前后各两级")
+    parser.add_argument("--seconds", type=float, default=2.0, help="每个强度的测量时长（秒）")
+    parser.add_argument("--processes", type=int, default=settings.PASSWORD_HASH_WORKERS or os.cpu_count() or 1,
+                        help="并行测量的进程数，默认取 PASSWORD_HASH_WORKERS")
+    args = parser.parse_args(argv)
+
+    scheme_rounds = settings.PASSWORD_HASH_ROUNDS.get(args.scheme)
+    rounds_list = args.rounds
+    if not rounds_list:
+        if args.scheme == "bcrypt":
+            current = scheme_rounds or 12
+            rounds_list = [r for r in range(current - 2, current + 3) if 4 <= r <= 31]
+        elif scheme_rounds:
+            rounds_list = [scheme_rounds]
+        else:
+            parser.error(f"请通过 --rounds 指定 {args.scheme} 的强度")
+
+    print(f"算法: {args.scheme}  进程数: {args.processes}  每项测量: {args.seconds:g}秒  CPU核数: {os.cpu_count()}")
+    print(f"{'强度':>6} {'单次校验(ms)':>14} {'单进程(次/秒)':>16} {f'{args.processes}进程(次/秒)':>16}")
+    for row in benchmark(args.scheme, rounds_list, args.seconds, max(1, args.processes)):
+        marker = "  <- 当前配置" if args.scheme == configured_scheme and row["rounds"] == scheme_rounds else ""
+        print(
+            f"{row['rounds']:>8} {row['verify_ms']:>16.2f} {row['single_per_second']:>18.1f} "
+            f"{row['parallel_per_second']:>18.1f}{marker}"
+        )
+
+
+if __name__ == "__main__":
+    main()
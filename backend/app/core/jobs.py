@@ -0,0 +1,128 @@
+"""
+@fileoverview 后台任务管理
+@description 提供进程内的后台任务登记、进度查询以及共享的多进程计算池
+@author muelovo
+@version 1.0.0
+@date 2026-10-18
+@license MIT
+@copyright © 2025 muelovo. All rights reserved.
+"""
+
+import os
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from app.core.config import settings
+
+# 任务状态
+PENDING = "pending"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class Job:
+    """
+    后台任务，进度范围为0-1
+    """
+
+    def __init__(self, kind: str, params: Optional[Dict[str, Any]] = None):
+        self.job_id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params or {}
+        self.status = PENDING
+        self.progress = 0.0
+        self.message = ""
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        # 任务完成后的附加状态，例如草稿是否已提交
+        self.extra: Dict[str, Any] = {}
+
+    def update(self, progress: Optional[float] = None, message: Optional[str] = None) -> None:
+        if progress is not None:
+            self.progress = max(0.0, min(1.0, progress))
+        if message is not None:
+            self.message = message
+
+    def to_dict(self, include_result: bool = False) -> Dict[str, Any]:
+        data = {
+            "job_id": self.job_id,
+            "kind": self.kind,
+            "params": self.params,
+            "status": self.status,
+            "progress": round(self.progress, 4),
+            "message": self.message,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+        data.update(self.extra)
+        if include_result:
+            data["result"] = self.result
+        return data
+
+
+class JobRegistry:
+    """
+    进程内任务登记表，每个任务在独立线程中执行，只保留最近的若干个任务
+    """
+
+    def __init__(self, max_jobs: int = 100):
+        self.max_jobs = max_jobs
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, func: Callable[[Job], Any], params: Optional[Dict[str, Any]] = None) -> Job:
+        """
+        提交任务，func接收Job对象用于汇报进度，返回值作为任务结果
+        """
+        job = Job(kind, params)
+        with self._lock:
+            self._jobs[job.job_id] = job
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+
+        def runner():
+            job.status = RUNNING
+            try:
+                job.result = func(job)
+                job.progress = 1.0
+                job.status = SUCCEEDED
+            except Exception as e:
+                print(f"后台任务失败[{kind}]: {str(e)}\n{traceback.format_exc()}")
+                job.error = str(e)
+                job.status = FAILED
+            finally:
+                job.finished_at = time.time()
+
+        threading.Thread(target=runner, name=f"job-{kind}-{job.job_id[:8]}", daemon=True).start()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+
+job_registry = JobRegistry()
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_lock = threading.Lock()
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """
+    获取共享的计算进程池，进程数由 WORKER_PROCESSES 配置（0表示CPU核数）
+    """
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            workers = settings.WORKER_PROCESSES or os.cpu_count() or 1
+            _process_pool = ProcessPoolExecutor(max_workers=workers)
+        return _process_pool
@@ -0,0 +1,178 @@
+"""
+@fileoverview 密码哈希进程池
+@description 在专用的有界进程池中执行bcrypt密码校验与哈希，异步等待结果，队列已满时拒绝并记录队列深度等指标；
+             登录成功后对算法或强度已过时的密码哈希在后台重新哈希
+@author muelovo
+@version 1.0.0
+@date 2026-10-18
+@license MIT
+@copyright © 2025 muelovo. All rights reserved.
+"""
+
+import asyncio
+import math
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.core import security
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.models.user import User
+
+
+class PasswordPoolBusy(Exception):
+    """
+    密码进程池排队已满，retry_after_ms 为建议的重试间隔
+    """
+
+    def __init__(self, retry_after_ms: float):
+        super().__init__("请求过多，请稍后重试")
+        self.detail = "请求过多，请稍后重试"
+        self.retry_after_ms = max(1, int(retry_after_ms))
+
+    @property
+    def retry_after_seconds(self) -> int:
+        return max(1, math.ceil(self.retry_after_ms / 1000))
+
+
+def _timed(func: Callable[..., Any], *args: Any) -> Tuple[Any, float]:
+    """
+    在子进程中执行并返回结果与计算耗时（毫秒），耗时不含排队时间
+    """
+    started = time.perf_counter()
+    result = func(*args)
+    return result, (time.perf_counter() - started) * 1000
+
+
+class PasswordHasherPool:
+    """
+    密码哈希进程池
+
+    bcrypt校验是纯CPU计算，放在独立进程中执行，不占用Web进程的事件循环与线程池；
+    同时提交的任务数不超过 进程数 + 排队上限，超出时抛出 PasswordPoolBusy。
+    """
+
+    def __init__(self, workers: int, queue_size: int):
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.queue_size = max(0, queue_size)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._max_in_flight = 0
+        self._completed = 0
+        self._rejected = 0
+        self._failed = 0
+        # 单次计算耗时的指数移动平均（毫秒），用于估算重试间隔
+        self._service_ms = 200.0
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    def _reset_executor(self, broken: ProcessPoolExecutor) -> None:
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+        broken.shutdown(wait=False)
+
+    def _acquire(self) -> None:
+        with self._lock:
+            if self._in_flight >= self.workers + self.queue_size:
+                self._rejected += 1
+                waves = self._in_flight // self.workers + 1
+                raise PasswordPoolBusy(waves * self._service_ms)
+            self._in_flight += 1
+            self._max_in_flight = max(self._max_in_flight, self._in_flight)
+
+    def _release(self, elapsed_ms: Optional[float]) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            if elapsed_ms is None:
+                self._failed += 1
+            else:
+                self._completed += 1
+                self._service_ms = self._service_ms * 0.9 + elapsed_ms * 0.1
+
+    async def _run(self, func: Callable[..., Any], *args: Any) -> Any:
+        self._acquire()
+        elapsed_ms = None
+        try:
+            executor = self.executor
+            try:
+                result, elapsed_ms = await asyncio.wrap_future(executor.submit(_timed, func, *args))
+            except BrokenProcessPool:
+                # 子进程异常退出后进程池不可再用，重建后重试一次
+                self._reset_executor(executor)
+                result, elapsed_ms = await asyncio.wrap_future(self.executor.submit(_timed, func, *args))
+            return result
+        finally:
+            self._release(elapsed_ms)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(security.verify_password, plain_password, hashed_password)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(security.get_password_hash, password)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "in_flight": self._in_flight,
+                "queue_depth": max(0, self._in_flight - self.workers),
+                "max_in_flight": self._max_in_flight,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "failed": self._failed,
+                "avg_service_ms": round(self._service_ms, 1),
+            }
+
+
+password_pool = PasswordHasherPool(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    queue_size=settings.PASSWORD_HASH_QUEUE_SIZE,
+)
+
+
+def save_rehashed_password(user_id: int, old_hash: str, new_hash: str) -> bool:
+    """
+    仅当密码哈希仍为旧值时写入新哈希，避免覆盖期间修改过的密码
+    """
+    db = SessionLocal()
+    try:
+        updated = db.query(User).filter(
+            User.user_id == user_id,
+            User.password == old_hash
+        ).update({User.password: new_hash}, synchronize_session=False)
+        db.commit()
+        return updated > 0
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+async def rehash_password(user_id: int, old_hash: str, password: str) -> None:
+    """
+    登录成功后的后台任务：按当前配置重新哈希密码，进程池繁忙时跳过，下次登录再升级
+    """
+    try:
+        new_hash = await password_pool.hash(password)
+        if await run_in_threadpool(save_rehashed_password, user_id, old_hash, new_hash):
+            print(f"用户{user_id}的密码哈希已升级")
+    except PasswordPoolBusy:
+        print(f"密码进程池繁忙，跳过用户{user_id}的密码哈希升级")
+    except Exception as e:
+        print(f"升级密码哈希失败: {str(e)}\n{traceback.format_exc()}")
@@ -0,0 +1,266 @@
+"""
+@fileoverview 用户权限集缓存
+@description 按用户缓存编译后的权限代码集合、角色代码与超级管理员标记，带过期时间，并在用户、角色和权限变更时显式失效；
+             同时维护每个用户的权限版本号，供访问令牌中的权限声明判断是否已过期
+@author muelovo
+@version 1.0.0
+@date 2026-10-18
+@license MIT
+@copyright © 2025 muelovo. All rights reserved.
+"""
+
+import threading
+import time
+import uuid
+from typing import Dict, FrozenSet, Iterable, Optional
+
+from sqlalchemy.orm import Session, joinedload
+
+from app.core.config import settings
+from app.models.role import Role
+from app.models.user import User
+
+try:
+    import redis
+except ImportError:  # Redis为可选依赖
+    redis = None
+
+SUPER_ADMIN_ROLE = "SUPER_ADMIN"
+SUPER_ADMIN_USERNAME = "admin"
+
+
+class PermissionSet:
+    """
+    一个用户编译后的权限信息，只包含启用状态的角色及其启用状态的权限
+    """
+
+    __slots__ = ("user_id", "username", "active", "is_super_admin", "codes", "role_codes", "loaded_at")
+
+    def __init__(
+        self,
+        user_id: int,
+        username: str,
+        active: bool,
+        is_super_admin: bool,
+        codes: FrozenSet[str],
+        role_codes: FrozenSet[str],
+    ):
+        self.user_id = user_id
+        self.username = username
+        self.active = active
+        self.is_super_admin = is_super_admin
+        self.codes = codes
+        self.role_codes = role_codes
+        self.loaded_at = time.monotonic()
+
+    def allows(self, required_permissions: Optional[Iterable[str]]) -> bool:
+        """
+        拥有任一所需权限即通过，超级管理员拥有全部权限
+        """
+        if not required_permissions or self.is_super_admin:
+            return True
+        return any(code in self.codes for code in required_permissions)
+
+    @classmethod
+    def from_user(cls, user: User) -> "PermissionSet":
+        codes = set()
+        role_codes = set()
+        for role in user.roles or []:
+            if not role.status:
+                continue
+            role_codes.add(role.role_code)
+            for permission in role.permissions or []:
+                if permission.status:
+                    codes.add(permission.permission_code)
+        return cls(
+            user_id=user.user_id,
+            username=user.username,
+            active=bool(user.status),
+            is_super_admin=user.username == SUPER_ADMIN_USERNAME or SUPER_ADMIN_ROLE in role_codes,
+            codes=frozenset(codes),
+            role_codes=frozenset(role_codes),
+        )
+
+
+class MemoryVersionBackend:
+    """
+    进程内的权限版本号，纪元在进程启动时随机生成，重启后之前签发的版本全部失配
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._epoch = uuid.uuid4().hex[:8]
+        self._global = 0
+        self._users: Dict[int, int] = {}
+
+    def current(self, user_id: int) -> str:
+        return f"{self._epoch}.{self._global}.{self._users.get(user_id, 0)}"
+
+    def bump_users(self, user_ids: Iterable[int]) -> None:
+        with self._lock:
+            for user_id in user_ids:
+                self._users[user_id] = self._users.get(user_id, 0) + 1
+
+    def bump_all(self) -> None:
+        with self._lock:
+            self._global += 1
+
+
+class RedisVersionBackend:
+    """
+    Redis中的权限版本号，供多进程部署共享；纪元键丢失（如Redis清空）时重新生成
+    """
+
+    EPOCH_KEY = "permission:version:epoch"
+    GLOBAL_KEY = "permission:version:global"
+
+    def __init__(self, url: str):
+        self._client = redis.Redis.from_url(url)
+
+    @staticmethod
+    def _user_key(user_id: int) -> str:
+        return f"permission:version:user:{user_id}"
+
+    def current(self, user_id: int) -> str:
+        epoch, version, user_version = self._client.mget(self.EPOCH_KEY, self.GLOBAL_KEY, self._user_key(user_id))
+        if epoch is None:
+            self._client.set(self.EPOCH_KEY, uuid.uuid4().hex[:8], nx=True)
+            epoch = self._client.get(self.EPOCH_KEY)
+        return f"{epoch.decode()}.{int(version or 0)}.{int(user_version or 0)}"
+
+    def bump_users(self, user_ids: Iterable[int]) -> None:
+        pipe = self._client.pipeline()
+        for user_id in user_ids:
+            pipe.incr(self._user_key(user_id))
+        pipe.execute()
+
+    def bump_all(self) -> None:
+        self._client.incr(self.GLOBAL_KEY)
+
+
+class PermissionVersions:
+    """
+    用户权限版本号，格式为 "纪元.全局版本.用户版本"
+
+    用户状态或角色变化时递增该用户的版本，角色或权限变化时递增全局版本；
+    令牌中的版本与当前版本不一致时权限声明作废，改为按数据库校验。
+    进程内存储只在单进程部署下能让其他进程得知撤销，多进程部署需配置 PERMISSION_VERSION_URL。
+    """
+
+    def __init__(self):
+        self._backend = None
+        self._backend_lock = threading.Lock()
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            with self._backend_lock:
+                if self._backend is None:
+                    self._backend = self._create_backend()
+        return self._backend
+
+    @staticmethod
+    def _create_backend():
+        if settings.PERMISSION_VERSION_URL:
+            if redis is None:
+                print("未安装redis，权限版本号退回进程内存储")
+            else:
+                return RedisVersionBackend(settings.PERMISSION_VERSION_URL)
+        return MemoryVersionBackend()
+
+    def current(self, user_id: int) -> Optional[str]:
+        """
+        返回用户当前的权限版本，存储不可用时返回None（视为失配）
+        """
+        try:
+            return self.backend.current(user_id)
+        except Exception as e:
+            print(f"读取权限版本失败: {str(e)}")
+            return None
+
+    def bump_users(self, user_ids: Iterable[int]) -> None:
+        try:
+            self.backend.bump_users(user_ids)
+        except Exception as e:
+            print(f"更新权限版本失败: {str(e)}")
+
+    def bump_all(self) -> None:
+        try:
+            self.backend.bump_all()
+        except Exception as e:
+            print(f"更新权限版本失败: {str(e)}")
+
+
+permission_versions = PermissionVersions()
+
+
+class PermissionCache:
+    """
+    进程内的用户权限集缓存
+
+    变更接口在提交后调用 invalidate_user / invalidate_all；多进程部署时其他进程依靠过期时间刷新。
+    PERMISSION_CACHE_TTL_SECONDS 为0时不缓存，每次都查询数据库。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[int, PermissionSet] = {}
+        # 每次失效递增，加载期间发生过失效的结果不写入缓存
+        self._generation = 0
+
+    def get(self, db: Session, user_id: int) -> Optional[PermissionSet]:
+        """
+        返回用户的权限集，用户不存在时返回None
+        """
+        ttl = settings.PERMISSION_CACHE_TTL_SECONDS
+        with self._lock:
+            entry = self._entries.get(user_id)
+            generation = self._generation
+        if entry is not None and time.monotonic() - entry.loaded_at < ttl:
+            return entry
+
+        user = (
+            db.query(User)
+            .options(joinedload(User.roles).joinedload(Role.permissions))
+            .filter(User.user_id == user_id)
+            .first()
+        )
+        if user is None:
+            return None
+        entry = PermissionSet.from_user(user)
+        if ttl > 0:
+            with self._lock:
+                if generation == self._generation:
+                    self._entries[user_id] = entry
+                    if len(self._entries) > settings.PERMISSION_CACHE_MAX_ENTRIES:
+                        # 先清理过期的记录，仍然过多时按加载时间淘汰最早的一半
+                        now = time.monotonic()
+                        self._entries = {
+                            uid: e for uid, e in self._entries.items() if now - e.loaded_at < ttl
+                        }
+                        if len(self._entries) > settings.PERMISSION_CACHE_MAX_ENTRIES:
+                            keep = sorted(self._entries.values(), key=lambda e: e.loaded_at)
+                            self._entries = {e.user_id: e for e in keep[len(keep) // 2:]}
+        return entry
+
+    def invalidate_user(self, *user_ids: int) -> None:
+        """
+        用户信息（状态、密码等）、角色变化或用户被删除后调用
+        """
+        with self._lock:
+            self._generation += 1
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+        permission_versions.bump_users(user_ids)
+
+    def invalidate_all(self) -> None:
+        """
+        角色或权限变化（启用状态、角色代码、角色的权限）后调用，影响所有拥有该角色的用户
+        """
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+        permission_versions.bump_all()
+
+
+permission_cache = PermissionCache()
@@ -0,0 +1,148 @@
+"""
+@fileoverview 访问令牌中的权限声明
+@description 签发令牌时写入权限位图、角色代码与权限版本号，只读请求鉴权时校验版本后直接按位判断，不访问数据库
+@author muelovo
+@version 1.0.0
+@date 2026-10-18
+@license MIT
+@copyright © 2025 muelovo. All rights reserved.
+"""
+
+import threading
+import time
+from typing import Any, Dict, FrozenSet, Iterable, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.permission_cache import PermissionSet, permission_cache, permission_versions
+from app.models.role import Permission
+
+# 令牌中的声明名称
+CLAIM_VERSION = "pv"
+CLAIM_PERMISSIONS = "perm"
+CLAIM_ROLES = "roles"
+CLAIM_SUPER_ADMIN = "sa"
+
+
+class PermissionCatalog:
+    """
+    权限代码到位图位置的映射，位置取权限ID，同一权限在不同进程中位置一致
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bits: Dict[str, int] = {}
+        self._masks: Dict[Tuple[str, ...], int] = {}
+        self._loaded_at: Optional[float] = None
+
+    def ensure(self, db: Session, force: bool = False) -> None:
+        """
+        映射未加载或已过期时从数据库重新加载
+        """
+        loaded_at = self._loaded_at
+        if not force and loaded_at is not None \
+                and time.monotonic() - loaded_at < settings.PERMISSION_CATALOG_TTL_SECONDS:
+            return
+        rows = db.query(Permission.permission_id, Permission.permission_code).all()
+        with self._lock:
+            self._bits = {row.permission_code: row.permission_id for row in rows}
+            self._masks = {}
+            self._loaded_at = time.monotonic()
+
+    def encode(self, db: Session, codes: Iterable[str]) -> int:
+        codes = list(codes)
+        if any(code not in self._bits for code in codes):
+            self.ensure(db, force=True)
+        bits = 0
+        for code in codes:
+            position = self._bits.get(code)
+            if position is not None:
+                bits |= 1 << position
+        return bits
+
+    def mask(self, codes: Iterable[str]) -> int:
+        """
+        所需权限代码对应的位掩码，按代码组合记忆；不存在的权限代码不占位
+        """
+        key = tuple(codes)
+        mask = self._masks.get(key)
+        if mask is None:
+            mask = 0
+            for code in key:
+                position = self._bits.get(code)
+                if position is not None:
+                    mask |= 1 << position
+            self._masks[key] = mask
+        return mask
+
+
+permission_catalog = PermissionCatalog()
+
+
+class TokenPermissionSet(PermissionSet):
+    """
+    由令牌权限声明还原的权限集，鉴权为一次位与运算
+    """
+
+    __slots__ = ("bits",)
+
+    def __init__(self, user_id: int, is_super_admin: bool, bits: int, role_codes: FrozenSet[str]):
+        super().__init__(
+            user_id=user_id,
+            username="",
+            active=True,
+            is_super_admin=is_super_admin,
+            codes=frozenset(),
+            role_codes=role_codes,
+        )
+        self.bits = bits
+
+    def allows(self, required_permissions: Optional[Iterable[str]]) -> bool:
+        if not required_permissions or self.is_super_admin:
+            return True
+        return bool(permission_catalog.mask(required_permissions) & self.bits)
+
+
+def build_claims(db: Session, user_id: int) -> Optional[Dict[str, Any]]:
+    """
+    签发令牌时附加的权限声明，未开启或无法取得版本号时返回None（令牌不携带权限声明）
+    """
+    if not settings.ACCESS_TOKEN_PERMISSION_CLAIMS:
+        return None
+    # 先读版本再读权限，两者之间发生的变更会使该版本立即失配
+    version = permission_versions.current(user_id)
+    if version is None:
+        return None
+    permissions = permission_cache.get(db, user_id)
+    if permissions is None or not permissions.active:
+        return None
+    permission_catalog.ensure(db)
+    return {
+        CLAIM_VERSION: version,
+        CLAIM_PERMISSIONS: format(permission_catalog.encode(db, permissions.codes), "x"),
+        CLAIM_ROLES: sorted(permissions.role_codes),
+        CLAIM_SUPER_ADMIN: permissions.is_super_admin,
+    }
+
+
+def permissions_from_claims(db: Session, user_id: int, payload: Dict[str, Any]) -> Optional[TokenPermissionSet]:
+    """
+    校验令牌中的权限版本，与当前版本一致时返回权限集，否则返回None由调用方按数据库校验
+    """
+    if not settings.ACCESS_TOKEN_PERMISSION_CLAIMS:
+        return None
+    version = payload.get(CLAIM_VERSION)
+    if not version or version != permission_versions.current(user_id):
+        return None
+    try:
+        bits = int(payload.get(CLAIM_PERMISSIONS) or "0", 16)
+    except (TypeError, ValueError):
+        return None
+    permission_catalog.ensure(db)
+    return TokenPermissionSet(
+        user_id=user_id,
+        is_super_admin=bool(payload.get(CLAIM_SUPER_ADMIN)),
+        bits=bits,
+        role_codes=frozenset(payload.get(CLAIM_ROLES) or ()),
+    )
@@ -0,0 +1,167 @@
+"""
+@fileoverview 学生GPA排名
+@description 基于学分与GPA汇总按学期缓存列式快照，按院系、班级、年级筛选出的群体向量化计算名次与百分位
+@author muelovo
+@version 1.0.0
+@date 2026-10-18
+@license MIT
+@copyright © 2025 muelovo. All rights reserved.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.enrollment import StudentGpa, StudentSemesterGpa
+from app.models.student import Student
+from app.models.user import User
+
+# 排名方式：standard 并列占用名次（1,2,2,4），dense 并列不占用名次（1,2,2,3）
+RANK_STANDARD = "standard"
+RANK_DENSE = "dense"
+RANK_MODES = (RANK_STANDARD, RANK_DENSE)
+
+
+class RankingSnapshot:
+    """
+    一个学期（或全部学期）已有成绩学生的列式数据，按GPA降序、已修学分降序、学号升序排列
+    """
+
+    def __init__(self, rows: Iterable[Any]):
+        rows = list(rows)
+        self.created_at = time.monotonic()
+        self.student_id = np.asarray([row.student_id for row in rows], dtype=np.int64)
+        self.student_no = np.asarray([row.student_no for row in rows], dtype=object)
+        self.student_name = np.asarray([row.real_name for row in rows], dtype=object)
+        self.dept_id = np.asarray([row.dept_id if row.dept_id is not None else -1 for row in rows], dtype=np.int64)
+        self.class_name = np.asarray([row.class_name or "" for row in rows], dtype=object)
+        self.grade = np.asarray([row.grade if row.grade is not None else -1 for row in rows], dtype=np.int64)
+        self.gpa = np.asarray([float(row.gpa) for row in rows], dtype=np.float64)
+        self.credits_attempted = np.asarray([float(row.credits_attempted) for row in rows], dtype=np.float64)
+        self.credits_earned = np.asarray([float(row.credits_earned) for row in rows], dtype=np.float64)
+        # np.lexsort 以最后一个键为第一关键字，学号先转为整数编码
+        no_codes = np.unique(self.student_no.astype(str), return_inverse=True)[1] if rows else np.zeros(0, dtype=np.int64)
+        order = np.lexsort((no_codes, -self.credits_attempted, -self.gpa))
+        for field in ("student_id", "student_no", "student_name", "dept_id", "class_name", "grade",
+                      "gpa", "credits_attempted", "credits_earned"):
+            setattr(self, field, getattr(self, field)[order])
+        # 同一快照上不同群体的排名结果
+        self.results: "OrderedDict[Tuple[Any, ...], Dict[str, np.ndarray]]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def cohort_mask(self, dept_id: Optional[int], class_name: Optional[str], grade: Optional[int]) -> np.ndarray:
+        mask = np.ones(len(self.student_id), dtype=bool)
+        if dept_id:
+            mask &= self.dept_id == dept_id
+        if class_name:
+            mask &= self.class_name == class_name
+        if grade:
+            mask &= self.grade == grade
+        return mask
+
+    def rank(self, dept_id: Optional[int], class_name: Optional[str], grade: Optional[int], mode: str) -> Dict[str, np.ndarray]:
+        """
+        返回群体内学生在快照中的下标及其名次和百分位，按名次排列
+        """
+        key = (dept_id, class_name, grade, mode)
+        with self.lock:
+            cached = self.results.get(key)
+            if cached is not None:
+                self.results.move_to_end(key)
+                return cached
+
+        index = np.flatnonzero(self.cohort_mask(dept_id, class_name, grade))
+        result = rank_gpa(self.gpa[index], mode)
+        result["index"] = index
+
+        with self.lock:
+            self.results[key] = result
+            while len(self.results) > settings.RANKING_CACHE_MAX_COHORTS:
+                self.results.popitem(last=False)
+        return result
+
+
+def rank_gpa(gpa: np.ndarray, mode: str = RANK_STANDARD) -> Dict[str, np.ndarray]:
+    """
+    按GPA从高到低计算一组学生的名次与百分位
+
+    百分位为 (GPA低于该生的人数 + 并列人数的一半) / 群体人数 * 100
+    """
+    n = len(gpa)
+    if n == 0:
+        return {"rank": np.zeros(0, dtype=np.int64), "percentile": np.zeros(0, dtype=np.float64)}
+    neg = -gpa
+    ordered = np.sort(neg)
+    left = np.searchsorted(ordered, neg, side="left")
+    right = np.searchsorted(ordered, neg, side="right")
+    if mode == RANK_DENSE:
+        rank = np.searchsorted(np.unique(neg), neg) + 1
+    else:
+        rank = left + 1
+    percentile = np.round(((n - right) + 0.5 * (right - left)) / n * 100, 2)
+    return {"rank": rank.astype(np.int64), "percentile": percentile}
+
+
+class RankingCache:
+    """
+    按学期缓存排名快照，成绩汇总变化时失效；学生院系、班级等信息变化依靠过期时间刷新
+    """
+
+    ALL_SEMESTERS = "*"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshots: Dict[str, RankingSnapshot] = {}
+        # 每次失效递增，加载期间发生过失效的快照不写入缓存
+        self._generation = 0
+
+    def get(self, db: Session, semester: Optional[str]) -> RankingSnapshot:
+        key = semester or self.ALL_SEMESTERS
+        with self._lock:
+            snapshot = self._snapshots.get(key)
+            generation = self._generation
+        if snapshot is not None and time.monotonic() - snapshot.created_at < settings.RANKING_CACHE_TTL_SECONDS:
+            return snapshot
+
+        snapshot = RankingSnapshot(self._load(db, semester))
+        with self._lock:
+            if generation == self._generation:
+                self._snapshots[key] = snapshot
+        return snapshot
+
+    @staticmethod
+    def _load(db: Session, semester: Optional[str]):
+        model = StudentSemesterGpa if semester else StudentGpa
+        query = db.query(
+            model.student_id, model.gpa, model.credits_attempted, model.credits_earned,
+            Student.student_no, Student.dept_id, Student.class_name, Student.grade, User.real_name
+        ).join(
+            Student, Student.student_id == model.student_id
+        ).join(
+            User, User.user_id == Student.user_id
+        ).filter(model.credits_attempted > 0)
+        if semester:
+            query = query.filter(StudentSemesterGpa.semester == semester)
+        return query.all()
+
+    def invalidate(self, semesters: Iterable[Optional[str]] = ()) -> None:
+        """
+        成绩汇总变化后调用，同时失效涉及的学期与全部学期的快照；不指定学期时全部失效
+        """
+        semesters = list(semesters)
+        with self._lock:
+            self._generation += 1
+            if not semesters:
+                self._snapshots.clear()
+                return
+            self._snapshots.pop(self.ALL_SEMESTERS, None)
+            for semester in semesters:
+                self._snapshots.pop(semester or self.ALL_SEMESTERS, None)
+
+
+ranking_cache = RankingCache()
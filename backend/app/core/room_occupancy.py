@@ -0,0 +1,227 @@
+"""
+@fileoverview 教室占用位图
+@description 按学期维护 教室 × 星期 × 5分钟时段 × 周次 的占用位图，空闲教室查询只需对每个教室做一次按位与
+@author muelovo
+@version 1.0.0
+@date 2026-10-18
+@license MIT
+@copyright © 2025 muelovo. All rights reserved.
+"""
+
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.schedule_index import DAY_MINUTES
+from app.core.schedule_time import resolve_minutes
+from app.core.week_mask import MAX_WEEK, WeekMask
+from app.models.course import CourseOffering, Schedule
+from sqlalchemy.orm import Session
+
+# 时段粒度（分钟）与一天的时段数
+SLOT_MINUTES = 5
+SLOTS_PER_DAY = DAY_MINUTES // SLOT_MINUTES
+
+# 单个时段内全部周次都被置位的掩码
+ALL_WEEKS = (1 << MAX_WEEK) - 1
+
+
+def slot_range(start_minutes: int, end_minutes: int) -> Tuple[int, int]:
+    """
+    将 [开始分钟, 结束分钟) 转换为覆盖它的时段区间 [first, last)
+    """
+    first = max(0, start_minutes // SLOT_MINUTES)
+    last = min(SLOTS_PER_DAY, -(-end_minutes // SLOT_MINUTES))
+    return first, max(first, last)
+
+
+def occupancy_bits(start_minutes: int, end_minutes: int, weeks_mask: int) -> int:
+    """
+    生成一天内的占用位图，第 slot 个时段的第 n 周对应第 slot * 64 + n - 1 位
+
+    周次掩码乘以 "每64位一个1" 的重复数，即可一次性复制到连续的多个时段
+    """
+    first, last = slot_range(start_minutes, end_minutes)
+    if first >= last or not weeks_mask:
+        return 0
+    count = last - first
+    repeat = ((1 << (MAX_WEEK * count)) - 1) // ALL_WEEKS
+    return ((int(weeks_mask) & ALL_WEEKS) * repeat) << (MAX_WEEK * first)
+
+
+class _SemesterOccupancy:
+    """
+    单个学期（None表示全部学期）的占用位图
+    """
+
+    __slots__ = ("bitmaps", "entries", "loaded_at")
+
+    def __init__(self):
+        # (教室ID, 星期) -> 占用位图
+        self.bitmaps: Dict[Tuple[int, int], int] = {}
+        # 排课ID -> (教室ID, 星期, 开始分钟, 结束分钟, 周次掩码)，用于删除后重算
+        self.entries: Dict[int, Tuple[int, int, int, int, int]] = {}
+        self.loaded_at = time.monotonic()
+
+    def add(self, schedule_id: int, classroom_id: int, day: int, start: int, end: int, mask: int) -> None:
+        self.entries[schedule_id] = (classroom_id, day, start, end, mask)
+        key = (classroom_id, day)
+        self.bitmaps[key] = self.bitmaps.get(key, 0) | occupancy_bits(start, end, mask)
+
+    def rebuild(self, key: Tuple[int, int], exclude_id: Optional[int] = None) -> int:
+        """
+        按排课记录重算某教室某天的位图，可排除指定排课
+        """
+        bitmap = 0
+        for schedule_id, (classroom_id, day, start, end, mask) in self.entries.items():
+            if (classroom_id, day) == key and schedule_id != exclude_id:
+                bitmap |= occupancy_bits(start, end, mask)
+        return bitmap
+
+    def remove(self, schedule_id: int) -> None:
+        entry = self.entries.pop(schedule_id, None)
+        if entry is None:
+            return
+        # 不同排课的位可能重叠（历史冲突数据），因此按剩余排课重算该教室当天的位图
+        key = (entry[0], entry[1])
+        bitmap = self.rebuild(key)
+        if bitmap:
+            self.bitmaps[key] = bitmap
+        else:
+            self.bitmaps.pop(key, None)
+
+
+class RoomOccupancyIndex:
+    """
+    进程内教室占用位图
+
+    学期位图在首次查询时从数据库加载，之后由排课写操作增量维护；
+    超过TTL会重新加载，与排课冲突索引保持相同的一致性策略。
+    """
+
+    def __init__(self, ttl_seconds: int = 300):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.RLock()
+        self._semesters: Dict[Optional[str], _SemesterOccupancy] = {}
+        self._generation = 0
+
+    def free_classrooms(
+        self,
+        db: Session,
+        classroom_ids: Iterable[int],
+        day_of_week: int,
+        start_minutes: int,
+        end_minutes: int,
+        weeks_mask: int,
+        semester: Optional[str] = None,
+        exclude_schedule_id: Optional[int] = None,
+    ) -> List[int]:
+        """
+        从候选教室中筛选出在给定星期、时间段和周次内完全空闲的教室，保持候选顺序
+        exclude_schedule_id 用于调整已有排课时忽略其自身的占用
+        """
+        query_bits = occupancy_bits(start_minutes, end_minutes, weeks_mask)
+        occupancy = self._get_semester(db, semester)
+        with self._lock:
+            bitmaps = occupancy.bitmaps
+            excluded_room, excluded_bitmap = None, 0
+            entry = occupancy.entries.get(exclude_schedule_id)
+            if entry is not None and entry[1] == day_of_week:
+                excluded_room = entry[0]
+                excluded_bitmap = occupancy.rebuild((entry[0], entry[1]), exclude_schedule_id)
+            return [
+                classroom_id for classroom_id in classroom_ids
+                if not (
+                    excluded_bitmap if classroom_id == excluded_room
+                    else bitmaps.get((classroom_id, day_of_week), 0)
+                ) & query_bits
+            ]
+
+    def record(self, schedule: Schedule, semester: Optional[str]) -> None:
+        """
+        排课写入（新增或更新）后同步位图，只更新已加载的学期
+        """
+        start = resolve_minutes(schedule.start_minutes, schedule.start_time)
+        end = resolve_minutes(schedule.end_minutes, schedule.end_time)
+        if start is None or end is None:
+            start, end = 0, DAY_MINUTES
+        mask = int(WeekMask.resolve(schedule.weeks_mask, schedule.weeks))
+        with self._lock:
+            self._generation += 1
+            for key in {semester, None}:
+                occupancy = self._semesters.get(key)
+                if occupancy is None:
+                    continue
+                occupancy.remove(schedule.schedule_id)
+                if schedule.classroom_id is not None:
+                    occupancy.add(
+                        schedule.schedule_id, int(schedule.classroom_id), int(schedule.day_of_week),
+                        start, end, mask
+                    )
+
+    def discard(self, schedule_id: int) -> None:
+        """
+        排课删除后从位图中移除
+        """
+        with self._lock:
+            self._generation += 1
+            for occupancy in self._semesters.values():
+                occupancy.remove(schedule_id)
+
+    def invalidate(self, semester: Optional[str] = None) -> None:
+        """
+        丢弃指定学期（或全部）的位图，下次查询时重新加载
+        """
+        with self._lock:
+            self._generation += 1
+            if semester is None:
+                self._semesters.clear()
+            else:
+                self._semesters.pop(semester, None)
+                self._semesters.pop(None, None)
+
+    def _get_semester(self, db: Session, semester: Optional[str]) -> _SemesterOccupancy:
+        with self._lock:
+            occupancy = self._semesters.get(semester)
+            if occupancy is not None and time.monotonic() - occupancy.loaded_at < self.ttl_seconds:
+                return occupancy
+
+        # 加载期间若有写操作，重新加载一次以免漏掉刚提交的排课
+        for _ in range(2):
+            with self._lock:
+                generation = self._generation
+            occupancy = self._load(db, semester)
+            with self._lock:
+                if generation == self._generation:
+                    break
+        with self._lock:
+            self._semesters[semester] = occupancy
+            return occupancy
+
+    def _load(self, db: Session, semester: Optional[str]) -> _SemesterOccupancy:
+        query = db.query(
+            Schedule.schedule_id, Schedule.classroom_id, Schedule.day_of_week,
+            Schedule.start_time, Schedule.end_time, Schedule.start_minutes, Schedule.end_minutes,
+            Schedule.weeks, Schedule.weeks_mask
+        ).filter(Schedule.classroom_id.isnot(None))
+        if semester is not None:
+            query = query.join(
+                CourseOffering, Schedule.offering_id == CourseOffering.offering_id
+            ).filter(CourseOffering.semester == semester)
+
+        occupancy = _SemesterOccupancy()
+        for row in query.all():
+            start = resolve_minutes(row.start_minutes, row.start_time)
+            end = resolve_minutes(row.end_minutes, row.end_time)
+            if start is None or end is None:
+                # 时间无法解析时保守地视为整天占用
+                start, end = 0, DAY_MINUTES
+            occupancy.add(
+                row.schedule_id, row.classroom_id, row.day_of_week,
+                start, end, int(WeekMask.resolve(row.weeks_mask, row.weeks))
+            )
+        return occupancy
+
+
+room_occupancy = RoomOccupancyIndex(ttl_seconds=settings.SCHEDULE_INDEX_TTL_SECONDS)
@@ -0,0 +1,291 @@
+"""
+@fileoverview 排课冲突区间索引
+@description 按(学期, 资源, 星期)维护排课的开始/结束分钟与周次位掩码(WeekMask)，提供对数时间的冲突查询
+@author muelovo
+@version 1.0.0
+@date 2026-10-18
+@license MIT
+@copyright © 2025 muelovo. All rights reserved.
+"""
+
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.core.schedule_time import resolve_minutes
+from app.core.week_mask import WeekMask
+from app.models.course import CourseOffering, Schedule
+from sqlalchemy.orm import Session
+
+# 资源类型
+CLASSROOM = "classroom"
+TEACHER = "teacher"
+
+# 一天的分钟数，无法解析时间的排课按整天占用处理
+DAY_MINUTES = 24 * 60
+
+BucketKey = Tuple[Optional[str], str, int, int]
+
+
+def find_overlapping_pairs(intervals: Iterable[Tuple[int, int, int, int]]) -> Iterator[Tuple[int, int]]:
+    """
+    扫描线检测同一资源同一天内相互冲突的排课
+    intervals 为 (开始分钟, 结束分钟, 周次掩码, 排课ID)，返回冲突的排课ID对
+    复杂度为 O(n log n + k)，k 为时间上重叠的区间对数
+    """
+    active: List[Tuple[int, int, int]] = []
+    for start, end, mask, schedule_id in sorted(intervals):
+        # 移除已经结束的区间
+        active = [item for item in active if item[0] > start]
+        for other_end, other_mask, other_id in active:
+            if other_mask & mask:
+                yield other_id, schedule_id
+        active.append((end, mask, schedule_id))
+
+
+class IntervalBucket:
+    """
+    单个(学期, 资源, 星期)下的排课区间，按开始分钟有序存放
+    """
+
+    __slots__ = ("starts", "entries", "max_span", "loaded_at")
+
+    def __init__(self):
+        self.starts: List[int] = []
+        # (开始分钟, 排课ID, 结束分钟, 周次掩码)
+        self.entries: List[Tuple[int, int, int, int]] = []
+        self.max_span = 0
+        self.loaded_at = time.monotonic()
+
+    def add(self, schedule_id: int, start: int, end: int, mask: int) -> None:
+        entry = (start, schedule_id, end, mask)
+        index = bisect_left(self.entries, entry)
+        self.entries.insert(index, entry)
+        self.starts.insert(index, start)
+        self.max_span = max(self.max_span, end - start)
+
+    def remove(self, schedule_id: int) -> None:
+        for index, entry in enumerate(self.entries):
+            if entry[1] == schedule_id:
+                del self.entries[index]
+                del self.starts[index]
+                return
+
+    def find(self, start: int, end: int, mask: int, exclude_id: Optional[int]) -> List[int]:
+        # 与[start, end)重叠的区间满足 e.start < end 且 e.end > start，
+        # 由于 e.end <= e.start + max_span，候选区间的开始分钟落在 (start - max_span, end) 内
+        lo = bisect_right(self.starts, start - self.max_span)
+        hi = bisect_left(self.starts, end)
+        conflicts = []
+        for entry_start, schedule_id, entry_end, entry_mask in self.entries[lo:hi]:
+            if schedule_id == exclude_id:
+                continue
+            if entry_end > start and entry_mask & mask:
+                conflicts.append(schedule_id)
+        return conflicts
+
+
+class ScheduleConflictIndex:
+    """
+    进程内排课冲突索引
+
+    桶在首次查询时从数据库加载，之后由排课写操作增量维护；
+    超过TTL的桶会重新加载，以便多进程部署下最终与数据库一致。
+    学期为None的桶对应不区分学期的查询。
+
+    多进程部署下缓存的桶可能缺少其他进程刚提交的排课，只适合读路径（课表、冲突检查、
+    教室推荐）；写路径应先锁定教室/教师行，再以 fresh=True 查询，从数据库重新加载对应的桶。
+    """
+
+    def __init__(self, ttl_seconds: int = 300):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.RLock()
+        self._buckets: Dict[BucketKey, IntervalBucket] = {}
+        self._locations: Dict[int, Set[BucketKey]] = {}
+        self._generation = 0
+
+    def find_conflicts(
+        self,
+        db: Session,
+        kind: str,
+        resource_id: int,
+        day_of_week: int,
+        start_minutes: int,
+        end_minutes: int,
+        weeks_mask: int,
+        semester: Optional[str] = None,
+        exclude_schedule_id: Optional[int] = None,
+        fresh: bool = False,
+    ) -> List[int]:
+        """
+        返回与给定时间段冲突的排课ID列表
+        fresh为True时不使用缓存，以加锁读从数据库重新加载该桶
+        """
+        if not weeks_mask or resource_id is None:
+            return []
+        key = (semester, kind, int(resource_id), int(day_of_week))
+        bucket = self._refresh_bucket(db, key) if fresh else self._get_bucket(db, key)
+        with self._lock:
+            return bucket.find(start_minutes, end_minutes, weeks_mask, exclude_schedule_id)
+
+    def record(
+        self,
+        schedule: Schedule,
+        semester: Optional[str],
+        teacher_id: Optional[int],
+    ) -> None:
+        """
+        排课写入（新增或更新）后同步索引，只更新已加载的桶
+        """
+        start = resolve_minutes(schedule.start_minutes, schedule.start_time)
+        end = resolve_minutes(schedule.end_minutes, schedule.end_time)
+        if start is None or end is None:
+            start, end = 0, DAY_MINUTES
+        mask = int(WeekMask.resolve(schedule.weeks_mask, schedule.weeks))
+        day = int(schedule.day_of_week)
+
+        with self._lock:
+            self._generation += 1
+            self._discard_locked(schedule.schedule_id)
+            targets = []
+            if schedule.classroom_id is not None:
+                targets.append((CLASSROOM, int(schedule.classroom_id)))
+            if teacher_id is not None:
+                targets.append((TEACHER, int(teacher_id)))
+            for kind, resource_id in targets:
+                for sem in {semester, None}:
+                    key = (sem, kind, resource_id, day)
+                    bucket = self._buckets.get(key)
+                    if bucket is None:
+                        continue
+                    bucket.add(schedule.schedule_id, start, end, mask)
+                    self._locations.setdefault(schedule.schedule_id, set()).add(key)
+
+    def discard(self, schedule_id: int) -> None:
+        """
+        排课删除后从索引中移除
+        """
+        with self._lock:
+            self._generation += 1
+            self._discard_locked(schedule_id)
+
+    def invalidate(self, kind: Optional[str] = None, resource_id: Optional[int] = None) -> None:
+        """
+        丢弃指定资源（或全部）的桶，下次查询时重新加载
+        """
+        with self._lock:
+            self._generation += 1
+            if kind is None:
+                self._buckets.clear()
+                self._locations.clear()
+                return
+            self._drop_buckets_locked(
+                [k for k in self._buckets if k[1] == kind and (resource_id is None or k[2] == resource_id)]
+            )
+
+    def invalidate_resources(self, resources: Iterable[Tuple[str, int]]) -> None:
+        """
+        批量丢弃多个 (资源类型, 资源ID) 的桶，只扫描一遍
+        """
+        targets = {(kind, int(resource_id)) for kind, resource_id in resources}
+        if not targets:
+            return
+        with self._lock:
+            self._generation += 1
+            self._drop_buckets_locked([k for k in self._buckets if (k[1], k[2]) in targets])
+
+    def _drop_buckets_locked(self, keys: List[BucketKey]) -> None:
+        # 只清理被丢弃桶中排课的位置记录，不扫描全部位置
+        for key in keys:
+            bucket = self._buckets.pop(key)
+            for _, schedule_id, _, _ in bucket.entries:
+                locations = self._locations.get(schedule_id)
+                if locations is not None:
+                    locations.discard(key)
+                    if not locations:
+                        del self._locations[schedule_id]
+
+    def _discard_locked(self, schedule_id: int) -> None:
+        for key in self._locations.pop(schedule_id, ()):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.remove(schedule_id)
+
+    def _get_bucket(self, db: Session, key: BucketKey) -> IntervalBucket:
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is not None and time.monotonic() - bucket.loaded_at < self.ttl_seconds:
+                return bucket
+
+        # 加载期间若有写操作，重新加载一次以免漏掉刚提交的排课
+        for _ in range(2):
+            with self._lock:
+                generation = self._generation
+            bucket = self._load_bucket(db, key)
+            with self._lock:
+                if generation == self._generation:
+                    break
+        with self._lock:
+            self._install_locked(key, bucket)
+            return bucket
+
+    def _refresh_bucket(self, db: Session, key: BucketKey) -> IntervalBucket:
+        with self._lock:
+            generation = self._generation
+        bucket = self._load_bucket(db, key, for_update=True)
+        with self._lock:
+            # 加载期间有写操作时只用于本次查询，不替换缓存
+            if generation == self._generation:
+                self._install_locked(key, bucket)
+        return bucket
+
+    def _install_locked(self, key: BucketKey, bucket: IntervalBucket) -> None:
+        old = self._buckets.get(key)
+        if old is not None:
+            for _, schedule_id, _, _ in old.entries:
+                keys = self._locations.get(schedule_id)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self._locations[schedule_id]
+        self._buckets[key] = bucket
+        for _, schedule_id, _, _ in bucket.entries:
+            self._locations.setdefault(schedule_id, set()).add(key)
+
+    def _load_bucket(self, db: Session, key: BucketKey, for_update: bool = False) -> IntervalBucket:
+        semester, kind, resource_id, day_of_week = key
+        query = db.query(
+            Schedule.schedule_id, Schedule.start_time, Schedule.end_time,
+            Schedule.start_minutes, Schedule.end_minutes, Schedule.weeks, Schedule.weeks_mask
+        ).filter(Schedule.day_of_week == day_of_week)
+
+        if kind == CLASSROOM:
+            query = query.filter(Schedule.classroom_id == resource_id)
+            if semester is not None:
+                query = query.join(
+                    CourseOffering, Schedule.offering_id == CourseOffering.offering_id
+                ).filter(CourseOffering.semester == semester)
+        else:
+            query = query.join(
+                CourseOffering, Schedule.offering_id == CourseOffering.offering_id
+            ).filter(CourseOffering.teacher_id == resource_id)
+            if semester is not None:
+                query = query.filter(CourseOffering.semester == semester)
+        if for_update:
+            # 加锁读总是读取最新已提交的数据，不受事务快照影响
+            query = query.with_for_update(read=True)
+
+        bucket = IntervalBucket()
+        for schedule_id, start_time, end_time, start_minutes, end_minutes, weeks, weeks_mask in query.all():
+            start = resolve_minutes(start_minutes, start_time)
+            end = resolve_minutes(end_minutes, end_time)
+            if start is None or end is None:
+                # 时间无法解析时保守地视为整天占用
+                start, end = 0, DAY_MINUTES
+            bucket.add(schedule_id, start, end, int(WeekMask.resolve(weeks_mask, weeks)))
+        return bucket
+
+
+schedule_index = ScheduleConflictIndex(ttl_seconds=settings.SCHEDULE_INDEX_TTL_SECONDS)
@@ -0,0 +1,50 @@
+"""
+@fileoverview 排课时间换算
+@description 排课时间与当天分钟数之间的转换，供模型写入和各查询路径共用
+@author muelovo
+@version 1.0.0
+@date 2026-10-18
+@license MIT
+@copyright © 2025 muelovo. All rights reserved.
+"""
+
+from datetime import datetime, timedelta
+from typing import Optional
+
+
+def time_to_minutes(value) -> Optional[int]:
+    """
+    将排课时间转换为当天的分钟数
+    支持 "HH:MM"/"HH:MM:SS" 字符串、timedelta（MySQL TIME 列）和 time/datetime 对象
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        parts = value.strip().split(":")
+        if len(parts) < 2:
+            return None
+        try:
+            return int(parts[0]) * 60 + int(parts[1])
+        except ValueError:
+            return None
+    if isinstance(value, timedelta):
+        return int(value.total_seconds()) // 60
+    if isinstance(value, datetime) or (hasattr(value, "hour") and hasattr(value, "minute")):
+        return value.hour * 60 + value.minute
+    return None
+
+
+def minutes_to_time(minutes: int) -> str:
+    """
+    将当天的分钟数转换为 "HH:MM"
+    """
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def resolve_minutes(stored_minutes: Optional[int], value) -> Optional[int]:
+    """
+    优先使用数据库中持久化的分钟数，历史数据（分钟数为空）退回解析时间值
+    """
+    if stored_minutes is not None:
+        return stored_minutes
+    return time_to_minutes(value)
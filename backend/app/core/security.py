@@ -9,14 +9,29 @@
 """
 
 from datetime import datetime, timedelta
-from typing import Any, Optional, Union
+from typing import Any, Dict, List, Optional, Union
 
 from app.core.config import settings
 from jose import jwt
 from passlib.context import CryptContext
 
+
+def build_crypt_context(schemes: List[str], rounds: Dict[str, int]) -> CryptContext:
+    """
+    根据配置创建密码上下文：第一个算法用于新哈希，其余算法只用于校验旧哈希；
+    配置了强度的算法，强度与配置不同的哈希都视为需要更新
+    """
+    options: Dict[str, Any] = {}
+    for scheme, value in rounds.items():
+        if scheme in schemes:
+            options[f"{scheme}__default_rounds"] = value
+            options[f"{scheme}__min_rounds"] = value
+            options[f"{scheme}__max_rounds"] = value
+    return CryptContext(schemes=schemes, deprecated="auto", **options)
+
+
 # 密码上下文
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = build_crypt_context(settings.PASSWORD_HASH_SCHEMES, settings.PASSWORD_HASH_ROUNDS)
 
 
 # 验证密码
@@ -29,9 +44,19 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
-# 创建JWT访问令牌
+# 密码哈希的算法或强度与当前配置不一致时需要重新哈希
+def password_needs_update(hashed_password: str) -> bool:
+    try:
+        return pwd_context.needs_update(hashed_password)
+    except ValueError:
+        return False
+
+
+# 创建JWT访问令牌，claims 为附加的声明（如权限声明）
 def create_access_token(
-    subject: Union[str, Any], expires_delta: Optional[timedelta] = None
+    subject: Union[str, Any],
+    expires_delta: Optional[timedelta] = None,
+    claims: Optional[Dict[str, Any]] = None,
 ) -> str:
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
@@ -39,7 +64,8 @@ def create_access_token(
         expire = datetime.utcnow() + timedelta(
             minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES
         )
-    to_encode = {"exp": expire, "sub": str(subject)}
+    to_encode = dict(claims or {})
+    to_encode.update({"exp": expire, "sub": str(subject)})
     encoded_jwt = jwt.encode(
         to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM
     )
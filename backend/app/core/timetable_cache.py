@@ -0,0 +1,254 @@
+"""
+@fileoverview 学生课程表缓存
+@description 按(学生, 学期)缓存物化后的课程表及其ETag，默认进程内存储，配置 TIMETABLE_CACHE_URL 后使用Redis共享；
+             每个失效标签带版本号，查询期间发生过失效的课程表不写入缓存
+@author muelovo
+@version 1.0.0
+@date 2026-10-18
+@license MIT
+@copyright © 2025 muelovo. All rights reserved.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.core.config import settings
+
+try:
+    import redis
+except ImportError:  # Redis为可选依赖
+    redis = None
+
+
+def make_etag(data: Any) -> str:
+    """
+    根据课程表内容生成ETag
+    """
+    payload = json.dumps(data, ensure_ascii=False, sort_keys=True, default=str)
+    return '"' + hashlib.sha1(payload.encode("utf-8")).hexdigest() + '"'
+
+
+class MemoryTimetableBackend:
+    """
+    进程内LRU存储，反向索引记录每个学生、每个开课关联的缓存键，标签版本号在每次失效时递增
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        # 键 -> (写入时间, 课表, 关联的标签)
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any], Tuple[str, ...]]]" = OrderedDict()
+        self._index: Dict[str, Set[str]] = {}
+        self._versions: Dict[str, int] = {}
+
+    def versions(self, tags: List[str]) -> List[int]:
+        with self._lock:
+            return [self._versions.get(tag, 0) for tag in tags]
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            if time.monotonic() - item[0] >= self.ttl_seconds:
+                self._drop_locked(key)
+                return None
+            self._entries.move_to_end(key)
+            return item[1]
+
+    def set(self, key: str, value: Dict[str, Any], versions: Dict[str, int]) -> bool:
+        with self._lock:
+            if any(self._versions.get(tag, 0) != version for tag, version in versions.items()):
+                return False
+            self._drop_locked(key)
+            self._entries[key] = (time.monotonic(), value, tuple(versions))
+            for tag in versions:
+                self._index.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop_locked(next(iter(self._entries)))
+            return True
+
+    def invalidate(self, tag: str) -> None:
+        with self._lock:
+            self._versions[tag] = self._versions.get(tag, 0) + 1
+            for key in list(self._index.get(tag, ())):
+                self._drop_locked(key)
+
+    def _drop_locked(self, key: str) -> None:
+        # 删除缓存项时同步从各标签的反向索引中移除，索引为空的标签一并删除
+        item = self._entries.pop(key, None)
+        if item is None:
+            return
+        for tag in item[2]:
+            keys = self._index.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._index[tag]
+
+
+class RedisTimetableBackend:
+    """
+    Redis存储，供多进程部署共享；反向索引使用集合保存，写入时 WATCH 标签版本号
+    """
+
+    def __init__(self, url: str, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self._client = redis.Redis.from_url(url)
+
+    @staticmethod
+    def _version_key(tag: str) -> str:
+        return f"{tag}:version"
+
+    def versions(self, tags: List[str]) -> List[int]:
+        if not tags:
+            return []
+        return [int(value or 0) for value in self._client.mget([self._version_key(tag) for tag in tags])]
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        value = self._client.get(key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key: str, value: Dict[str, Any], versions: Dict[str, int]) -> bool:
+        tags = list(versions)
+        version_keys = [self._version_key(tag) for tag in tags]
+        with self._client.pipeline() as pipe:
+            try:
+                # 版本号在 WATCH 之后被失效递增时事务不会执行
+                pipe.watch(*version_keys)
+                current = [int(v or 0) for v in pipe.mget(version_keys)] if version_keys else []
+                if current != [versions[tag] for tag in tags]:
+                    return False
+                pipe.multi()
+                pipe.set(key, json.dumps(value, ensure_ascii=False, default=str), ex=self.ttl_seconds)
+                for tag in tags:
+                    pipe.sadd(tag, key)
+                    pipe.expire(tag, self.ttl_seconds)
+                pipe.execute()
+                return True
+            except redis.WatchError:
+                return False
+
+    def invalidate(self, tag: str) -> None:
+        # 先递增版本号，使正在进行的重建不再写入，再删除已缓存的键
+        self._client.incr(self._version_key(tag))
+        keys = self._client.smembers(tag)
+        pipe = self._client.pipeline()
+        if keys:
+            pipe.delete(*keys)
+        pipe.delete(tag)
+        pipe.execute()
+
+
+class TimetableCache:
+    """
+    学生课程表缓存
+
+    缓存键为 (学生, 学期)，学期为空表示全部学期；
+    学生选课变化时按学生失效，开课的排课变化时按开课失效。
+    重建课程表前先用 versions 读取相关标签的版本号，set 时版本号已变化（查询期间发生过失效）则不写入。
+    """
+
+    def __init__(self):
+        self._backend = None
+        self._backend_lock = threading.Lock()
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            with self._backend_lock:
+                if self._backend is None:
+                    self._backend = self._create_backend()
+        return self._backend
+
+    def _create_backend(self):
+        ttl = settings.TIMETABLE_CACHE_TTL_SECONDS
+        if settings.TIMETABLE_CACHE_URL:
+            if redis is None:
+                print("未安装redis，课程表缓存退回进程内存储")
+            else:
+                return RedisTimetableBackend(settings.TIMETABLE_CACHE_URL, ttl)
+        return MemoryTimetableBackend(settings.TIMETABLE_CACHE_MAX_ENTRIES, ttl)
+
+    @staticmethod
+    def _key(student_id: int, semester: Optional[str]) -> str:
+        return f"timetable:{student_id}:{semester or '*'}"
+
+    @staticmethod
+    def _student_tag(student_id: int) -> str:
+        return f"timetable:student:{student_id}"
+
+    @staticmethod
+    def _offering_tag(offering_id: int) -> str:
+        return f"timetable:offering:{offering_id}"
+
+    def get(self, student_id: int, semester: Optional[str]) -> Optional[Dict[str, Any]]:
+        """
+        返回 {"etag": ..., "data": [...]}，未命中返回None
+        """
+        try:
+            return self.backend.get(self._key(student_id, semester))
+        except Exception as e:
+            print(f"读取课程表缓存失败: {str(e)}")
+            return None
+
+    def versions(
+        self,
+        student_id: Optional[int] = None,
+        offering_ids: Iterable[int] = (),
+    ) -> Optional[Dict[str, int]]:
+        """
+        读取学生及开课标签当前的版本号，存储不可用时返回None
+        """
+        tags = ([self._student_tag(student_id)] if student_id is not None else []) \
+            + [self._offering_tag(oid) for oid in set(offering_ids)]
+        try:
+            return dict(zip(tags, self.backend.versions(tags)))
+        except Exception as e:
+            print(f"读取课程表缓存版本失败: {str(e)}")
+            return None
+
+    def set(
+        self,
+        student_id: int,
+        semester: Optional[str],
+        data: List[Dict[str, Any]],
+        versions: Optional[Dict[str, int]],
+    ) -> Dict[str, Any]:
+        """
+        versions 需包含学生标签与该学生全部已选开课的标签，任一版本号变化时只返回不缓存
+        """
+        entry = {"etag": make_etag(data), "data": data}
+        if versions is None:
+            return entry
+        try:
+            self.backend.set(self._key(student_id, semester), entry, versions)
+        except Exception as e:
+            print(f"写入课程表缓存失败: {str(e)}")
+        return entry
+
+    def invalidate_student(self, student_id: int) -> None:
+        """
+        学生选课或退课后调用
+        """
+        self._invalidate(self._student_tag(student_id))
+
+    def invalidate_offering(self, offering_id: int) -> None:
+        """
+        开课的排课或授课教师变化后调用
+        """
+        self._invalidate(self._offering_tag(offering_id))
+
+    def _invalidate(self, tag: str) -> None:
+        try:
+            self.backend.invalidate(tag)
+        except Exception as e:
+            print(f"清除课程表缓存失败: {str(e)}")
+
+
+timetable_cache = TimetableCache()
@@ -0,0 +1,299 @@
+"""
+@fileoverview 自动排课求解器
+@description 基于贪心构造加局部搜索的排课算法，输入输出均为普通数据结构，可在子进程中运行
+@author muelovo
+@version 1.0.0
+@date 2026-10-18
+@license MIT
+@copyright © 2025 muelovo. All rights reserved.
+"""
+
+import math
+import random
+from bisect import bisect_left, insort
+from typing import Any, Dict, List, Optional, Tuple
+
+# 特殊教室，普通课程尽量不占用
+SPECIAL_ROOM_TYPES = ("实验室", "机房")
+
+# 代价权重
+SAME_DAY_PENALTY = 100      # 同一开课在同一天安排多次
+SPECIAL_ROOM_PENALTY = 50   # 占用特殊教室
+TEACHER_DAY_PENALTY = 5     # 教师当天已有课程数
+WASTE_PENALTY = 10          # 教室座位浪费比例
+UNASSIGNED_PENALTY = 10000  # 未能安排的课次
+
+
+def parse_slot(slot: str) -> Tuple[int, int]:
+    """
+    解析 "08:00-09:40" 形式的节次，返回开始和结束分钟
+    """
+    start_str, end_str = slot.split("-", 1)
+    start_hour, start_minute = map(int, start_str.strip().split(":"))
+    end_hour, end_minute = map(int, end_str.strip().split(":"))
+    return start_hour * 60 + start_minute, end_hour * 60 + end_minute
+
+
+def sessions_per_week(hours: int, weeks_count: int, hours_per_session: int = 2) -> int:
+    """
+    根据课程总学时计算每周需要安排的课次，每个节次按2学时计
+    """
+    if not hours or weeks_count <= 0:
+        return 1
+    return max(1, math.ceil(hours / (weeks_count * hours_per_session)))
+
+
+class _State:
+    """
+    求解过程中的占用状态，占用以 (资源ID, 节次下标) -> 周次掩码 记录
+    """
+
+    def __init__(self, problem: Dict[str, Any], rng: random.Random):
+        self.rng = rng
+        self.slots: List[Tuple[int, int, int]] = [tuple(slot) for slot in problem["slots"]]
+        self.rooms = sorted(problem["classrooms"], key=lambda room: (room["capacity"], room["classroom_id"]))
+        self.capacities = [room["capacity"] for room in self.rooms]
+        self.room_busy: Dict[Tuple[int, int], int] = {}
+        self.teacher_busy: Dict[Tuple[int, int], int] = {}
+        self.occupants: Dict[Tuple[int, int], List[int]] = {}
+        self.offering_days: Dict[int, Dict[int, int]] = {}
+        self.teacher_day_load: Dict[Tuple[int, int], int] = {}
+        self.placement: Dict[int, Tuple[int, int, float]] = {}
+        self.room_index = {room["classroom_id"]: index for index, room in enumerate(self.rooms)}
+
+        # 所有课次周次的并集，教室在某节次的占用覆盖该并集后不再参与查找
+        self.full_mask = 0
+        for offering in problem["offerings"]:
+            self.full_mask |= offering["weeks_mask"]
+        # 每个节次尚未占满的教室下标，按容量升序
+        self.open_rooms: List[List[int]] = [list(range(len(self.rooms))) for _ in self.slots]
+
+        # 已有排课按节次折算为占用
+        for kind, resource_id, day, start, end, mask in problem.get("busy", []):
+            target = self.room_busy if kind == "classroom" else self.teacher_busy
+            for slot_index, (slot_day, slot_start, slot_end) in enumerate(self.slots):
+                if slot_day == day and slot_start < end and slot_end > start:
+                    key = (resource_id, slot_index)
+                    target[key] = target.get(key, 0) | mask
+        for classroom_id, slot_index in list(self.room_busy):
+            self._close_if_full(classroom_id, slot_index)
+
+    def _close_if_full(self, classroom_id: int, slot_index: int) -> None:
+        index = self.room_index.get(classroom_id)
+        if index is None or self.room_busy.get((classroom_id, slot_index), 0) & self.full_mask != self.full_mask:
+            return
+        open_rooms = self.open_rooms[slot_index]
+        position = bisect_left(open_rooms, index)
+        if position < len(open_rooms) and open_rooms[position] == index:
+            del open_rooms[position]
+
+    def teacher_free(self, session: Dict[str, Any], slot_index: int) -> bool:
+        teacher_id = session["teacher_id"]
+        if teacher_id is None:
+            return True
+        return not self.teacher_busy.get((teacher_id, slot_index), 0) & session["weeks_mask"]
+
+    def free_rooms(self, session: Dict[str, Any], slot_index: int):
+        """
+        按容量从小到大返回该节次可用且容量足够的教室
+        """
+        mask = session["weeks_mask"]
+        open_rooms = self.open_rooms[slot_index]
+        first = bisect_left(open_rooms, bisect_left(self.capacities, session["size"]))
+        for index in open_rooms[first:]:
+            room = self.rooms[index]
+            if not self.room_busy.get((room["classroom_id"], slot_index), 0) & mask:
+                yield room
+
+    def cost(self, session: Dict[str, Any], slot_index: int, room: Dict[str, Any]) -> float:
+        day = self.slots[slot_index][0]
+        cost = 0.0
+        if self.offering_days.get(session["offering_id"], {}).get(day):
+            cost += SAME_DAY_PENALTY
+        if room["room_type"] in SPECIAL_ROOM_TYPES:
+            cost += SPECIAL_ROOM_PENALTY
+        if session["teacher_id"] is not None:
+            cost += TEACHER_DAY_PENALTY * self.teacher_day_load.get((session["teacher_id"], day), 0)
+        cost += WASTE_PENALTY * (room["capacity"] - session["size"]) / max(room["capacity"], 1)
+        return cost
+
+    def best_candidate(self, session: Dict[str, Any]) -> Optional[Tuple[float, int, Dict[str, Any]]]:
+        best = None
+        for slot_index in range(len(self.slots)):
+            if not self.teacher_free(session, slot_index):
+                continue
+            # 每个节次只比较最小的普通教室和最小的特殊教室
+            seen_types = set()
+            for room in self.free_rooms(session, slot_index):
+                special = room["room_type"] in SPECIAL_ROOM_TYPES
+                if special in seen_types:
+                    continue
+                seen_types.add(special)
+                cost = self.cost(session, slot_index, room) + self.rng.random()
+                if best is None or cost < best[0]:
+                    best = (cost, slot_index, room)
+                if len(seen_types) == 2:
+                    break
+        return best
+
+    def assign(self, session_index: int, session: Dict[str, Any], slot_index: int, room: Dict[str, Any], cost: float) -> None:
+        mask = session["weeks_mask"]
+        room_key = (room["classroom_id"], slot_index)
+        self.room_busy[room_key] = self.room_busy.get(room_key, 0) | mask
+        self.occupants.setdefault(room_key, []).append(session_index)
+        self._close_if_full(room["classroom_id"], slot_index)
+        day = self.slots[slot_index][0]
+        if session["teacher_id"] is not None:
+            teacher_key = (session["teacher_id"], slot_index)
+            self.teacher_busy[teacher_key] = self.teacher_busy.get(teacher_key, 0) | mask
+            load_key = (session["teacher_id"], day)
+            self.teacher_day_load[load_key] = self.teacher_day_load.get(load_key, 0) + 1
+        days = self.offering_days.setdefault(session["offering_id"], {})
+        days[day] = days.get(day, 0) + 1
+        self.placement[session_index] = (slot_index, room["classroom_id"], cost)
+
+    def unassign(self, session_index: int, session: Dict[str, Any]) -> None:
+        # 求解器只在掩码不重叠时放置课次，因此可以按位清除
+        slot_index, classroom_id, _ = self.placement.pop(session_index)
+        mask = session["weeks_mask"]
+        room_key = (classroom_id, slot_index)
+        was_full = self.room_busy[room_key] & self.full_mask == self.full_mask
+        self.room_busy[room_key] &= ~mask
+        if was_full and self.room_busy[room_key] & self.full_mask != self.full_mask:
+            insort(self.open_rooms[slot_index], self.room_index[classroom_id])
+        self.occupants[room_key].remove(session_index)
+        day = self.slots[slot_index][0]
+        if session["teacher_id"] is not None:
+            self.teacher_busy[(session["teacher_id"], slot_index)] &= ~mask
+            self.teacher_day_load[(session["teacher_id"], day)] -= 1
+        self.offering_days[session["offering_id"]][day] -= 1
+
+
+def solve_timetable(problem: Dict[str, Any], seed: int = 0) -> Dict[str, Any]:
+    """
+    求解排课
+
+    problem 包含:
+      slots: [(星期, 开始分钟, 结束分钟)] 候选节次
+      offerings: [{offering_id, teacher_id, size, sessions, weeks_mask}]
+      classrooms: [{classroom_id, capacity, room_type}]
+      busy: [(资源类型, 资源ID, 星期, 开始分钟, 结束分钟, 周次掩码)] 已有排课
+    返回 {seed, cost, assignments: [{offering_id, classroom_id, slot_index}], unassigned: [{offering_id, sessions}]}
+    """
+    rng = random.Random(seed)
+    state = _State(problem, rng)
+
+    sessions: List[Dict[str, Any]] = []
+    teacher_sessions: Dict[Any, int] = {}
+    for offering in problem["offerings"]:
+        for _ in range(offering["sessions"]):
+            sessions.append(offering)
+        teacher_sessions[offering["teacher_id"]] = teacher_sessions.get(offering["teacher_id"], 0) + offering["sessions"]
+
+    # 先安排规模大、教师课多的课次，相同条件下随机打散
+    order = sorted(
+        range(len(sessions)),
+        key=lambda index: (
+            -sessions[index]["size"],
+            -teacher_sessions.get(sessions[index]["teacher_id"], 0),
+            rng.random(),
+        ),
+    )
+
+    # 1. 贪心构造
+    unassigned: List[int] = []
+    for session_index in order:
+        session = sessions[session_index]
+        candidate = state.best_candidate(session)
+        if candidate is None:
+            unassigned.append(session_index)
+            continue
+        cost, slot_index, room = candidate
+        state.assign(session_index, session, slot_index, room, cost)
+
+    # 2. 局部搜索: 为未安排的课次腾出位置，把唯一占用者移到别处
+    for _ in range(problem.get("local_search_rounds", 2)):
+        if not unassigned:
+            break
+        still_unassigned = []
+        for session_index in unassigned:
+            if not _repair(state, sessions, session_index):
+                still_unassigned.append(session_index)
+        unassigned = still_unassigned
+
+    assignments = []
+    total_cost = 0.0
+    for session_index, (slot_index, classroom_id, cost) in state.placement.items():
+        total_cost += cost
+        assignments.append({
+            "offering_id": sessions[session_index]["offering_id"],
+            "classroom_id": classroom_id,
+            "slot_index": slot_index,
+        })
+    assignments.sort(key=lambda item: (item["offering_id"], item["slot_index"]))
+
+    missing: Dict[int, int] = {}
+    for session_index in unassigned:
+        offering_id = sessions[session_index]["offering_id"]
+        missing[offering_id] = missing.get(offering_id, 0) + 1
+
+    return {
+        "seed": seed,
+        "cost": round(total_cost + UNASSIGNED_PENALTY * len(unassigned), 2),
+        "assignments": assignments,
+        "unassigned": [{"offering_id": key, "sessions": value} for key, value in sorted(missing.items())],
+    }
+
+
+def _repair(
+    state: _State,
+    sessions: List[Dict[str, Any]],
+    session_index: int,
+    max_rooms: int = 10,
+    max_attempts: int = 20,
+) -> bool:
+    """
+    尝试把占用某个教室节次的唯一课次移走，为未安排的课次腾出位置，最多尝试 max_attempts 次
+    """
+    session = sessions[session_index]
+    mask = session["weeks_mask"]
+    attempts = 0
+    for slot_index in range(len(state.slots)):
+        if not state.teacher_free(session, slot_index):
+            continue
+        start = bisect_left(state.capacities, session["size"])
+        for room in state.rooms[start:start + max_rooms]:
+            room_key = (room["classroom_id"], slot_index)
+            blockers = [
+                other for other in state.occupants.get(room_key, [])
+                if sessions[other]["weeks_mask"] & mask
+            ]
+            if len(blockers) != 1:
+                continue
+            # 教室被已有排课占用时无法腾挪
+            fixed_mask = state.room_busy.get(room_key, 0)
+            for other in state.occupants.get(room_key, []):
+                fixed_mask &= ~sessions[other]["weeks_mask"]
+            if fixed_mask & mask:
+                continue
+
+            attempts += 1
+            if attempts > max_attempts:
+                return False
+            blocker = blockers[0]
+            blocker_session = sessions[blocker]
+            old_slot, _, old_cost = state.placement[blocker]
+            state.unassign(blocker, blocker_session)
+            if not state.teacher_free(session, slot_index):
+                state.assign(blocker, blocker_session, old_slot, room, old_cost)
+                continue
+            state.assign(session_index, session, slot_index, room, state.cost(session, slot_index, room))
+            candidate = state.best_candidate(blocker_session)
+            if candidate is not None:
+                cost, new_slot, new_room = candidate
+                state.assign(blocker, blocker_session, new_slot, new_room, cost)
+                return True
+            # 回滚
+            state.unassign(session_index, session)
+            state.assign(blocker, blocker_session, old_slot, room, old_cost)
+    return False
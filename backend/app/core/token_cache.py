@@ -0,0 +1,112 @@
+"""
+@fileoverview 已验证令牌缓存
+@description 按令牌哈希缓存解码后的JWT声明与当前用户快照，令牌过期、用户权限版本变化或快照超时后失效
+@author muelovo
+@version 1.0.0
+@date 2026-10-18
+@license MIT
+@copyright © 2025 muelovo. All rights reserved.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+from app.models.user import User
+
+
+class TokenEntry:
+    """
+    一个已验证令牌：解码后的声明、过期时间，以及与会话分离的用户快照
+    """
+
+    __slots__ = ("payload", "expires_at", "user", "user_version", "user_loaded_at")
+
+    def __init__(self, payload: Dict[str, Any]):
+        self.payload = payload
+        self.expires_at = float(payload.get("exp") or 0)
+        self.user: Optional[User] = None
+        self.user_version: Optional[str] = None
+        self.user_loaded_at = 0.0
+
+
+class TokenCache:
+    """
+    已验证令牌的LRU缓存
+
+    同一页面的多个接口请求携带相同令牌，命中时跳过签名校验与声明解析；
+    用户快照只在权限版本未变化（用户状态、角色、密码等未修改）且未超过
+    TOKEN_CACHE_USER_TTL_SECONDS 时复用。TOKEN_CACHE_MAX_ENTRIES 为0时不缓存。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[bytes, TokenEntry]" = OrderedDict()
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def _get(self, token: str) -> Optional[TokenEntry]:
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def get_payload(self, token: str) -> Optional[Dict[str, Any]]:
+        entry = self._get(token)
+        return entry.payload if entry is not None else None
+
+    def put_payload(self, token: str, payload: Dict[str, Any]) -> None:
+        if settings.TOKEN_CACHE_MAX_ENTRIES <= 0 or not payload.get("exp"):
+            return
+        key = self._key(token)
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = TokenEntry(payload)
+            while len(self._entries) > settings.TOKEN_CACHE_MAX_ENTRIES:
+                self._entries.popitem(last=False)
+
+    def get_user(self, token: str, user_id: int, version: Optional[str]) -> Optional[User]:
+        """
+        返回可复用的用户快照（与会话分离，调用方需 merge 到自己的会话）
+        """
+        if version is None:
+            return None
+        entry = self._get(token)
+        if entry is None:
+            return None
+        with self._lock:
+            user, user_version, loaded_at = entry.user, entry.user_version, entry.user_loaded_at
+        if user is None or user.user_id != user_id or user_version != version \
+                or time.monotonic() - loaded_at >= settings.TOKEN_CACHE_USER_TTL_SECONDS:
+            return None
+        return user
+
+    def put_user(self, token: str, user: User, version: Optional[str]) -> None:
+        if version is None:
+            return
+        entry = self._get(token)
+        if entry is None:
+            return
+        with self._lock:
+            entry.user = user
+            entry.user_version = version
+            entry.user_loaded_at = time.monotonic()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TokenCache()
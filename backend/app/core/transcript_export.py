@@ -0,0 +1,282 @@
+"""
+@fileoverview 成绩单批量导出
+@description 按学号顺序的单次查询结果逐个学生分组，边生成边输出CSV或PDF，内存占用与导出人数无关
+@author muelovo
+@version 1.0.0
+@date 2026-10-18
+@license MIT
+@copyright © 2025 muelovo. All rights reserved.
+"""
+
+import csv
+import io
+from itertools import groupby
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy import and_
+from sqlalchemy.orm import Session
+
+from app.core.grade_analytics import grade_level
+from app.models.course import Course, CourseOffering
+from app.models.department import Department
+from app.models.enrollment import Enrollment, Grade, StudentGpa
+from app.models.student import Student
+from app.models.user import User
+
+# 每次从数据库游标取出的行数
+EXPORT_FETCH_SIZE = 1000
+
+CSV_HEADER = [
+    "学号", "姓名", "院系", "班级", "学期", "课程代码", "课程名称", "学分",
+    "最终成绩", "绩点", "等级", "总学分", "GPA",
+]
+
+
+def transcript_rows(
+    db: Session,
+    dept_id: Optional[int] = None,
+    class_name: Optional[str] = None,
+    grade: Optional[int] = None,
+) -> Iterator[Any]:
+    """
+    一次有序查询取出所有学生的成绩行，没有成绩的学生也返回一行（课程列为空）
+    """
+    query = db.query(
+        Student.student_id, Student.student_no, User.real_name, Department.dept_name, Student.class_name,
+        StudentGpa.credits_attempted, StudentGpa.gpa,
+        CourseOffering.semester, Course.course_code, Course.course_name, Course.credits,
+        Grade.final_score, Grade.grade_point
+    ).join(
+        User, Student.user_id == User.user_id
+    ).outerjoin(
+        Department, Student.dept_id == Department.dept_id
+    ).outerjoin(
+        StudentGpa, StudentGpa.student_id == Student.student_id
+    ).outerjoin(
+        Enrollment, and_(Enrollment.student_id == Student.student_id, Enrollment.status == True)
+    ).outerjoin(
+        Grade, and_(Grade.enrollment_id == Enrollment.enrollment_id, Grade.grade_point.isnot(None))
+    ).outerjoin(
+        CourseOffering, and_(CourseOffering.offering_id == Enrollment.offering_id, Grade.grade_id.isnot(None))
+    ).outerjoin(
+        Course, Course.course_id == CourseOffering.course_id
+    )
+    if dept_id:
+        query = query.filter(Student.dept_id == dept_id)
+    if class_name:
+        query = query.filter(Student.class_name == class_name)
+    if grade:
+        query = query.filter(Student.grade == grade)
+
+    # 流式游标配合 yield_per，避免驱动一次性缓存全部结果
+    return query.order_by(
+        Student.student_no, CourseOffering.semester, Course.course_code
+    ).execution_options(stream_results=True).yield_per(EXPORT_FETCH_SIZE)
+
+
+def group_transcripts(rows: Iterable[Any]) -> Iterator[Dict[str, Any]]:
+    """
+    将有序的成绩行按学生分组，每次产出一个学生的成绩单
+    """
+    for _, student_rows in groupby(rows, key=lambda row: row.student_id):
+        first = None
+        courses = []
+        for row in student_rows:
+            first = first or row
+            if row.course_code is None:
+                continue
+            courses.append({
+                "semester": row.semester,
+                "course_code": row.course_code,
+                "course_name": row.course_name,
+                "credits": float(row.credits),
+                "final_score": float(row.final_score) if row.final_score is not None else None,
+                "grade_point": float(row.grade_point),
+                "grade_level": grade_level(row.final_score),
+            })
+        yield {
+            "student_no": first.student_no,
+            "student_name": first.real_name,
+            "dept_name": first.dept_name or "",
+            "class_name": first.class_name or "",
+            "total_credits": float(first.credits_attempted) if first.credits_attempted is not None else 0.0,
+            "gpa": float(first.gpa) if first.gpa is not None else 0.0,
+            "courses": courses,
+        }
+
+
+def format_number(value: Optional[float]) -> str:
+    if value is None:
+        return ""
+    return f"{value:g}"
+
+
+def render_csv(transcripts: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    """
+    逐个学生输出CSV，带BOM以便Excel识别UTF-8
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+    yield ("\ufeff" + buffer.getvalue()).encode("utf-8")
+
+    for transcript in transcripts:
+        buffer.seek(0)
+        buffer.truncate()
+        student = [
+            transcript["student_no"], transcript["student_name"], transcript["dept_name"], transcript["class_name"]
+        ]
+        totals = [format_number(transcript["total_credits"]), format_number(transcript["gpa"])]
+        for course in transcript["courses"] or [None]:
+            if course is None:
+                writer.writerow(student + [""] * 7 + totals)
+                continue
+            writer.writerow(student + [
+                course["semester"], course["course_code"], course["course_name"], format_number(course["credits"]),
+                format_number(course["final_score"]), format_number(course["grade_point"]), course["grade_level"],
+            ] + totals)
+        yield buffer.getvalue().encode("utf-8")
+
+
+class StreamingPdf:
+    """
+    极简的流式PDF生成器
+
+    使用PDF阅读器内置的 STSong-Light 中文字体（不嵌入字体文件），每写完一页立即输出并记录偏移量，
+    页面树和交叉引用表在最后输出，因此无需在内存中保留已输出的页面
+    """
+
+    PAGE_WIDTH = 595
+    PAGE_HEIGHT = 842
+    CATALOG_ID = 1
+    PAGES_ID = 2
+    FONT_ID = 3
+
+    def __init__(self):
+        self.offset = 0
+        self.offsets: Dict[int, int] = {}
+        self.page_ids: List[int] = []
+        self.next_id = 6
+
+    def _object(self, obj_id: int, body: bytes) -> bytes:
+        data = f"{obj_id} 0 obj\n".encode("ascii") + body + b"\nendobj\n"
+        self.offsets[obj_id] = self.offset
+        self.offset += len(data)
+        return data
+
+    def _emit(self, data: bytes) -> bytes:
+        self.offset += len(data)
+        return data
+
+    def begin(self) -> bytes:
+        out = self._emit(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        out += self._object(self.FONT_ID, (
+            f"<< /Type /Font /Subtype /Type0 /BaseFont /STSong-Light /Encoding /UniGB-UCS2-H "
+            f"/DescendantFonts [{self.FONT_ID + 1} 0 R] >>"
+        ).encode("ascii"))
+        out += self._object(self.FONT_ID + 1, (
+            f"<< /Type /Font /Subtype /CIDFontType0 /BaseFont /STSong-Light "
+            f"/CIDSystemInfo << /Registry (Adobe) /Ordering (GB1) /Supplement 2 >> "
+            f"/FontDescriptor {self.FONT_ID + 2} 0 R /DW 1000 /W [1 95 500] >>"
+        ).encode("ascii"))
+        out += self._object(self.FONT_ID + 2, (
+            b"<< /Type /FontDescriptor /FontName /STSong-Light /Flags 6 /FontBBox [-25 -254 1000 880] "
+            b"/ItalicAngle 0 /Ascent 880 /Descent -120 /CapHeight 880 /StemV 93 >>"
+        ))
+        return out
+
+    def page(self, lines: List[tuple]) -> bytes:
+        """
+        输出一页，lines 为 (x, y, 字号, 文本) 列表
+        """
+        parts = []
+        for x, y, size, text in lines:
+            parts.append(f"BT /F1 {size} Tf {x:.1f} {y:.1f} Td <{encode_text(text)}> Tj ET")
+        content = "\n".join(parts).encode("ascii")
+        content_id, page_id = self.next_id, self.next_id + 1
+        self.next_id += 2
+        self.page_ids.append(page_id)
+        out = self._object(content_id, f"<< /Length {len(content)} >>\nstream\n".encode("ascii") + content + b"\nendstream")
+        out += self._object(page_id, (
+            f"<< /Type /Page /Parent {self.PAGES_ID} 0 R /MediaBox [0 0 {self.PAGE_WIDTH} {self.PAGE_HEIGHT}] "
+            f"/Resources << /Font << /F1 {self.FONT_ID} 0 R >> >> /Contents {content_id} 0 R >>"
+        ).encode("ascii"))
+        return out
+
+    def end(self) -> bytes:
+        kids = " ".join(f"{page_id} 0 R" for page_id in self.page_ids)
+        out = self._object(self.PAGES_ID, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.page_ids)} >>".encode("ascii"))
+        out += self._object(self.CATALOG_ID, f"<< /Type /Catalog /Pages {self.PAGES_ID} 0 R >>".encode("ascii"))
+        xref_offset = self.offset
+        count = self.next_id
+        xref = [f"xref\n0 {count}\n", "0000000000 65535 f \n"]
+        for obj_id in range(1, count):
+            xref.append(f"{self.offsets.get(obj_id, 0):010d} 00000 n \n")
+        xref.append(f"trailer\n<< /Size {count} /Root {self.CATALOG_ID} 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n")
+        return out + self._emit("".join(xref).encode("ascii"))
+
+
+def encode_text(text: str) -> str:
+    """
+    文本转为 UniGB-UCS2-H 编码的十六进制串，基本多文种平面以外的字符替换为问号
+    """
+    return "".join(f"{ord(ch) if ord(ch) <= 0xFFFF else 0x3F:04X}" for ch in text)
+
+
+def text_width(text: str, size: float) -> float:
+    return sum(0.5 if ord(ch) < 0x80 else 1.0 for ch in text) * size
+
+
+def fit_text(text: str, size: float, width: float) -> str:
+    if text_width(text, size) <= width:
+        return text
+    while text and text_width(text + "…", size) > width:
+        text = text[:-1]
+    return text + "…"
+
+
+# PDF成绩单表格列: (标题, 左边距, 列宽)
+PDF_COLUMNS = (
+    ("学期", 50, 80), ("课程代码", 130, 70), ("课程名称", 200, 170),
+    ("学分", 370, 40), ("成绩", 410, 45), ("绩点", 455, 40), ("等级", 495, 50),
+)
+PDF_ROWS_PER_PAGE = 36
+
+
+def render_pdf(transcripts: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    """
+    每个学生从新的一页开始，课程较多时续页
+    """
+    pdf = StreamingPdf()
+    yield pdf.begin()
+
+    for transcript in transcripts:
+        courses = transcript["courses"]
+        pages = max(1, (len(courses) + PDF_ROWS_PER_PAGE - 1) // PDF_ROWS_PER_PAGE)
+        for page_no in range(pages):
+            lines = [
+                (250, 790, 18, "成绩单"),
+                (50, 760, 10, f"学号: {transcript['student_no']}"),
+                (200, 760, 10, f"姓名: {transcript['student_name']}"),
+                (50, 744, 10, f"院系: {transcript['dept_name']}"),
+                (200, 744, 10, f"班级: {transcript['class_name']}"),
+            ]
+            y = 712
+            for title, x, _ in PDF_COLUMNS:
+                lines.append((x, y, 10, title))
+            for course in courses[page_no * PDF_ROWS_PER_PAGE:(page_no + 1) * PDF_ROWS_PER_PAGE]:
+                y -= 17
+                values = (
+                    course["semester"], course["course_code"], course["course_name"],
+                    format_number(course["credits"]), format_number(course["final_score"]),
+                    format_number(course["grade_point"]), course["grade_level"],
+                )
+                for (_, x, width), value in zip(PDF_COLUMNS, values):
+                    lines.append((x, y, 9, fit_text(str(value or ""), 9, width - 4)))
+            lines.append((50, 60, 10, (
+                f"总学分: {format_number(transcript['total_credits'])}    "
+                f"GPA: {transcript['gpa']:.2f}    第{page_no + 1}/{pages}页"
+            )))
+            yield pdf.page(lines)
+
+    yield pdf.end()
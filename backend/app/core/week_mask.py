@@ -0,0 +1,135 @@
+"""
+@fileoverview 周次位掩码
+@description 用单个整数表示排课周次（第1-64周），周次重叠判断只需一次按位与
+@author muelovo
+@version 1.0.0
+@date 2026-10-18
+@license MIT
+@copyright © 2025 muelovo. All rights reserved.
+"""
+
+from typing import Iterable, List, Optional
+
+# 支持的最大周次，与数据库中 BIGINT UNSIGNED 的位数一致
+MAX_WEEK = 64
+
+
+class WeekMask(int):
+    """
+    周次位掩码，第n周对应第n-1位
+    例如: WeekMask.parse("1-3,5") == 0b10111
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def parse(cls, weeks) -> "WeekMask":
+        """
+        解析周数，支持 "1-3,5,7-9" 形式的字符串、周次集合以及已有的掩码整数
+        无法解析的片段会被忽略，超出1-64范围的周次会被截断
+        """
+        if isinstance(weeks, WeekMask):
+            return weeks
+        if weeks is None or weeks == "":
+            return cls(0)
+        if isinstance(weeks, int):
+            return cls(weeks & ((1 << MAX_WEEK) - 1))
+        if isinstance(weeks, (list, tuple, set, frozenset)):
+            return cls.from_weeks(weeks)
+
+        mask = 0
+        for part in str(weeks).split(","):
+            part = part.strip()
+            if not part:
+                continue
+            try:
+                if "-" in part:
+                    start_str, end_str = part.split("-", 1)
+                    start, end = int(start_str), int(end_str)
+                    # 确保开始周不大于结束周
+                    if start > end:
+                        start, end = end, start
+                    start, end = max(start, 1), min(end, MAX_WEEK)
+                    if start <= end:
+                        mask |= ((1 << (end - start + 1)) - 1) << (start - 1)
+                else:
+                    week = int(part)
+                    if 1 <= week <= MAX_WEEK:
+                        mask |= 1 << (week - 1)
+            except ValueError:
+                continue
+        return cls(mask)
+
+    @classmethod
+    def parse_strict(cls, weeks) -> "WeekMask":
+        """
+        严格解析写入的周数：任一片段无法解析、周次超出1-64范围或结果为空时抛出 ValueError，
+        以免掩码为0的排课在冲突检测中永远不与其他排课冲突
+        """
+        if isinstance(weeks, str):
+            parts = [part.strip() for part in weeks.split(",")]
+            for part in parts:
+                bounds = part.split("-", 1)
+                if not all(bound.strip().isdigit() and 1 <= int(bound) <= MAX_WEEK for bound in bounds):
+                    raise ValueError("周数格式无效")
+        mask = cls.parse(weeks)
+        if not mask:
+            raise ValueError("周数格式无效")
+        return mask
+
+    @classmethod
+    def from_weeks(cls, weeks: Iterable[int]) -> "WeekMask":
+        mask = 0
+        for week in weeks:
+            week = int(week)
+            if 1 <= week <= MAX_WEEK:
+                mask |= 1 << (week - 1)
+        return cls(mask)
+
+    @classmethod
+    def resolve(cls, stored_mask: Optional[int], weeks_str) -> "WeekMask":
+        """
+        优先使用数据库中持久化的掩码，历史数据（掩码为空）退回解析周数字符串
+        """
+        if stored_mask is not None:
+            return cls(stored_mask)
+        return cls.parse(weeks_str)
+
+    def overlaps(self, other: int) -> bool:
+        return bool(self & other)
+
+    def weeks(self) -> List[int]:
+        result = []
+        mask = int(self)
+        week = 1
+        while mask:
+            if mask & 1:
+                result.append(week)
+            mask >>= 1
+            week += 1
+        return result
+
+    def to_string(self) -> str:
+        """
+        转换为规范的周数字符串，连续周次合并为区间，例如 "1-3,5"
+        """
+        parts = []
+        weeks = self.weeks()
+        index = 0
+        while index < len(weeks):
+            start = end = weeks[index]
+            while index + 1 < len(weeks) and weeks[index + 1] == end + 1:
+                index += 1
+                end = weeks[index]
+            parts.append(str(start) if start == end else f"{start}-{end}")
+            index += 1
+        return ",".join(parts)
+
+    def __and__(self, other):
+        return WeekMask(int(self) & int(other))
+
+    def __or__(self, other):
+        return WeekMask(int(self) | int(other))
+
+    def __repr__(self) -> str:
+        return f"WeekMask('{self.to_string()}')"
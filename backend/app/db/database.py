@@ -1,4 +1,5 @@
 from sqlalchemy import create_engine, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import time
@@ -25,24 +26,24 @@ Base = declarative_base()
 def get_db():
     db = SessionLocal()
     try:
-        # 测试连接是否有效
-        db.execute(text("SELECT 1"))
-        yield db
-    except Exception as e:
-        print(f"数据库连接异常: {str(e)}")
-        # 尝试重新连接
-        for i in range(3):
+        # 测试连接是否有效，只对建立连接失败进行重试；
+        # 连接池耗尽（等待超时）时直接失败，避免重试进一步加剧连接争用
+        for i in range(4):
             try:
-                time.sleep(1)  # 等待1秒
-                db = SessionLocal()
                 db.execute(text("SELECT 1"))
-                yield db
                 break
-            except Exception as retry_error:
-                print(f"第{i+1}次重试失败: {str(retry_error)}")
-        else:
-            # 所有重试失败
-            print("数据库连接重试失败")
-            raise
+            except PoolTimeoutError:
+                print("数据库连接池已耗尽")
+                raise
+            except Exception as e:
+                if i == 3:
+                    print("数据库连接重试失败")
+                    raise
+                print(f"数据库连接异常: {str(e)}" if i == 0 else f"第{i}次重试失败: {str(e)}")
+                db.close()
+                time.sleep(1)  # 等待1秒
+                db = SessionLocal()
+        # 接口内抛出的异常直接向上传递，不触发重连
+        yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
@@ -4,5 +4,7 @@ from app.models.department import Department
 from app.models.teacher import Teacher
 from app.models.student import Student
 from app.models.course import Course, CourseOffering, Schedule, Classroom
-from app.models.enrollment import Enrollment, Grade
+from app.models.enrollment import (
+    Enrollment, Grade, EnrollmentPreference, EnrollmentWaitlist, StudentGpa, StudentSemesterGpa
+)
 from app.models.student_status import StudentStatus, RewardPunishment 
\ No newline at end of file
@@ -1,6 +1,9 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, ForeignKey, Enum, DECIMAL, TIMESTAMP, func
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, BigInteger, SmallInteger, String, Text, Boolean, ForeignKey, Enum, DECIMAL, TIMESTAMP, func
+from sqlalchemy.dialects.mysql import BIGINT
+from sqlalchemy.orm import relationship, validates
 
+from app.core.schedule_time import time_to_minutes
+from app.core.week_mask import WeekMask
 from app.db.database import Base
 
 
@@ -32,6 +35,7 @@ class CourseOffering(Base):
     max_students = Column(Integer, default=50)
     current_students = Column(Integer, default=0)
     status = Column(Boolean, default=True)
+    allocation_mode = Column(String(20), nullable=False, default="fcfs")  # fcfs: 先到先得, preference: 志愿分配
 
     # 关系
     course = relationship("Course", back_populates="offerings")
@@ -50,11 +54,31 @@ class Schedule(Base):
     start_time = Column(String(5), nullable=False)  # 格式 "HH:MM"
     end_time = Column(String(5), nullable=False)  # 格式 "HH:MM"
     weeks = Column(String(50), nullable=False)  # 例如 "1-16"表示第1到16周
+    weeks_mask = Column(BigInteger().with_variant(BIGINT(unsigned=True), "mysql"))  # 周次位掩码，第n周对应第n-1位
+    start_minutes = Column(SmallInteger)  # 开始时间对应的当天分钟数，由应用写入
+    end_minutes = Column(SmallInteger)  # 结束时间对应的当天分钟数，由应用写入
 
     # 关系
     offering = relationship("CourseOffering", back_populates="schedules")
     classroom = relationship("Classroom", back_populates="schedules")
 
+    @validates("weeks")
+    def _sync_weeks_mask(self, key, value):
+        # 写入周数时同步持久化位掩码，并把周数规范为 "1-3,5" 形式；无效周数直接拒绝，不写入为0的掩码
+        mask = WeekMask.parse_strict(value)
+        self.weeks_mask = int(mask)
+        return mask.to_string()
+
+    @validates("start_time", "end_time")
+    def _sync_minutes(self, key, value):
+        # 写入时间时同步持久化分钟数，读取时无需再解析
+        minutes = time_to_minutes(value)
+        if key == "start_time":
+            self.start_minutes = minutes
+        else:
+            self.end_minutes = minutes
+        return value
+
 
 class Classroom(Base):
     __tablename__ = "classroom"
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, ForeignKey, TIMESTAMP, Boolean, DECIMAL, func
+from sqlalchemy import Column, Integer, String, ForeignKey, TIMESTAMP, Boolean, DECIMAL, func
 from sqlalchemy.orm import relationship
 
 from app.db.database import Base
@@ -33,4 +33,65 @@ class Grade(Base):
 
     # 关系
     enrollment = relationship("Enrollment", back_populates="grade")
-    recorder = relationship("Teacher") 
\ No newline at end of file
+    recorder = relationship("Teacher")
+
+
+class EnrollmentPreference(Base):
+    __tablename__ = "enrollment_preference"
+
+    preference_id = Column(Integer, primary_key=True, index=True)
+    student_id = Column(Integer, ForeignKey("student.student_id"), nullable=False)
+    offering_id = Column(Integer, ForeignKey("course_offering.offering_id"), nullable=False)
+    semester = Column(String(20), nullable=False)
+    rank = Column(Integer, nullable=False)  # 1 为第一志愿
+    status = Column(Integer, default=0)  # 0: 待分配, 1: 已录取, 2: 未录取
+    created_at = Column(TIMESTAMP, server_default=func.now())
+
+    # 关系
+    student = relationship("Student")
+    offering = relationship("CourseOffering")
+
+
+class EnrollmentWaitlist(Base):
+    __tablename__ = "enrollment_waitlist"
+
+    waitlist_id = Column(Integer, primary_key=True, index=True)
+    student_id = Column(Integer, ForeignKey("student.student_id"), nullable=False)
+    offering_id = Column(Integer, ForeignKey("course_offering.offering_id"), nullable=False)
+    status = Column(Integer, default=0)  # 0: 候补中, 1: 已递补, 2: 已取消, 3: 递补失败
+    created_at = Column(TIMESTAMP, server_default=func.now())
+
+    # 关系
+    student = relationship("Student")
+    offering = relationship("CourseOffering")
+
+
+class StudentGpa(Base):
+    __tablename__ = "student_gpa"
+
+    student_id = Column(Integer, ForeignKey("student.student_id"), primary_key=True)
+    credits_attempted = Column(DECIMAL(6, 1), nullable=False, default=0)  # 已有绩点的课程学分
+    credits_earned = Column(DECIMAL(6, 1), nullable=False, default=0)  # 及格课程学分
+    grade_points = Column(DECIMAL(9, 2), nullable=False, default=0)  # 学分 * 绩点 之和
+    course_count = Column(Integer, nullable=False, default=0)
+    gpa = Column(DECIMAL(3, 2), nullable=False, default=0)
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
+
+    # 关系
+    student = relationship("Student")
+
+
+class StudentSemesterGpa(Base):
+    __tablename__ = "student_semester_gpa"
+
+    student_id = Column(Integer, ForeignKey("student.student_id"), primary_key=True)
+    semester = Column(String(20), primary_key=True)
+    credits_attempted = Column(DECIMAL(6, 1), nullable=False, default=0)
+    credits_earned = Column(DECIMAL(6, 1), nullable=False, default=0)
+    grade_points = Column(DECIMAL(9, 2), nullable=False, default=0)
+    course_count = Column(Integer, nullable=False, default=0)
+    gpa = Column(DECIMAL(3, 2), nullable=False, default=0)
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
+
+    # 关系
+    student = relationship("Student")
@@ -71,6 +71,7 @@ class CourseOfferingBase(BaseModel):
     max_students: int = Field(50, ge=1)
     current_students: int = 0
     status: bool = True
+    allocation_mode: str = "fcfs"  # fcfs: 先到先得, preference: 志愿分配
 
 
 # 创建开课请求体
@@ -84,6 +85,7 @@ class CourseOfferingUpdate(BaseModel):
     semester: Optional[str] = None
     max_students: Optional[int] = None
     status: Optional[bool] = None
+    allocation_mode: Optional[str] = None
 
 
 # 开课响应模型
@@ -0,0 +1,44 @@
+from typing import List, Optional
+from pydantic import BaseModel, Field, validator
+
+
+# 选课请求体，管理员代选时指定 student_id，学生本人选课时可省略
+class EnrollmentCreate(BaseModel):
+    offering_id: int
+    student_id: Optional[int] = None
+    join_waitlist: bool = False  # 课程已满时是否加入候补
+
+
+# 志愿提交请求体，offering_ids 按志愿顺序排列
+class PreferenceSubmit(BaseModel):
+    semester: str = Field(..., min_length=6)
+    offering_ids: List[int]
+    student_id: Optional[int] = None
+
+
+# 批量分配任务请求体
+class AllocationJobCreate(BaseModel):
+    semester: str = Field(..., min_length=6)
+    method: str = "lottery"
+    seed: Optional[int] = None
+
+    @validator('method')
+    def validate_method(cls, v):
+        allowed_methods = ['lottery', 'priority']
+        if v not in allowed_methods:
+            raise ValueError(f'分配方式必须是以下之一: {", ".join(allowed_methods)}')
+        return v
+
+
+# 成绩录入行，按 enrollment_id 或 student_id 定位选课记录
+class GradeEntry(BaseModel):
+    enrollment_id: Optional[int] = None
+    student_id: Optional[int] = None
+    usual_score: Optional[float] = Field(None, ge=0, le=100)
+    exam_score: Optional[float] = Field(None, ge=0, le=100)
+    final_score: Optional[float] = Field(None, ge=0, le=100)  # 平时与考试成绩不全时直接录入的最终成绩
+
+
+# 教学班成绩批量录入请求体
+class GradeRosterSubmit(BaseModel):
+    grades: List[GradeEntry]